@@ -1,16 +1,66 @@
+import time, asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import ingest, review, ratios, runs
+from .graph.build import open_graph, close_graph
+from .graph import retention
+from .settings import CHECKPOINT_PRUNE_INTERVAL_S, WARMUP_ON_STARTUP, prepare_storage
+from .responses import CompressionMiddleware
+from .routers import ingest, review, ratios, runs, jobs, validation, metrics, financials, health
+from .services import warmup
+from .services.jobs import ingest_queue
 
-app = FastAPI(title="FinApp API", version="1.0")
+async def _prune_loop():
+    # Retención periódica de checkpoints (TTL / tamaño / historial de corridas terminadas)
+    while True:
+        await asyncio.sleep(CHECKPOINT_PRUNE_INTERVAL_S)
+        try:
+            print(f"🧹 Retención de checkpoints: {await asyncio.to_thread(retention.prune)}")
+        except Exception as e:
+            print(f"⚠️ Error en retención de checkpoints: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    prepare_storage()
+    warmup.mark("storage", time.perf_counter() - t0)
+    # Un solo grafo compilado + checkpointer async compartido por todos los routers
+    t0 = time.perf_counter()
+    await open_graph()
+    warmup.mark("graph", time.perf_counter() - t0)
+    warmup.state["graph"] = True
+    # Lo pesado (Vertex, parsers, GCS) en segundo plano: el puerto abre sin esperarlo
+    if WARMUP_ON_STARTUP:
+        warmup.start()
+    pruner = asyncio.create_task(_prune_loop()) if CHECKPOINT_PRUNE_INTERVAL_S > 0 else None
+    # Workers de /ingest/batch; el estado de cada trabajo se persiste junto al catálogo de corridas
+    from .graph.build import get_graph
+    await ingest_queue.start(store=get_graph().checkpointer)
+    yield
+    await ingest_queue.stop()
+    if pruner:
+        pruner.cancel()
+        with suppress(asyncio.CancelledError):
+            await pruner
+    await warmup.stop()
+    await close_graph()
+
+app = FastAPI(title="FinApp API", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"]
 )
+# gzip/zstd según Accept-Encoding (no toca SSE)
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(ingest.router, prefix="/api/v1", tags=["ingest"])
 app.include_router(review.router, prefix="/api/v1", tags=["review"])
 app.include_router(ratios.router, prefix="/api/v1", tags=["ratios"])
 app.include_router(runs.router,   prefix="/api/v1", tags=["runs"])
+app.include_router(jobs.router,   prefix="/api/v1", tags=["jobs"])
+app.include_router(validation.router, prefix="/api/v1", tags=["validation"])
+app.include_router(financials.router, prefix="/api/v1", tags=["financials"])
+app.include_router(metrics.router, tags=["metrics"])
+app.include_router(health.router, tags=["health"])
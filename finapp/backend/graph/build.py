@@ -1,28 +1,142 @@
+import asyncio, sqlite3
+from typing import Optional
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from .state import AppState
-from .nodes import node_parse, node_extract, node_validate, node_hitl_gate, node_apply_feedback, node_ratios
-from ..settings import CHECKPOINT_DB
-import sqlite3
+from .serde import CompressedSerializer
+from . import catalog
+from .nodes import (node_parse, node_locate, node_extract, node_validate, node_hitl_gate, node_apply_feedback, node_ratios,
+                    route_after_hitl)
+from ..services import metrics
+from ..settings import CHECKPOINT_DB, CHECKPOINT_BUSY_TIMEOUT_MS, METRICS_PAYLOAD_SIZES
+from langgraph.errors import GraphBubbleUp
+import aiosqlite
 
-def build_graph():
+# Grafo compilado único por proceso; se abre en el lifespan de la app.
+_graph = None
+_conn: Optional[aiosqlite.Connection] = None
+
+class TimedSqliteSaver(AsyncSqliteSaver):
+    """Checkpointer que mide sus escrituras (histograma + span del run) y mantiene el catálogo de corridas
+    y de trabajos de ingesta."""
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        async with self.lock:
+            await catalog.setup(self.conn)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"].get("thread_id")
+        with metrics.span("put", metrics.CHECKPOINT_SECONDS, "op", run_id=thread_id):
+            out = await super().aput(config, checkpoint, metadata, new_versions)
+            if not config["configurable"].get("checkpoint_ns"):
+                async with self.lock:
+                    await catalog.record_checkpoint(self.conn, thread_id, checkpoint)
+                    await self.conn.commit()
+            return out
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        conf = config["configurable"]
+        thread_id = conf.get("thread_id")
+        with metrics.span("put_writes", metrics.CHECKPOINT_SECONDS, "op", run_id=thread_id):
+            await super().aput_writes(config, writes, task_id, task_path)
+            status = catalog.status_from_writes(writes)
+            if status and not conf.get("checkpoint_ns"):
+                async with self.lock:
+                    await catalog.record_status(self.conn, thread_id, conf.get("checkpoint_id") or "", status)
+                    await self.conn.commit()
+
+    async def alist_runs(self, **filters):
+        async with self.lock:
+            return await catalog.list_runs(self.conn, **filters)
+
+    async def aget_run(self, run_id: str):
+        async with self.lock:
+            return await catalog.get_run(self.conn, run_id)
+
+    # Trabajos de ingesta por lote (services.jobs.JobQueue los persiste aquí)
+    async def aput_job(self, job):
+        async with self.lock:
+            await catalog.record_job(self.conn, job)
+            await self.conn.commit()
+
+    async def aget_job(self, job_id: str):
+        async with self.lock:
+            return await catalog.get_job(self.conn, job_id)
+
+    async def alist_jobs(self, status=None, limit: int = 100):
+        async with self.lock:
+            return await catalog.list_jobs(self.conn, status, limit)
+
+_serde = CompressedSerializer()
+
+def _payload_size(update) -> int:
+    # Bytes que el update aporta al checkpoint (ya comprimido)
+    return len(_serde.dumps_typed(update)[1])
+
+def _node(name, fn):
+    # interrupt() sale como GraphBubbleUp: no cuenta como error del nodo
+    return metrics.instrument_node(name, fn, sizer=_payload_size if METRICS_PAYLOAD_SIZES else None,
+                                   ok_exceptions=(GraphBubbleUp,))
+
+def build_graph(checkpointer=None):
     g = StateGraph(AppState)
-    g.add_node("parse", node_parse)
-    g.add_node("extract", node_extract)
-    g.add_node("validate", node_validate)
-    g.add_node("hitl", node_hitl_gate)
-    g.add_node("apply_feedback", node_apply_feedback)
-    g.add_node("ratios", node_ratios)
+    g.add_node("parse", _node("parse", node_parse))
+    g.add_node("locate", _node("locate", node_locate))
+    g.add_node("extract", _node("extract", node_extract))
+    g.add_node("validate", _node("validate", node_validate))
+    g.add_node("hitl", _node("hitl", node_hitl_gate))
+    g.add_node("apply_feedback", _node("apply_feedback", node_apply_feedback))
+    g.add_node("ratios", _node("ratios", node_ratios))
 
     g.set_entry_point("parse")
-    g.add_edge("parse", "extract")
+    g.add_edge("parse", "locate")
+    g.add_edge("locate", "extract")
     g.add_edge("extract", "validate")
     g.add_edge("validate", "hitl")
-    g.add_edge("hitl", "ratios")          # si no hay interrupt, sigue
+    # con correcciones del humano vuelve a validar; si no hubo interrupt, sigue a ratios
+    g.add_conditional_edges("hitl", route_after_hitl, {"apply_feedback": "apply_feedback", "ratios": "ratios"})
     g.add_edge("apply_feedback", "validate")
     g.add_edge("ratios", END)
 
-    conn = sqlite3.connect(CHECKPOINT_DB, check_same_thread=False)
-    checkpointer = SqliteSaver(conn)
-
     return g.compile(checkpointer=checkpointer)
+
+def _rebuild_catalog() -> int:
+    conn = sqlite3.connect(CHECKPOINT_DB, timeout=CHECKPOINT_BUSY_TIMEOUT_MS / 1000)
+    try:
+        return catalog.rebuild(conn)
+    finally:
+        conn.close()
+
+async def open_graph():
+    """Abre la conexión del checkpointer (WAL) y compila el grafo una sola vez."""
+    global _graph, _conn
+    if _graph is not None:
+        return _graph
+    _conn = await aiosqlite.connect(CHECKPOINT_DB)
+    # WAL: lectores (aget_state, catálogos, retención) no bloquean al escritor
+    await _conn.execute("PRAGMA journal_mode=WAL")
+    await _conn.execute("PRAGMA synchronous=NORMAL")
+    await _conn.execute(f"PRAGMA busy_timeout={CHECKPOINT_BUSY_TIMEOUT_MS}")
+    checkpointer = TimedSqliteSaver(_conn, serde=_serde)
+    await checkpointer.setup()
+    # Corridas previas al catálogo: se indexan una vez desde sus checkpoints
+    async with _conn.execute("SELECT EXISTS(SELECT 1 FROM run_catalog), EXISTS(SELECT 1 FROM checkpoints)") as cur:
+        has_catalog, has_checkpoints = await cur.fetchone()
+    if has_checkpoints and not has_catalog:
+        print(f"🗂️ Catálogo de corridas reconstruido: {await asyncio.to_thread(_rebuild_catalog)} corridas")
+    _graph = build_graph(checkpointer)
+    return _graph
+
+async def close_graph():
+    global _graph, _conn
+    if _conn is not None:
+        await _conn.close()
+    _graph, _conn = None, None
+
+def get_graph():
+    if _graph is None:
+        raise RuntimeError("Grafo no inicializado; usa open_graph() en el arranque de la app")
+    return _graph
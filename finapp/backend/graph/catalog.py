@@ -0,0 +1,214 @@
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import aiosqlite
+
+# Catálogo de corridas: una fila por run_id en checkpoints.db, mantenida por el
+# checkpointer en cada escritura. Permite listar/filtrar corridas sin cargar checkpoints.
+# En la misma base van los trabajos de ingesta por lote (ingest_jobs, ligados por run_id):
+# la cola vive en el proceso, pero su estado se consulta desde cualquier instancia.
+
+# Canales especiales de LangGraph en las escrituras pendientes (privados desde v1)
+INTERRUPT_CHANNEL = "__interrupt__"
+ERROR_CHANNEL = "__error__"
+
+STATUSES = ("RUNNING", "NEEDS_REVIEW", "READY", "ERROR")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_catalog (
+    run_id TEXT PRIMARY KEY,
+    doc_id TEXT,
+    doc_hash TEXT,
+    entity TEXT,
+    status TEXT NOT NULL,
+    period TEXT,
+    currency TEXT,
+    extraction_source TEXT,
+    n_issues INTEGER,
+    checkpoint_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_run_catalog_status ON run_catalog(status, updated_at);
+CREATE INDEX IF NOT EXISTS ix_run_catalog_updated ON run_catalog(updated_at);
+CREATE INDEX IF NOT EXISTS ix_run_catalog_doc ON run_catalog(doc_id);
+CREATE INDEX IF NOT EXISTS ix_run_catalog_hash ON run_catalog(doc_hash);
+CREATE INDEX IF NOT EXISTS ix_run_catalog_entity ON run_catalog(entity, updated_at);
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    doc_id TEXT,
+    filename TEXT,
+    status TEXT NOT NULL,
+    result_status TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_run ON ingest_jobs(run_id);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs(status, created_at);
+"""
+
+JOB_COLUMNS = ("job_id", "run_id", "doc_id", "filename", "status", "result_status", "error",
+               "created_at", "started_at", "finished_at")
+
+COLUMNS = ("run_id", "doc_id", "doc_hash", "entity", "status", "period", "currency", "extraction_source",
+           "n_issues", "checkpoint_id", "created_at", "updated_at")
+
+# Con durabilidad "async" las escrituras pendientes (interrupt/error) de un checkpoint pueden
+# llegar antes que el checkpoint mismo: su estado se conserva si el checkpoint_id coincide.
+# Los ids de checkpoint son crecientes; una fila nunca retrocede a un checkpoint anterior.
+_UPSERT = f"""
+INSERT INTO run_catalog ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for _ in COLUMNS)})
+ON CONFLICT(run_id) DO UPDATE SET
+    doc_id = excluded.doc_id, doc_hash = excluded.doc_hash, entity = excluded.entity,
+    status = CASE WHEN run_catalog.checkpoint_id = excluded.checkpoint_id
+                       AND run_catalog.status IN ('NEEDS_REVIEW', 'ERROR')
+                  THEN run_catalog.status ELSE excluded.status END,
+    period = excluded.period, currency = excluded.currency,
+    extraction_source = excluded.extraction_source, n_issues = excluded.n_issues,
+    checkpoint_id = excluded.checkpoint_id, updated_at = excluded.updated_at
+WHERE excluded.checkpoint_id >= COALESCE(run_catalog.checkpoint_id, '')
+"""
+
+_SET_STATUS = """
+INSERT INTO run_catalog (run_id, status, checkpoint_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(run_id) DO UPDATE SET
+    status = excluded.status, checkpoint_id = excluded.checkpoint_id, updated_at = excluded.updated_at
+WHERE excluded.checkpoint_id >= COALESCE(run_catalog.checkpoint_id, '')
+"""
+
+def _ts(checkpoint: Dict[str, Any]) -> float:
+    return datetime.fromisoformat(checkpoint["ts"]).timestamp()
+
+def summarize(run_id: str, checkpoint: Dict[str, Any], status: Optional[str] = None) -> Tuple:
+    """Fila del catálogo a partir de un checkpoint (valores completos del estado)."""
+    values = checkpoint.get("channel_values") or {}
+    fin = values.get("financials")
+    if status is None:
+        status = "READY" if "ratios" in values else "RUNNING"
+    ts = _ts(checkpoint)
+    row = {"run_id": run_id, "doc_id": values.get("doc_id"), "doc_hash": values.get("doc_hash"),
+           "entity": values.get("entity"), "status": status,
+           "period": fin.period if fin is not None else None,
+           "currency": fin.currency if fin is not None else None,
+           "extraction_source": values.get("extraction_source"),
+           "n_issues": len(values.get("issues") or []) + len(values.get("extraction_issues") or []),
+           "checkpoint_id": checkpoint["id"], "created_at": ts, "updated_at": ts}
+    return tuple(row[c] for c in COLUMNS)
+
+def status_from_writes(writes: Sequence[Tuple[str, Any]]) -> Optional[str]:
+    channels = {c for c, _ in writes}
+    if ERROR_CHANNEL in channels:
+        return "ERROR"
+    if INTERRUPT_CHANNEL in channels:
+        return "NEEDS_REVIEW"
+    return None
+
+# --- Escritura (desde el checkpointer, conexión aiosqlite compartida) ---
+
+async def setup(conn: aiosqlite.Connection) -> None:
+    await conn.executescript(SCHEMA)
+    await conn.commit()
+
+async def record_checkpoint(conn: aiosqlite.Connection, run_id: str, checkpoint: Dict[str, Any]) -> None:
+    await conn.execute(_UPSERT, summarize(run_id, checkpoint))
+
+async def record_status(conn: aiosqlite.Connection, run_id: str, checkpoint_id: str, status: str) -> None:
+    now = datetime.now().timestamp()
+    await conn.execute(_SET_STATUS, (run_id, status, checkpoint_id, now, now))
+
+async def record_job(conn: aiosqlite.Connection, job: Dict[str, Any]) -> None:
+    await conn.execute(f"INSERT OR REPLACE INTO ingest_jobs ({', '.join(JOB_COLUMNS)}) "
+                       f"VALUES ({', '.join('?' for _ in JOB_COLUMNS)})", [job.get(c) for c in JOB_COLUMNS])
+
+# --- Lectura ---
+
+def _since(value: Optional[str]) -> Optional[float]:
+    # ISO 8601 ("2025-01-31", "2025-01-31T12:00:00+00:00") o epoch en segundos
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Fecha no reconocida: {value!r}")
+
+async def list_runs(conn: aiosqlite.Connection, status: Optional[str] = None, doc_id: Optional[str] = None,
+                    doc_hash: Optional[str] = None, entity: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None,
+                    limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+    """Página de corridas (más recientes primero) + total con los mismos filtros."""
+    where, args = [], []
+    if status:
+        s = status.upper()
+        if s not in STATUSES:
+            raise ValueError(f"Estado desconocido: {status!r} (usa {', '.join(STATUSES)})")
+        where.append("status = ?"); args.append(s)
+    for col, val in (("doc_id", doc_id), ("doc_hash", doc_hash), ("entity", entity)):
+        if val:
+            where.append(f"{col} = ?"); args.append(val)
+    lo, hi = _since(since), _since(until)
+    if lo is not None:
+        where.append("updated_at >= ?"); args.append(lo)
+    if hi is not None:
+        where.append("updated_at <= ?"); args.append(hi)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    async with conn.execute(f"SELECT COUNT(*) FROM run_catalog {clause}", args) as cur:
+        total = (await cur.fetchone())[0]
+    async with conn.execute(f"SELECT {', '.join(COLUMNS)} FROM run_catalog {clause} "
+                            f"ORDER BY updated_at DESC LIMIT ? OFFSET ?", [*args, limit, offset]) as cur:
+        rows = await cur.fetchall()
+    return {"total": total, "limit": limit, "offset": offset, "items": [dict(zip(COLUMNS, r)) for r in rows]}
+
+async def get_run(conn: aiosqlite.Connection, run_id: str) -> Optional[Dict[str, Any]]:
+    async with conn.execute(f"SELECT {', '.join(COLUMNS)} FROM run_catalog WHERE run_id = ?", (run_id,)) as cur:
+        row = await cur.fetchone()
+    return dict(zip(COLUMNS, row)) if row else None
+
+# Un trabajo que quedó QUEUED/RUNNING en otra instancia (o en una que se apagó) toma el
+# estado de su corrida si ésta ya terminó
+_PENDING = "j.status IN ('QUEUED', 'RUNNING')"
+_JOB_STATUS = (f"CASE WHEN {_PENDING} AND c.status IN ('READY', 'NEEDS_REVIEW') THEN 'DONE' "
+               f"WHEN {_PENDING} AND c.status = 'ERROR' THEN 'FAILED' ELSE j.status END")
+_JOB_EXPR = {"status": _JOB_STATUS,
+             "result_status": f"CASE WHEN {_PENDING} AND c.status IN ('READY', 'NEEDS_REVIEW') "
+                              f"THEN c.status ELSE j.result_status END",
+             "error": f"CASE WHEN {_PENDING} AND c.status = 'ERROR' "
+                      f"THEN 'La corrida terminó con error' ELSE j.error END"}
+_JOB_SELECT = (f"SELECT {', '.join(_JOB_EXPR.get(c, f'j.{c}') for c in JOB_COLUMNS)} "
+               f"FROM ingest_jobs j LEFT JOIN run_catalog c ON c.run_id = j.run_id")
+
+async def get_job(conn: aiosqlite.Connection, job_id: str) -> Optional[Dict[str, Any]]:
+    async with conn.execute(f"{_JOB_SELECT} WHERE j.job_id = ?", (job_id,)) as cur:
+        row = await cur.fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+async def list_jobs(conn: aiosqlite.Connection, status: Optional[str] = None,
+                    limit: int = 100) -> List[Dict[str, Any]]:
+    where, args = ("", []) if status is None else (f"WHERE {_JOB_STATUS} = ?", [status])
+    async with conn.execute(f"{_JOB_SELECT} {where} ORDER BY j.created_at DESC LIMIT ?", [*args, limit]) as cur:
+        rows = await cur.fetchall()
+    return [dict(zip(JOB_COLUMNS, r)) for r in rows]
+
+# --- Reconstrucción (corridas anteriores al catálogo) ---
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Llena el catálogo desde el último checkpoint de cada hilo (+ interrupts pendientes)."""
+    from .retention import _latest
+    conn.executescript(SCHEMA)
+    n = 0
+    for thread_id, ns, checkpoint_id, cp in _latest(conn):
+        if ns:
+            continue
+        # Sólo cuentan las escrituras pendientes del último checkpoint
+        writes = conn.execute("SELECT channel, NULL FROM writes WHERE thread_id = ? AND checkpoint_ns = '' "
+                              "AND checkpoint_id = ?", (thread_id, checkpoint_id)).fetchall()
+        conn.execute(_UPSERT, summarize(thread_id, cp, status_from_writes(writes)))
+        n += 1
+    conn.commit()
+    return n
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+from .build import get_graph
+from ..responses import dumps
+from ..settings import SSE_HEARTBEAT_S
+
+# Traduce la ejecución del grafo (stream_mode tasks + custom) a eventos SSE por nodo.
+# Cada evento es útil por sí solo: la UI puede pintar páginas, campos e issues conforme llegan.
+
+# Referencias fuertes a las corridas en curso (el loop sólo guarda referencias débiles)
+_running: set = set()
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+def _node_event(name: str, result: Dict[str, Any]) -> Optional[tuple]:
+    """(evento, datos) para el resultado de un nodo; None si no aporta nada a la UI."""
+    result = result or {}
+    if name == "parse":
+        return "parsed", {"doc_hash": result.get("doc_hash")}
+    if name == "locate":
+        if not result:
+            return None  # localizador apagado
+        return "pages_found", {"selected_pages": result.get("selected_pages"),
+                               "page_scores": result.get("page_scores")}
+    if name == "extract":
+        fin = result.get("financials")
+        return "fields_extracted", {
+            "source": result.get("extraction_source"),
+            "cache_hit": result.get("cache_hit"),
+            "period": fin.period if fin else None,
+            "currency": fin.currency if fin else None,
+            "scale_hint": fin.scale if fin else None,
+            "fields": list(fin.fields_raw.values()) if fin else [],
+            "extraction_issues": result.get("extraction_issues") or [],
+        }
+    if name == "validate":
+        return "validated", {"issues": result.get("issues") or [], "need_review": result.get("need_review")}
+    if name == "apply_feedback":
+        return "feedback_applied", {"changed_paths": result.get("changed_paths") or []}
+    if name == "ratios":
+        return "ratios", {"ratios": result.get("ratios")}
+    return None
+
+async def final_response(run_id: str, doc_id: str) -> Dict[str, Any]:
+    """Mismo cuerpo que /ingest y /review, leído del último checkpoint."""
+    state = await get_graph().aget_state({"configurable": {"thread_id": run_id}})
+    values = state.values
+    interrupts = [i for t in state.tasks for i in (t.interrupts or [])]
+    if interrupts:
+        return {"run_id": run_id, "doc_id": doc_id or values.get("doc_id", ""), "status": "NEEDS_REVIEW",
+                **interrupts[0].value}
+    return {"run_id": run_id, "doc_id": doc_id or values.get("doc_id", ""), "status": "READY",
+            "financials": values.get("financials"), "ratios": values.get("ratios"),
+            "audit": values.get("audit", [])}
+
+async def stream_run(graph_input: Any, run_id: str, doc_id: str = "") -> AsyncIterator[str]:
+    """Ejecuta el grafo y emite SSE. Si el cliente se desconecta la corrida sigue hasta terminar
+    (queda en el checkpoint y se consulta con /runs/{run_id})."""
+    config = {"configurable": {"thread_id": run_id}}
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for mode, chunk in get_graph().astream(graph_input, config=config,
+                                                         stream_mode=["tasks", "custom"]):
+                queue.put_nowait((mode, chunk))
+            queue.put_nowait(("end", None))
+        except Exception as e:
+            queue.put_nowait(("error", e))
+
+    # No se cancela al desconectarse el cliente: la corrida no queda a medias
+    task = asyncio.create_task(pump())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    yield sse("run", {"run_id": run_id, "doc_id": doc_id})
+    while True:
+        try:
+            mode, chunk = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_S)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+            continue
+        if mode == "end":
+            yield sse("done", await final_response(run_id, doc_id))
+            return
+        if mode == "error":
+            yield sse("error", {"detail": str(chunk), "type": type(chunk).__name__})
+            return
+        if mode == "custom":
+            data = dict(chunk)
+            yield sse(data.pop("event", "progress"), data)
+            continue
+        # tasks: inicio (trae "input") o resultado (trae "result")
+        if "input" in chunk:
+            yield sse("node_started", {"node": chunk["name"]})
+        elif chunk.get("interrupts"):
+            yield sse("interrupt", chunk["interrupts"][0]["value"])
+        elif not chunk.get("error"):  # el error del grafo llega por pump()
+            ev = _node_event(chunk["name"], chunk.get("result"))
+            if ev:
+                yield sse(*ev)
@@ -1,13 +1,56 @@
-import uuid
-from typing import Dict, Any, List
-from ..models import Financials, ExtractionField
-from ..services import parsers, validators, ratio_tools, gcs, vertex_client
-from ..settings import CONF_HIGH, CONF_MED, SCALE_DEFAULT
+import os, uuid, asyncio
+from typing import Dict, Any, List, Optional, TypedDict
+from pydantic import TypeAdapter
+from ..models import Financials, ExtractionField, Issue
+from ..services import (parsers, validators, ratio_tools, gcs, vertex_client, extraction_cache, blobstore,
+                         dependencies, locator, extraction_merge, metrics, table_mapper,
+                         fin_store, ocr, identities)
+from ..settings import (CONF_HIGH, CONF_MED, SCALE_DEFAULT, LOCATOR_ENABLED, EXTRACT_MAPREDUCE_ENABLED,
+                        EXTRACT_GROUP_PAGES, EXTRACT_GROUP_CHARS, EXTRACT_MAX_GROUPS, TABLE_FASTPATH_ENABLED,
+                        TABLE_FASTPATH_MIN_COVERAGE)
 from langgraph.types import interrupt
+from langgraph.config import get_stream_writer
+
+def _emit(event: str, **data) -> None:
+    # Evento parcial para el stream SSE; fuera de un astream no hace nada
+    try:
+        get_stream_writer()({"event": event, **data})
+    except RuntimeError:
+        pass
 
 def node_parse(state: Dict[str, Any]) -> Dict[str, Any]:
-    text, tables = parsers.parse_document(state["doc_path"])
-    return {"text": text, "tables": tables}
+    doc_hash = state.get("doc_hash") or extraction_cache.file_sha256(state["doc_path"])
+    text, tables = parsers.parse_document(state["doc_path"], content_hash=doc_hash)
+    _emit("document_parsed", pages=len(locator.split_pages(text)), tables=len(tables),
+          sheets=[t["sheet"] for t in tables if t.get("sheet")])
+    update = {"text_ref": blobstore.put(text), "tables_ref": blobstore.put(tables), "doc_hash": doc_hash}
+    if state.get("use_gcs") and ocr.is_image(state["doc_path"]) and ocr.usable(text):
+        # Escaneo legible por OCR local: camino de texto, sin subir la imagen para multimodal
+        update["use_gcs"] = False
+    return update
+
+def _load_document(state: Dict[str, Any]):
+    text = blobstore.get(state["text_ref"]) if state.get("text_ref") else ""
+    tables = blobstore.get(state["tables_ref"]) if state.get("tables_ref") else []
+    return text, tables
+
+def _load_context(state: Dict[str, Any]):
+    # Contexto reducido por el localizador; si no corrió, el documento completo
+    if state.get("context_text_ref"):
+        return blobstore.get(state["context_text_ref"]), blobstore.get(state["context_tables_ref"])
+    return _load_document(state)
+
+def node_locate(state: Dict[str, Any]) -> Dict[str, Any]:
+    if not LOCATOR_ENABLED:
+        return {}
+    text, tables = _load_document(state)
+    loc = locator.locate(text, tables)
+    return {
+        "selected_pages": loc["pages"],
+        "page_scores": loc["scores"],
+        "context_text_ref": blobstore.put(loc["text"]),
+        "context_tables_ref": blobstore.put(loc["tables"]),
+    }
 
 def _to_financials_from_fields(period, currency, scale, fields: List[ExtractionField]) -> Financials:
     fin = Financials(period=period or "UNKNOWN", currency=currency or "MXN", scale=scale or SCALE_DEFAULT)
@@ -21,70 +64,166 @@ def _to_financials_from_fields(period, currency, scale, fields: List[ExtractionF
         if section and hasattr(section, attr):
             setattr(section, attr, f.value)
         fin.fields_raw[path] = f
-    # Derivaciones rápidas
-    if fin.income.gross_profit is None and fin.income.revenue is not None and fin.income.cogs is not None:
-        fin.income.gross_profit = (fin.income.revenue or 0) - (fin.income.cogs or 0)
+    # Campos faltantes despejables por identidades contables (con procedencia y confianza)
+    identities.solve(fin)
     return fin
 
-def node_extract(state: Dict[str, Any]) -> Dict[str, Any]:
-    from ..services.gcs import GCS_BUCKET as GCS_BUCKET_IMPORTED
-    
-    print(f"🔍 DEBUG - use_gcs: {state.get('use_gcs')}")
-    print(f"🔍 DEBUG - GCS_BUCKET desde settings: {GCS_BUCKET_IMPORTED}")
-    print(f"🔍 DEBUG - doc_path: {state.get('doc_path')}")
-    
+STRUCTURED_EXTS = (".csv", ".xls", ".xlsx", ".xlsm")
+
+def _table_fastpath(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Mapeo local de CSV/XLSX; None si no aplica o la cobertura no alcanza."""
+    if not TABLE_FASTPATH_ENABLED or os.path.splitext(state["doc_path"])[1].lower() not in STRUCTURED_EXTS:
+        return None
+    text, tables = _load_document(state)
+    with metrics.span("table_map") as attrs:
+        mapped = table_mapper.map_tables(tables, text)
+        attrs.update(coverage=mapped["coverage"], fields=len(mapped["fields"]))
+    return mapped
+
+async def node_extract(state: Dict[str, Any]) -> Dict[str, Any]:
+    # CSV/XLSX ya son tablas limpias: si el mapeo local cubre los campos críticos no se llama al modelo
+    mapped = await asyncio.to_thread(_table_fastpath, state)
+    if mapped is not None and mapped["coverage"] >= TABLE_FASTPATH_MIN_COVERAGE:
+        return _extraction_update(mapped, cache_hit=False, source="table_mapper")
+    coverage = mapped["coverage"] if mapped is not None else None
+
+    # Caché por contenido: un hit evita tanto la subida a GCS como la llamada al modelo
+    doc_hash = state.get("doc_hash") or extraction_cache.file_sha256(state["doc_path"])
+    text, tables = await asyncio.to_thread(_load_context, state)
+    source_pages = locator.split_pages(text)
+    use_mapreduce = EXTRACT_MAPREDUCE_ENABLED and extraction_merge.needs_mapreduce(source_pages)
+
+    def _cache_key(mode: str) -> str:
+        # El contexto de texto depende del parseo, del localizador y del map-reduce: su config forma
+        # parte de la llave (y la versión del mapeador, que decide cuándo se llega al modelo)
+        tag = f"{mode}:{parsers.config_tag()}:map{table_mapper.MAPPER_VERSION}"
+        if state.get("context_text_ref"):
+            tag += f":{locator.config_tag()}"
+        if mode == "text" and use_mapreduce:
+            tag += f":mr{EXTRACT_GROUP_PAGES}-{EXTRACT_GROUP_CHARS}-{EXTRACT_MAX_GROUPS}"
+        if mode == "text" and ocr.is_image(state["doc_path"]):
+            # El texto de una imagen sale del OCR: su configuración cambia el contexto
+            tag += f":{ocr.config_tag()}"
+        return extraction_cache.make_key(doc_hash, vertex_client.extraction_fingerprint(), tag)
+
+    mode = "gcs" if state.get("use_gcs") else "text"
+    cache_key = _cache_key(mode)
+    with metrics.span("cache_lookup") as attrs:
+        result = extraction_cache.get(cache_key)
+        attrs["hit"] = result is not None
+    if result is not None:
+        return _extraction_update(result, cache_hit=True, source_pages=source_pages, source="cache",
+                                  fastpath_coverage=coverage)
+
     # Si hay bucket, sube a GCS para multimodal; si no, usa texto/tablas
     gcs_uri_mime = None
-    try:
-        if state.get("use_gcs"):
-            print("📤 Intentando subir archivo a GCS...")
-            gcs_uri, mime = gcs.upload_to_gcs(state["doc_path"])
-            gcs_uri_mime = (gcs_uri, mime)
-            print(f"✅ ÉXITO: Archivo subido a {gcs_uri}")
-        else:
-            print("⚠️  NO SE SUBE: use_gcs es False")
-    except Exception as e:
-        print(f"❌ ERROR subiendo a GCS: {e}")
-        import traceback
-        traceback.print_exc()
-        gcs_uri_mime = None
-
-    result = vertex_client.extract_with_vertex(gcs_uri_mime, state.get("text") or "", state.get("tables") or [])
+    if state.get("use_gcs"):
+        try:
+            with metrics.span("gcs_upload", bytes=os.path.getsize(state["doc_path"])):
+                gcs_uri_mime = await asyncio.to_thread(gcs.upload_to_gcs, state["doc_path"], content_hash=doc_hash)
+        except Exception as e:
+            print(f"❌ Error subiendo a GCS, se usa texto/tablas: {e}")
+            gcs_uri_mime = None
+    if mode == "gcs" and not gcs_uri_mime:
+        # Sin subida el resultado sale sólo de texto/tablas; se guarda bajo esa llave
+        mode = "text"
+        cache_key = _cache_key(mode)
+
+    if mode == "text" and use_mapreduce:
+        result = await _extract_mapreduce(source_pages, tables or [])
+    else:
+        result = await vertex_client.aextract_with_vertex(gcs_uri_mime, text or "", tables or [])
+    extraction_cache.put(cache_key, result)
+    return _extraction_update(result, cache_hit=False, source_pages=source_pages, source="model",
+                              fastpath_coverage=coverage)
+
+async def _extract_mapreduce(source_pages, tables) -> Dict[str, Any]:
+    # Una llamada por grupo de páginas en paralelo; el cliente acota la concurrencia
+    groups = extraction_merge.split_groups(source_pages, tables)
+    async def _one(i, g):
+        res = await vertex_client.aextract_with_vertex(None, g["text"], g["tables"])
+        # Resultado parcial por grupo, antes de la fusión
+        _emit("group_extracted", group=i, of=len(groups), pages=g["pages"], fields=res.get("fields") or [])
+        return res
+
+    with metrics.span("mapreduce", groups=len(groups)):
+        results = await asyncio.gather(*[_one(i, g) for i, g in enumerate(groups)])
+    return extraction_merge.merge_results(results, groups)
+
+def _source_hint(value, source_pages, group_pages=None) -> Optional[Dict[str, Any]]:
+    # Páginas enviadas al modelo y, si se encuentra la cifra, en cuáles aparece
+    if group_pages:
+        keep = set(group_pages)
+        source_pages = [(pn, t) for pn, t in source_pages or [] if pn in keep]
+    if not source_pages:
+        return None
+    return {"pages": [pn for pn, _ in source_pages], "found_in": locator.pages_for_value(value, source_pages)}
+
+def _extraction_update(result: Dict[str, Any], cache_hit: bool, source_pages=None, source: str = "model",
+                       fastpath_coverage: Optional[float] = None) -> Dict[str, Any]:
     # Normaliza a ExtractionField[]
     fields = []
     for item in result.get("fields", []):
         fields.append(ExtractionField(
             path=item.get("path"),
+            label=item.get("label"),
             value=item.get("value"),
             unit=item.get("unit"),
-            confidence=float(item.get("confidence", 0.0))
+            confidence=float(item.get("confidence", 0.0)),
+            source_hint=_source_hint(item.get("value"), source_pages, item.get("_pages"))
         ))
     fin = _to_financials_from_fields(result.get("period"), result.get("currency"), result.get("scale_hint"), fields)
-    need_review = any(f.confidence < CONF_MED for f in fields)
+    # Periodo/moneda/escala en desacuerdo entre grupos de páginas => revisión humana
+    extraction_issues = extraction_merge.conflict_issues(result.get("conflicts") or {})
+    # Incluye los derivados: uno despejado de datos contradictorios trae la confianza topada
+    derived = [f for f in fin.fields_raw.values() if identities.is_derived(f)]
+    need_review = any(f.confidence < CONF_MED for f in fields + derived) or bool(extraction_issues)
     return {
         "financials": fin,
         "need_review": need_review,
         "issues": [],
-        "confidence_thresholds": {"high": CONF_HIGH, "medium": CONF_MED}
+        "extraction_issues": extraction_issues,
+        "confidence_thresholds": {"high": CONF_HIGH, "medium": CONF_MED},
+        "cache_hit": cache_hit,
+        # De dónde salió la extracción: table_mapper (sin LLM) | cache | model
+        "extraction_source": source,
+        "fastpath_coverage": result.get("coverage") if fastpath_coverage is None else fastpath_coverage,
     }
 
 def node_validate(state: Dict[str, Any]) -> Dict[str, Any]:
-    issues = validators.check_accounting_constraints(state["financials"])
+    changed = state.get("changed_paths")
+    if changed is None:
+        issues = validators.check_accounting_constraints(state["financials"]) + (state.get("extraction_issues") or [])
+    else:
+        # Tras una corrección HITL sólo se re-ejecutan los checks que leen las rutas cambiadas
+        checks = dependencies.affected(changed)["checks"]
+        issues = validators.recheck(state["financials"], state.get("issues") or [], checks)
     need_review = state.get("need_review", False) or bool(issues)
-    return {"issues": issues, "need_review": need_review}
+    return {"issues": issues, "need_review": need_review, "changed_paths": None}
+
+class _HitlPayload(TypedDict):
+    period: Optional[str]
+    currency: Optional[str]
+    scale_hint: Optional[str]
+    issues: List[Issue]
+    fields: List[ExtractionField]
+    confidence_thresholds: Dict[str, float]
+
+_HITL_PAYLOAD = TypeAdapter(_HitlPayload)
 
 def node_hitl_gate(state: Dict[str, Any]) -> Dict[str, Any]:
     if state.get("need_review"):
         # Pausa y devuelve payload para UI (HITL)
-        fields = list(state["financials"].fields_raw.values())
-        payload = {
-            "period": state["financials"].period,
-            "currency": state["financials"].currency,
-            "scale_hint": state["financials"].scale,
-            "issues": [i.model_dump() for i in state["issues"]],
-            "fields": [f.model_dump() for f in fields],
+        fin = state["financials"]
+        # Un solo volcado (núcleo Rust de pydantic) en vez de model_dump() por campo
+        payload = _HITL_PAYLOAD.dump_python({
+            "period": fin.period,
+            "currency": fin.currency,
+            "scale_hint": fin.scale,
+            "issues": state["issues"],
+            "fields": list(fin.fields_raw.values()),
             "confidence_thresholds": state.get("confidence_thresholds", {})
-        }
+        })
         corrections = interrupt(payload)  # reanuda al recibir dict con correcciones
         # Aplica correcciones cuando regrese
         return {"human_feedback": corrections}
@@ -94,6 +233,8 @@ def node_apply_feedback(state: Dict[str, Any]) -> Dict[str, Any]:
     fin = state["financials"]
     feedback = state.get("human_feedback") or {"corrections": []}
     audit = state.get("audit") or []
+    changed = []
+    resolved = set()  # conflictos de extracción que el humano ya confirmó
 
     # Escala/moneda
     for c in feedback.get("corrections", []):
@@ -101,9 +242,15 @@ def node_apply_feedback(state: Dict[str, Any]) -> Dict[str, Any]:
         new_value = c.get("new_value")
         if path.startswith("meta.scale_confirmed"):
             fin.scale = str(new_value)
+            resolved.add("SCALE_MISMATCH")
             continue
         if path.startswith("meta.currency_confirmed"):
             fin.currency = str(new_value)
+            resolved.add("CURRENCY_MISMATCH")
+            continue
+        if path.startswith("meta.period_confirmed"):
+            fin.period = str(new_value)
+            resolved.add("PERIOD_MISMATCH")
             continue
         # actualiza campo
         obj, attr = path.split(".")
@@ -111,9 +258,21 @@ def node_apply_feedback(state: Dict[str, Any]) -> Dict[str, Any]:
         old = getattr(section, attr)
         setattr(section, attr, new_value)
         audit.append({"path": path, "old": old, "new": new_value, "by": "user"})
+        if old != new_value:
+            changed.append(path)
+
+    changed_paths = sorted(dependencies.propagate(fin, changed))
+    # human_feedback se limpia para que el gate no vuelva a rutear aquí
+    return {"financials": fin, "need_review": False, "audit": audit,
+            "changed_paths": changed_paths, "human_feedback": {},
+            "issues": [i for i in state.get("issues") or [] if i.code not in resolved],
+            "extraction_issues": [i for i in state.get("extraction_issues") or [] if i.code not in resolved]}
 
-    return {"financials": fin, "issues": [], "need_review": False, "audit": audit}
+def route_after_hitl(state: Dict[str, Any]) -> str:
+    return "apply_feedback" if state.get("human_feedback") else "ratios"
 
 def node_ratios(state: Dict[str, Any]) -> Dict[str, Any]:
     ratios = ratio_tools.compute(state["financials"])
+    # Estado finalizado: al almacén indexado por entidad/periodo
+    fin_store.upsert(fin_store.entity_for(state), state["financials"], ratios, run_id=state.get("run_id"))
     return {"ratios": ratios}
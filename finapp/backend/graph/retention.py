@@ -0,0 +1,177 @@
+import os, sqlite3, argparse
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Set, Tuple
+from .serde import CompressedSerializer
+from . import catalog
+from ..services import blobstore
+from ..settings import (CHECKPOINT_DB, CHECKPOINT_BUSY_TIMEOUT_MS, CHECKPOINT_TTL_HOURS, CHECKPOINT_MAX_MB,
+                        BLOB_GC_GRACE_S)
+
+# Retención de checkpoints.db: TTL, presupuesto de tamaño (checkpoints + blobs referenciados),
+# historial de corridas terminadas y compactación. Un blob se borra sólo cuando ningún
+# checkpoint restante lo referencia. Usa su propia conexión (WAL permite convivir con el grafo).
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=CHECKPOINT_BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(catalog.SCHEMA)
+    return conn
+
+def _latest(conn: sqlite3.Connection) -> Iterator[Tuple[str, str, str, Dict[str, Any]]]:
+    """(thread_id, checkpoint_ns, checkpoint_id, checkpoint decodificado) del último checkpoint por hilo."""
+    serde = CompressedSerializer()
+    rows = conn.execute("""
+        SELECT c.thread_id, c.checkpoint_ns, c.checkpoint_id, c.type, c.checkpoint
+        FROM checkpoints c
+        JOIN (SELECT thread_id, checkpoint_ns, MAX(checkpoint_id) AS last_id
+              FROM checkpoints GROUP BY thread_id, checkpoint_ns) l
+          ON c.thread_id = l.thread_id AND c.checkpoint_ns = l.checkpoint_ns AND c.checkpoint_id = l.last_id
+    """).fetchall()
+    for thread_id, ns, checkpoint_id, type_, blob in rows:
+        yield thread_id, ns, checkpoint_id, serde.loads_typed((type_, blob))
+
+def latest_states(db_path: str = CHECKPOINT_DB) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(run_id, valores del estado) de la última versión de cada corrida."""
+    if not os.path.exists(db_path):
+        return
+    conn = _connect(db_path)
+    try:
+        for thread_id, ns, _, cp in _latest(conn):
+            if not ns:
+                yield thread_id, cp.get("channel_values") or {}
+    finally:
+        conn.close()
+
+def _threads(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Último checkpoint de cada hilo con su timestamp, estado y bytes ocupados."""
+    sizes = dict(conn.execute("""
+        SELECT thread_id, SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints GROUP BY thread_id
+    """).fetchall())
+    for tid, n in conn.execute("SELECT thread_id, SUM(LENGTH(value)) FROM writes GROUP BY thread_id"):
+        sizes[tid] = sizes.get(tid, 0) + (n or 0)
+
+    out = []
+    for thread_id, ns, checkpoint_id, cp in _latest(conn):
+        ts = datetime.fromisoformat(cp["ts"]).timestamp()
+        finished = "ratios" in (cp.get("channel_values") or {})
+        out.append({"thread_id": thread_id, "checkpoint_ns": ns, "last_id": checkpoint_id,
+                    "ts": ts, "finished": finished, "bytes": sizes.get(thread_id, 0)})
+    return out
+
+def _refs(conn: sqlite3.Connection) -> Dict[str, Dict[Tuple[str, str], Set[str]]]:
+    """Referencias a blobs por hilo y por (checkpoint_ns, checkpoint_id), en el estado de cada
+    checkpoint y en sus writes pendientes."""
+    serde = CompressedSerializer()
+    out: Dict[str, Dict[Tuple[str, str], Set[str]]] = {}
+    for thread_id, ns, checkpoint_id, type_, blob in conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, type, checkpoint FROM checkpoints"):
+        values = serde.loads_typed((type_, blob)).get("channel_values") or {}
+        refs = {v for v in values.values() if blobstore.is_ref(v)}
+        out.setdefault(thread_id, {}).setdefault((ns, checkpoint_id), set()).update(refs)
+    # Sólo los canales *_ref guardan referencias (text_ref, tables_ref, context_*_ref)
+    for thread_id, ns, checkpoint_id, type_, value in conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, type, value FROM writes WHERE channel LIKE '%_ref'"):
+        v = serde.loads_typed((type_, value))
+        if blobstore.is_ref(v):
+            out.setdefault(thread_id, {}).setdefault((ns, checkpoint_id), set()).add(v)
+    return out
+
+def _delete_thread(conn: sqlite3.Connection, thread_id: str) -> None:
+    conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+    conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+    conn.execute("DELETE FROM run_catalog WHERE run_id = ?", (thread_id,))
+    conn.execute("DELETE FROM ingest_jobs WHERE run_id = ?", (thread_id,))
+
+def prune(db_path: str = CHECKPOINT_DB, ttl_hours: float = CHECKPOINT_TTL_HOURS,
+          max_mb: float = CHECKPOINT_MAX_MB, trim_finished: bool = True) -> Dict[str, int]:
+    """Aplica la política de retención y devuelve contadores de lo eliminado."""
+    if not os.path.exists(db_path):
+        return {"expired": 0, "over_budget": 0, "trimmed_checkpoints": 0, "blobs": 0}
+    now = datetime.now(timezone.utc).timestamp()
+    conn = _connect(db_path)
+    try:
+        threads = _threads(conn)
+        refs = _refs(conn)
+        thread_refs = {tid: set().union(*by_cp.values()) for tid, by_cp in refs.items()}
+        # Un blob puede ser de varias corridas (mismo documento): cuenta hasta que lo suelta la última
+        holders = Counter(r for rs in thread_refs.values() for r in rs)
+        blob_bytes = {r: blobstore.size(r) for r in holders}
+
+        def release(thread_id: str) -> int:
+            freed = 0
+            for r in thread_refs.pop(thread_id, ()):
+                holders[r] -= 1
+                if not holders[r]:
+                    freed += blob_bytes[r]
+            return freed
+
+        expired = [t for t in threads if ttl_hours and now - t["ts"] > ttl_hours * 3600]
+        for t in expired:
+            _delete_thread(conn, t["thread_id"])
+            release(t["thread_id"])
+
+        # Presupuesto de tamaño (checkpoints + blobs aún referenciados): elimina hilos viejos hasta quedar debajo
+        expired_ids = {t["thread_id"] for t in expired}
+        alive = sorted((t for t in threads if t["thread_id"] not in expired_ids), key=lambda t: t["ts"])
+        total = sum(t["bytes"] for t in alive) + sum(blob_bytes[r] for r, n in holders.items() if n)
+        budget = max_mb * 1024 * 1024
+        over = []
+        while max_mb and alive and total > budget:
+            t = alive.pop(0)
+            _delete_thread(conn, t["thread_id"])
+            total -= t["bytes"] + release(t["thread_id"])
+            over.append(t)
+
+        # Corridas terminadas: sólo se necesita el último checkpoint (runs/whatif)
+        trimmed = 0
+        if trim_finished:
+            for t in alive:
+                if not t["finished"]:
+                    continue
+                cur = conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                                   (t["thread_id"], t["checkpoint_ns"], t["last_id"]))
+                trimmed += cur.rowcount
+                conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                             (t["thread_id"], t["checkpoint_ns"], t["last_id"]))
+                for ns, checkpoint_id in list(refs.get(t["thread_id"], {})):
+                    if ns == t["checkpoint_ns"] and checkpoint_id < t["last_id"]:
+                        del refs[t["thread_id"]][(ns, checkpoint_id)]
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Blobs referenciados por algún checkpoint (o write) que sigue en la base
+    # (release ya sacó de thread_refs los hilos eliminados)
+    keep = {r for tid, by_cp in refs.items() if tid in thread_refs for rs in by_cp.values() for r in rs}
+    blobs = blobstore.gc(keep, BLOB_GC_GRACE_S)
+    return {"expired": len(expired), "over_budget": len(over), "trimmed_checkpoints": trimmed, "blobs": blobs}
+
+def compact(db_path: str = CHECKPOINT_DB) -> Tuple[int, int]:
+    """Vuelca el WAL y hace VACUUM; devuelve (bytes_antes, bytes_después)."""
+    def _size():
+        return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+    before = _size()
+    conn = _connect(db_path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before, _size()
+
+def main():
+    ap = argparse.ArgumentParser(description="Retención y compactación de checkpoints.db")
+    ap.add_argument("--db", default=CHECKPOINT_DB)
+    ap.add_argument("--ttl-hours", type=float, default=CHECKPOINT_TTL_HOURS)
+    ap.add_argument("--max-mb", type=float, default=CHECKPOINT_MAX_MB)
+    ap.add_argument("--no-trim", action="store_true", help="No recorta el historial de corridas terminadas")
+    ap.add_argument("--compact", action="store_true", help="VACUUM después de podar")
+    args = ap.parse_args()
+    print(prune(args.db, args.ttl_hours, args.max_mb, trim_finished=not args.no_trim))
+    if args.compact:
+        before, after = compact(args.db)
+        print(f"compactado: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
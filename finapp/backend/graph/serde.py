@@ -0,0 +1,31 @@
+import zlib
+from typing import Any, Tuple
+from pydantic import BaseModel
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from .. import models
+from ..settings import CHECKPOINT_COMPRESS_MIN_BYTES
+
+# Serializer de checkpoints: msgpack de LangGraph + zlib para payloads grandes.
+# El tipo se marca con "z:" para poder leer checkpoints viejos sin comprimir.
+
+# Tipos propios que viajan en el estado (Financials, Ratios, Issue, ExtractionField...):
+# registrados para que msgpack los reconstruya sin avisos y sin abrir la puerta a otros módulos
+MSGPACK_TYPES = [c for c in vars(models).values()
+                 if isinstance(c, type) and issubclass(c, BaseModel) and c.__module__ == models.__name__]
+
+class CompressedSerializer:
+    def __init__(self, inner=None, min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES):
+        self.inner = inner or JsonPlusSerializer(allowed_msgpack_modules=MSGPACK_TYPES)
+        self.min_bytes = min_bytes
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if data is not None and len(data) >= self.min_bytes:
+            return f"z:{type_}", zlib.compress(data, 6)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.startswith("z:"):
+            return self.inner.loads_typed((type_[2:], zlib.decompress(payload)))
+        return self.inner.loads_typed((type_, payload))
@@ -5,15 +5,28 @@ class AppState(TypedDict, total=False):
     run_id: str
     doc_id: str
     doc_path: str
+    doc_hash: Optional[str]
+    entity: Optional[str]  # empresa/emisora; llave del almacén de financials
     use_gcs: bool  # ← AGREGAR ESTA LÍNEA
     gcs_uri: Optional[str]
     gcs_mime: Optional[str]
-    text: Optional[str]
-    tables: Optional[list]
+    # Texto y tablas viven en el blobstore; el estado (y cada checkpoint) sólo guarda la referencia
+    text_ref: Optional[str]
+    tables_ref: Optional[str]
+    # Localizador: páginas elegidas para el modelo y su contexto reducido
+    selected_pages: List[int]
+    page_scores: Dict[int, float]
+    context_text_ref: Optional[str]
+    context_tables_ref: Optional[str]
     financials: Optional[Financials]
     ratios: Optional[Ratios]
     issues: List[Issue]
+    extraction_issues: List[Issue]  # conflictos entre grupos de páginas (map-reduce)
     need_review: bool
     human_feedback: Dict[str, Any]
     audit: List[Dict[str, Any]]
     confidence_thresholds: Dict[str, float]
+    cache_hit: bool
+    extraction_source: str  # table_mapper | cache | model
+    fastpath_coverage: Optional[float]  # cobertura del mapeo local de CSV/XLSX (None si no aplica)
+    changed_paths: Optional[List[str]]  # rutas cambiadas por HITL; None = validar todo
@@ -8,11 +8,13 @@ class BalanceSheet(BaseModel):
     accounts_receivable: Optional[float] = None
     inventory: Optional[float] = None
     current_assets: Optional[float] = None
+    non_current_assets: Optional[float] = None
     total_assets: Optional[float] = None
     accounts_payable: Optional[float] = None
     short_term_debt: Optional[float] = None
     current_liabilities: Optional[float] = None
     long_term_debt: Optional[float] = None
+    non_current_liabilities: Optional[float] = None
     total_liabilities: Optional[float] = None
     shareholders_equity: Optional[float] = None
 
@@ -29,6 +31,7 @@ class CashFlow(BaseModel):
     operating_cf: Optional[float] = None
     investing_cf: Optional[float] = None
     financing_cf: Optional[float] = None
+    capex: Optional[float] = None  # inversiones en activo fijo, en magnitud (positivo)
     free_cf: Optional[float] = None
 
 class ExtractionField(BaseModel):
@@ -89,13 +92,81 @@ class ExtractReadyResponse(BaseModel):
     financials: Financials
     ratios: Ratios
     audit: List[Dict[str, Any]] = Field(default_factory=list)
+    delta: Optional[Dict[str, Any]] = None
 
 class ReviewRequest(BaseModel):
     run_id: str
     corrections: List[Dict[str, Any]]
 
+class BatchRatiosRequest(BaseModel):
+    financials: List[Financials] = Field(default_factory=list)
+    run_ids: List[str] = Field(default_factory=list)
+    layout: str = "rows"  # rows: lista de Ratios | columns: {ratio: [valores]}
+
+class BatchRatiosResponse(BaseModel):
+    count: int
+    keys: List[str] = Field(default_factory=list)
+    ratios: Optional[List[Ratios]] = None
+    columns: Optional[Dict[str, List[Optional[float]]]] = None
+
+class BatchValidateRequest(BaseModel):
+    financials: List[Financials] = Field(default_factory=list)
+    run_ids: List[str] = Field(default_factory=list)
+    rules: Optional[List[Dict[str, Any]]] = None  # None = reglas de la casa (RULES_FILE / default)
+
+class BatchValidateResponse(BaseModel):
+    count: int
+    keys: List[str] = Field(default_factory=list)
+    issues: List[List[Issue]] = Field(default_factory=list)
+    summary: Dict[str, int] = Field(default_factory=dict)
+
 class WhatIfRequest(BaseModel):
     financials_id: Optional[str] = None
     run_id: Optional[str] = None
     scenario_name: str
     changes: List[Dict[str, Any]]
+
+class JobStatus(BaseModel):
+    job_id: str
+    run_id: str
+    doc_id: str
+    filename: Optional[str] = None
+    status: str = "QUEUED"  # QUEUED | RUNNING | DONE | FAILED
+    result_status: Optional[str] = None  # NEEDS_REVIEW | READY cuando termina
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class BatchIngestResponse(BaseModel):
+    jobs: List[JobStatus] = Field(default_factory=list)
+
+class SweepAxis(BaseModel):
+    path: str
+    mode: str = "factor"  # factor: base * x | pct: base * (1 + x/100) | value: x absoluto
+    low: float
+    high: float
+    steps: int = 5  # puntos por eje en modo grid
+    dist: str = "uniform"  # montecarlo: uniform | normal | triangular
+
+class SweepRequest(BaseModel):
+    run_id: Optional[str] = None
+    financials: Optional[Financials] = None
+    scenario_name: str = "sweep"
+    axes: List[SweepAxis] = Field(min_length=1)
+    method: str = "grid"  # grid | montecarlo
+    draws: int = 1000
+    seed: Optional[int] = None
+    ratios: Optional[List[str]] = None
+    percentiles: List[float] = Field(default_factory=lambda: [5, 25, 50, 75, 95])
+    include_matrix: bool = True
+
+class SweepResponse(BaseModel):
+    run_id: Optional[str] = None
+    scenario_name: str
+    method: str
+    n: int
+    base: Ratios
+    inputs: Dict[str, List[Optional[float]]] = Field(default_factory=dict)
+    ratios: Dict[str, List[Optional[float]]] = Field(default_factory=dict)
+    summary: Dict[str, Dict[str, Optional[float]]] = Field(default_factory=dict)
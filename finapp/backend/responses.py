@@ -0,0 +1,130 @@
+import gzip, asyncio
+from typing import Any, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic_core import to_json, to_jsonable_python
+from starlette.datastructures import Headers, MutableHeaders
+from .settings import (RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_ZSTD_LEVEL,
+                       RESPONSE_MSGPACK_ENABLED)
+
+# Capa de respuestas: JSON con orjson (modelos Pydantic en una sola pasada, sin jsonable_encoder),
+# msgpack opcional para clientes servicio-a-servicio (Accept: application/msgpack) y
+# compresión gzip/zstd negociada por Accept-Encoding. orjson/ormsgpack/zstandard son dependencias
+# declaradas; los respaldos de abajo sólo cubren instalaciones parciales.
+
+try:
+    import orjson
+except ImportError:  # respaldo: serializador Rust de pydantic
+    orjson = None
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+# Cuerpos más grandes se comprimen fuera del event loop
+_THREAD_BYTES = 1 << 20
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=to_jsonable_python,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return to_json(content)
+
+def dumps_msgpack(content: Any) -> bytes:
+    return ormsgpack.packb(content, default=to_jsonable_python,
+                           option=ormsgpack.OPT_SERIALIZE_PYDANTIC | ormsgpack.OPT_NON_STR_KEYS
+                           | ormsgpack.OPT_SERIALIZE_NUMPY)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_msgpack(content)
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return RESPONSE_MSGPACK_ENABLED and ormsgpack is not None and any(t in accept for t in MSGPACK_TYPES)
+
+def encoded(request: Request, content: Any, status_code: int = 200) -> Response:
+    """Respuesta ya serializada para los endpoints pesados: se salta la validación del
+    response_model y jsonable_encoder (el contenido sale de modelos ya validados)."""
+    cls = MsgpackResponse if wants_msgpack(request) else FastJSONResponse
+    return cls(content, status_code=status_code, headers={"Vary": "Accept"})
+
+# === Compresión ===
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """zstd > gzip a igual q; respeta q=0."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    supported = (["zstd"] if zstandard is not None else []) + ["gzip"]
+    best = max(supported, key=lambda c: (offered.get(c, offered.get("*", 0.0)), c == "zstd"))
+    return best if offered.get(best, offered.get("*", 0.0)) > 0 else None
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=RESPONSE_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """Middleware ASGI: comprime respuestas completas (no streaming/SSE) mayores a `minimum_size`."""
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def _send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            pending, start = start, None
+            headers = MutableHeaders(raw=pending["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith("text/event-stream")):
+                await send(pending)
+                await send(message)
+                return
+            if len(body) > _THREAD_BYTES:
+                data = await asyncio.to_thread(compress, body, coding)
+            else:
+                data = compress(body, coding)
+            headers["content-encoding"] = coding
+            headers["content-length"] = str(len(data))
+            headers.add_vary_header("Accept-Encoding")
+            await send(pending)
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, _send)
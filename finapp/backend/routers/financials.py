@@ -0,0 +1,38 @@
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from ..services import fin_store
+from ..responses import encoded
+
+router = APIRouter()
+
+def _split(csv: Optional[str]) -> Optional[List[str]]:
+    # "income.revenue,ratios.roe" -> ["income.revenue", "ratios.roe"]
+    items = [s.strip() for s in (csv or "").split(",") if s.strip()]
+    return items or None
+
+@router.get("/financials/entities")
+async def list_entities(request: Request, limit: int = Query(default=100, ge=1, le=1000),
+                        offset: int = Query(default=0, ge=0)):
+    return encoded(request, await asyncio.to_thread(fin_store.entities, limit, offset))
+
+@router.get("/financials/series")
+async def get_series(request: Request, entity: str, fields: Optional[str] = None, currency: Optional[str] = None,
+                     start: Optional[str] = None, end: Optional[str] = None, normalize: bool = False):
+    # Serie de tiempo de una entidad en una sola lectura indexada (entity, period_ord)
+    try:
+        data = await asyncio.to_thread(fin_store.series, entity, _split(fields), currency, start, end, normalize)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return encoded(request, data)
+
+@router.get("/financials/cross_section")
+async def get_cross_section(request: Request, period: str, fields: Optional[str] = None, entities: Optional[str] = None,
+                            currency: Optional[str] = None, normalize: bool = True):
+    # Todas las entidades en un periodo (índice period_ord, entity); normalizado a unidades por defecto
+    try:
+        data = await asyncio.to_thread(fin_store.cross_section, period, _split(fields), _split(entities),
+                                       currency, normalize)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return encoded(request, data)
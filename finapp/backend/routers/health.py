@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services import warmup
+
+router = APIRouter()
+
+@router.get("/healthz")
+async def healthz():
+    # Liveness: el proceso responde (no espera al warm-up)
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    # Readiness / startup probe: 503 hasta que el grafo esté abierto y el warm-up haya terminado
+    report = warmup.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@router.post("/warmup")
+async def run_warmup():
+    # Precarga SDK de Vertex, parsers y GCS (idempotente); devuelve tiempos por fase
+    await warmup.start()
+    return warmup.report()
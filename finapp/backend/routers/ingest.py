@@ -1,45 +1,48 @@
-import os, uuid, shutil
-from fastapi import APIRouter, UploadFile, File, Form
+import os, uuid, shutil, asyncio
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, Request
 from fastapi import HTTPException
-from ..graph.build import build_graph
+from fastapi.responses import StreamingResponse
+from ..graph.build import get_graph
+from ..graph.events import stream_run
 from ..settings import DOCS_DIR, CONF_HIGH, CONF_MED, GCS_BUCKET
-from ..models import ExtractPauseResponse, ExtractReadyResponse
-from langgraph.types import Command
-from starlette.concurrency import run_in_threadpool
+from ..models import ExtractPauseResponse, ExtractReadyResponse, BatchIngestResponse
+from ..services import extraction_cache
+from ..services.gcs import HashingReader
+from ..services.jobs import ingest_queue, QueueFull
+from ..responses import encoded
 
 router = APIRouter()
-graph = build_graph()
 
-@router.post("/ingest", response_model=ExtractPauseResponse|ExtractReadyResponse)
-async def ingest(file: UploadFile = File(...),
-                 period: str = Form(default="UNKNOWN"),
-                 currency: str = Form(default="MXN"),
-                 language: str = Form(default="es")):
-    # Guarda archivo
+def _write_upload(file: UploadFile):
     doc_id = uuid.uuid4().hex
     ext = os.path.splitext(file.filename)[1].lower()
     path = os.path.join(DOCS_DIR, f"{doc_id}{ext}")
+    # Calcula el hash de contenido en el mismo pase de escritura (llave de caché y de GCS)
+    reader = HashingReader(file.file)
     with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+        shutil.copyfileobj(reader, f)
+    return doc_id, path, reader.hexdigest()
 
-    run_id = uuid.uuid4().hex
-    config = {"configurable": {"thread_id": run_id}}
+async def _save_upload(file: UploadFile):
+    # Escritura + hash en un hilo: un archivo grande (o un lote) no bloquea el event loop
+    return await asyncio.to_thread(_write_upload, file)
 
-    # Invoca grafo
-    def _invoke():
-        return graph.invoke({
-            "run_id": run_id,
-            "doc_id": doc_id,
-            "doc_path": path,
-            "need_review": False,
-            "issues": [],
-            "audit": [],
-            "confidence_thresholds": {"high": CONF_HIGH, "medium": CONF_MED},
-            "use_gcs": bool(GCS_BUCKET)
-        }, config=config)
-
-    result = await run_in_threadpool(_invoke)
+def _initial_state(run_id: str, doc_id: str, path: str, doc_hash: str, entity: Optional[str] = None):
+    return {
+        "run_id": run_id,
+        "doc_id": doc_id,
+        "doc_path": path,
+        "doc_hash": doc_hash,
+        "entity": entity or None,
+        "need_review": False,
+        "issues": [],
+        "audit": [],
+        "confidence_thresholds": {"high": CONF_HIGH, "medium": CONF_MED},
+        "use_gcs": bool(GCS_BUCKET)
+    }
 
+def _to_response(run_id: str, doc_id: str, result):
     # ¿Se pausó?
     intr = result.get("__interrupt__")
     if intr:
@@ -58,5 +61,64 @@ async def ingest(file: UploadFile = File(...),
         "status": "READY",
         "financials": fin,
         "ratios": result["ratios"],
-        "audit": result.get("audit", [])
+        "audit": result.get("audit", []),
+        "delta": None
     }
+
+async def _run_ingest(run_id: str, doc_id: str, path: str, doc_hash: str, entity: Optional[str] = None):
+    config = {"configurable": {"thread_id": run_id}}
+    # Invoca grafo (los nodos síncronos corren en el executor, no bloquean el loop)
+    result = await get_graph().ainvoke(_initial_state(run_id, doc_id, path, doc_hash, entity), config=config)
+    return _to_response(run_id, doc_id, result)
+
+@router.post("/ingest", response_model=ExtractPauseResponse|ExtractReadyResponse)
+async def ingest(request: Request,
+                 file: UploadFile = File(...),
+                 period: str = Form(default="UNKNOWN"),
+                 currency: str = Form(default="MXN"),
+                 language: str = Form(default="es"),
+                 entity: Optional[str] = Form(default=None)):
+    # Guarda archivo
+    doc_id, path, doc_hash = await _save_upload(file)
+    run_id = uuid.uuid4().hex
+    return encoded(request, await _run_ingest(run_id, doc_id, path, doc_hash, entity))
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.post("/ingest/stream")
+async def ingest_stream(file: UploadFile = File(...),
+                        period: str = Form(default="UNKNOWN"),
+                        currency: str = Form(default="MXN"),
+                        language: str = Form(default="es"),
+                        entity: Optional[str] = Form(default=None)):
+    # Igual que /ingest, pero emite eventos SSE por nodo; el último ("done") trae la respuesta completa
+    doc_id, path, doc_hash = await _save_upload(file)
+    run_id = uuid.uuid4().hex
+    return StreamingResponse(stream_run(_initial_state(run_id, doc_id, path, doc_hash, entity), run_id, doc_id),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/ingest/batch", response_model=BatchIngestResponse, status_code=202)
+async def ingest_batch(files: List[UploadFile] = File(...),
+                       period: str = Form(default="UNKNOWN"),
+                       currency: str = Form(default="MXN"),
+                       language: str = Form(default="es"),
+                       entity: Optional[str] = Form(default=None)):
+    # Encola una corrida del grafo por archivo y responde de inmediato con los job ids
+    if ingest_queue.free_slots() < len(files):
+        raise HTTPException(status_code=429, detail="Cola de ingesta llena; reintenta más tarde")
+    jobs = []
+    for file in files:
+        doc_id, path, doc_hash = await _save_upload(file)
+        run_id = uuid.uuid4().hex
+        try:
+            job = await ingest_queue.submit(run_id, doc_id, file.filename,
+                                      lambda r=run_id, d=doc_id, p=path, h=doc_hash: _run_ingest(r, d, p, h, entity))
+        except QueueFull as e:
+            await asyncio.to_thread(os.remove, path)
+            raise HTTPException(status_code=429, detail=f"{e}; encolados {len(jobs)} de {len(files)}")
+        jobs.append(job)
+    return {"jobs": jobs}
+
+@router.get("/ingest/cache/stats")
+async def cache_stats():
+    return extraction_cache.get_stats()
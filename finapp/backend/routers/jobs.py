@@ -0,0 +1,38 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request
+from ..models import JobStatus, ExtractPauseResponse, ExtractReadyResponse
+from ..services.jobs import ingest_queue
+from ..graph.events import final_response
+from ..responses import encoded
+
+router = APIRouter()
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def list_jobs(status: Optional[str] = None, limit: int = 100):
+    return await ingest_queue.list(status=status, limit=limit)
+
+@router.get("/jobs/stats")
+async def jobs_stats():
+    return ingest_queue.stats()
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+@router.get("/jobs/{job_id}/result", response_model=ExtractPauseResponse|ExtractReadyResponse)
+async def get_job_result(job_id: str, request: Request):
+    job = await ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    if job.status == "FAILED":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "DONE":
+        raise HTTPException(status_code=409, detail=f"Job en estado {job.status}")
+    result = ingest_queue.result(job_id)
+    if result is None:
+        # Terminó en otra instancia (o antes de un reinicio): se arma del último checkpoint
+        result = await final_response(job.run_id, job.doc_id)
+    return encoded(request, result)
@@ -1,22 +1,25 @@
-from fastapi import APIRouter
-from ..models import WhatIfRequest, ExtractReadyResponse
-from ..graph.build import build_graph
-from ..services import ratio_tools
+from fastapi import APIRouter, HTTPException, Request
+from ..models import (WhatIfRequest, ExtractReadyResponse, BatchRatiosRequest, BatchRatiosResponse, Ratios,
+                      SweepRequest, SweepResponse)
+from ..graph.build import get_graph
+from ..services import ratio_tools, columnar, scenarios, dependencies
+from ..responses import encoded
 
 router = APIRouter()
-graph = build_graph()
 
 @router.post("/ratios/whatif", response_model=ExtractReadyResponse)
-async def whatif(req: WhatIfRequest):
+async def whatif(req: WhatIfRequest, request: Request):
     if not req.run_id:
         # Para MVP, usamos run_id vigente; podrías cargar por financials_id si persistieras
         raise ValueError("Provee run_id")
 
     config = {"configurable": {"thread_id": req.run_id}}
-    state = graph.get_state(config)
+    state = await get_graph().aget_state(config)
 
     fin = state.values.get("financials")
+    prev_ratios = state.values.get("ratios")
     audit = state.values.get("audit", [])
+    changed = []
     for ch in req.changes:
         path = ch["path"]
         new_val = ch.get("new_value")
@@ -33,13 +36,82 @@ async def whatif(req: WhatIfRequest):
             old = getattr(section, attr)
             setattr(section, attr, float(new_val))
             audit.append({"path": path, "old": old, "new": new_val, "by": "user", "scenario": req.scenario_name})
+            changed.append(path)
 
-    ratios = ratio_tools.compute(fin)
-    return {
+    # Sólo se recalculan los ratios que leen las rutas cambiadas (y sus derivados)
+    closure = dependencies.propagate(fin, changed)
+    names = dependencies.affected(closure)["ratios"]
+    if prev_ratios is None:
+        ratios = ratio_tools.compute(fin)
+        names = set(ratio_tools.RATIO_FUNCS)
+    else:
+        ratios = ratio_tools.recompute(fin, prev_ratios, names)
+    delta = {
+        "changed_fields": sorted(closure),
+        "recomputed": sorted(names),
+        "ratios": dependencies.ratio_delta(prev_ratios, ratios, names),
+    }
+    return encoded(request, {
         "run_id": req.run_id,
         "doc_id": state.values.get("doc_id",""),
         "status": "READY",
         "financials": fin,
         "ratios": ratios,
-        "audit": audit
+        "audit": audit,
+        "delta": delta
+    })
+
+@router.post("/ratios/batch", response_model=BatchRatiosResponse)
+async def batch(req: BatchRatiosRequest, request: Request):
+    # Financials explícitos + los de corridas existentes, en un solo pase vectorizado
+    fins = list(req.financials)
+    keys = [f.period for f in req.financials]
+    for run_id in req.run_ids:
+        state = await get_graph().aget_state({"configurable": {"thread_id": run_id}})
+        fin = state.values.get("financials")
+        if fin is None:
+            raise HTTPException(status_code=404, detail=f"Run sin financials: {run_id}")
+        fins.append(fin)
+        keys.append(run_id)
+
+    if not fins:
+        return {"count": 0, "keys": [], "ratios": [], "columns": None}
+    cols = ratio_tools.compute_batch(columnar.to_columns(fins))
+    if req.layout == "columns":
+        return encoded(request, {"count": len(fins), "keys": keys, "ratios": None,
+                                 "columns": {name: columnar.to_optional_list(arr) for name, arr in cols.items()}})
+    return encoded(request, {"count": len(fins), "keys": keys, "ratios": columnar.to_models(cols, Ratios),
+                             "columns": None})
+
+@router.post("/ratios/whatif/sweep", response_model=SweepResponse)
+async def whatif_sweep(req: SweepRequest, request: Request):
+    # Grid o Monte Carlo sobre varias rutas en una sola llamada vectorizada
+    fin = req.financials
+    if fin is None:
+        if not req.run_id:
+            raise HTTPException(status_code=422, detail="Provee run_id o financials")
+        state = await get_graph().aget_state({"configurable": {"thread_id": req.run_id}})
+        fin = state.values.get("financials")
+        if fin is None:
+            raise HTTPException(status_code=404, detail="Run sin financials")
+    try:
+        inputs, cols = scenarios.sweep(fin, req.axes, req.method, req.draws, req.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if req.ratios:
+        cols = {k: v for k, v in cols.items() if k in req.ratios}
+
+    resp = {
+        "run_id": req.run_id,
+        "scenario_name": req.scenario_name,
+        "method": req.method,
+        "n": len(next(iter(inputs.values()))),
+        "base": scenarios.base_ratios(fin),
+        "summary": scenarios.summarize(cols, req.percentiles),
+        "inputs": {},
+        "ratios": {},
     }
+    if req.include_matrix:
+        resp["inputs"] = {k: columnar.to_optional_list(v) for k, v in inputs.items()}
+        resp["ratios"] = {k: columnar.to_optional_list(v) for k, v in cols.items()}
+    return encoded(request, resp)
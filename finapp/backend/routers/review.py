@@ -1,33 +1,43 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from ..models import ReviewRequest, ExtractPauseResponse, ExtractReadyResponse
-from ..graph.build import build_graph
+from ..graph.build import get_graph
+from ..graph.events import stream_run
+from .ingest import SSE_HEADERS
+from ..responses import encoded
 from langgraph.types import Command
 
 router = APIRouter()
-graph = build_graph()
 
 @router.post("/review", response_model=ExtractPauseResponse|ExtractReadyResponse)
-async def review(req: ReviewRequest):
+async def review(req: ReviewRequest, request: Request):
     config = {"configurable": {"thread_id": req.run_id}}
     # Reanuda con correcciones
-    result = graph.invoke(Command(resume={"corrections": req.corrections}), config=config)
+    result = await get_graph().ainvoke(Command(resume={"corrections": req.corrections}), config=config)
 
     intr = result.get("__interrupt__")
     if intr:
         payload = intr[0].value if isinstance(intr, list) else intr.value
-        return {
+        return encoded(request, {
             "run_id": req.run_id,
             "doc_id": result.get("doc_id",""),
             "status": "NEEDS_REVIEW",
             **payload
-        }
+        })
 
     fin = result["financials"]
-    return {
+    return encoded(request, {
         "run_id": req.run_id,
         "doc_id": result.get("doc_id",""),
         "status": "READY",
         "financials": fin,
         "ratios": result["ratios"],
-        "audit": result.get("audit", [])
-    }
+        "audit": result.get("audit", []),
+        "delta": None
+    })
+
+@router.post("/review/stream")
+async def review_stream(req: ReviewRequest):
+    # Reanuda con correcciones y emite eventos SSE (validated, interrupt | ratios, done)
+    return StreamingResponse(stream_run(Command(resume={"corrections": req.corrections}), req.run_id),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,11 +1,65 @@
-from fastapi import APIRouter
-from ..graph.build import build_graph
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from ..graph.build import get_graph
+from ..graph import catalog
+from ..graph.state import AppState
+from ..services import metrics
+from ..responses import encoded
 
 router = APIRouter()
-graph = build_graph()
+
+# Campos proyectables en GET /runs/{run_id}?fields=...: llaves del estado + columnas del catálogo
+STATE_FIELDS = set(AppState.__annotations__)
+
+@router.get("/runs")
+async def list_runs(request: Request, status: Optional[str] = None, doc_id: Optional[str] = None, doc_hash: Optional[str] = None,
+                    entity: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                    limit: int = Query(default=50, ge=1, le=500), offset: int = Query(default=0, ge=0)):
+    # Sólo lee el catálogo (índices por estado/fecha/doc); no carga checkpoints
+    try:
+        page = await get_graph().checkpointer.alist_runs(status=status, doc_id=doc_id, doc_hash=doc_hash,
+                                                         entity=entity, since=since, until=until,
+                                                         limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return encoded(request, page)
 
 @router.get("/runs/{run_id}")
-async def get_run(run_id: str):
+async def get_run(run_id: str, request: Request, fields: Optional[str] = None):
     config = {"configurable": {"thread_id": run_id}}
-    state = graph.get_state(config)
-    return {"run_id": run_id, "state": state.values, "interrupted": bool(state.next)}
+    if not fields:
+        state = await get_graph().aget_state(config)
+        return encoded(request, {"run_id": run_id, "state": state.values, "interrupted": bool(state.next)})
+
+    # Proyección: ?fields=financials,ratios
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in STATE_FIELDS and f not in catalog.COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Campos desconocidos: {unknown}")
+    checkpointer = get_graph().checkpointer
+    entry = await checkpointer.aget_run(run_id)
+    out = {"run_id": run_id}
+    if entry:
+        out["status"] = entry["status"]
+        out["interrupted"] = entry["status"] == "NEEDS_REVIEW"
+        out.update({f: entry[f] for f in wanted if f in catalog.COLUMNS and f not in STATE_FIELDS})
+    state_fields = [f for f in wanted if f in STATE_FIELDS]
+    if state_fields:
+        # Una sola lectura del último checkpoint (sin reconstruir tareas ni escrituras como aget_state)
+        tup = await checkpointer.aget_tuple(config)
+        if tup is None and not entry:
+            raise HTTPException(status_code=404, detail="Corrida no encontrada")
+        values = tup.checkpoint["channel_values"] if tup else {}
+        out["state"] = {f: values.get(f) for f in state_fields}
+    elif not entry:
+        raise HTTPException(status_code=404, detail="Corrida no encontrada")
+    return encoded(request, out)
+
+@router.get("/runs/{run_id}/trace")
+async def get_run_trace(run_id: str):
+    # Spans de nodos, etapas (caché, GCS, modelo) y escrituras de checkpoint de la corrida
+    spans = metrics.trace(run_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Sin trazas para esta corrida (expiró o es de otro proceso)")
+    return {"run_id": run_id, "total_s": round(sum(s["duration_s"] for s in spans if s["name"].startswith("node:")), 6),
+            "spans": spans}
@@ -0,0 +1,33 @@
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Request
+from ..models import BatchValidateRequest, BatchValidateResponse
+from ..graph.build import get_graph
+from ..services import rules, columnar
+from ..responses import encoded
+
+router = APIRouter()
+
+@router.get("/validate/rules")
+async def list_rules():
+    return rules.load_rules()
+
+@router.post("/validate/batch", response_model=BatchValidateResponse)
+async def validate_batch(req: BatchValidateRequest, request: Request):
+    try:
+        compiled = rules.compile_rules(req.rules) if req.rules is not None else rules.default_rules()
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Regla inválida: {e}")
+
+    fins = list(req.financials)
+    keys = [f.period for f in req.financials]
+    for run_id in req.run_ids:
+        state = await get_graph().aget_state({"configurable": {"thread_id": run_id}})
+        fin = state.values.get("financials")
+        if fin is None:
+            raise HTTPException(status_code=404, detail=f"Run sin financials: {run_id}")
+        fins.append(fin)
+        keys.append(run_id)
+
+    issues = rules.validate_batch(columnar.to_columns(fins), compiled) if fins else []
+    summary = Counter(i.code for per_stmt in issues for i in per_stmt)
+    return encoded(request, {"count": len(fins), "keys": keys, "issues": issues, "summary": dict(summary)})
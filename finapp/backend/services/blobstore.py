@@ -0,0 +1,69 @@
+import os, json, zlib, hashlib, time
+from functools import lru_cache
+from typing import Any, Set
+from ..settings import BLOBS_DIR
+
+# Almacén de blobs direccionado por contenido (json + zlib).
+# El estado del grafo guarda sólo la referencia "sha256:<hex>", no el valor.
+
+PREFIX = "sha256:"
+
+def _path(digest: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+def put(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    path = _path(digest)
+    if os.path.exists(path):
+        # Ya existe: sólo renueva mtime para que la retención no lo borre
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(raw, 6))
+        os.replace(tmp, path)
+    return PREFIX + digest
+
+@lru_cache(maxsize=32)
+def _raw(digest: str) -> bytes:
+    with open(_path(digest), "rb") as f:
+        return zlib.decompress(f.read())
+
+def get(ref: str) -> Any:
+    if not ref or not ref.startswith(PREFIX):
+        raise ValueError(f"Referencia de blob inválida: {ref}")
+    # Se cachean los bytes (inmutables), no el objeto: cada llamada decodifica su propia copia
+    return json.loads(_raw(ref[len(PREFIX):]))
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+def size(ref: str) -> int:
+    try:
+        return os.path.getsize(_path(ref[len(PREFIX):]))
+    except FileNotFoundError:
+        return 0
+
+def gc(keep: Set[str], min_age_s: float) -> int:
+    """Borra los blobs fuera de `keep` (referencias vivas) no tocados en min_age_s: un nodo
+    escribe sus blobs antes de que el checkpoint que los referencia se guarde. Devuelve
+    cuántos se eliminaron."""
+    if not os.path.isdir(BLOBS_DIR):
+        return 0
+    keep = {ref[len(PREFIX):] for ref in keep}
+    cutoff = time.time() - min_age_s
+    removed = 0
+    for root, _, files in os.walk(BLOBS_DIR):
+        for name in files:
+            if name in keep:
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
@@ -0,0 +1,39 @@
+import numpy as np
+from typing import Dict, List, Iterable, Optional, Type
+from pydantic import BaseModel
+from ..models import Financials, BalanceSheet, IncomeStatement, CashFlow, Ratios
+
+# Representación columnar: una columna float64 por ruta canónica ("income.revenue"),
+# None se representa como NaN. Base de los motores vectorizados (ratios, reglas, sweeps).
+
+SECTIONS = {"balance": BalanceSheet, "income": IncomeStatement, "cashflow": CashFlow}
+FIELD_PATHS: List[str] = [f"{sec}.{name}" for sec, model in SECTIONS.items() for name in model.model_fields]
+RATIO_NAMES: List[str] = list(Ratios.model_fields)
+
+Columns = Dict[str, np.ndarray]
+
+def to_columns(fins: Iterable[Financials], paths: Optional[List[str]] = None) -> Columns:
+    fins = list(fins)
+    paths = paths or FIELD_PATHS
+    cols: Columns = {}
+    for path in paths:
+        sec, attr = path.split(".")
+        vals = [getattr(getattr(f, sec), attr) for f in fins]
+        cols[path] = np.array([np.nan if v is None else v for v in vals], dtype=np.float64)
+    return cols
+
+def n_rows(cols: Columns) -> int:
+    return len(next(iter(cols.values()))) if cols else 0
+
+def column(cols: Columns, path: str) -> np.ndarray:
+    # Rutas ausentes equivalen a None en todas las filas
+    col = cols.get(path)
+    return col if col is not None else np.full(n_rows(cols), np.nan)
+
+def to_optional_list(arr: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else float(v) for v in arr.tolist()]
+
+def to_models(cols: Columns, model: Type[BaseModel]) -> List[BaseModel]:
+    names = [n for n in model.model_fields if n in cols]
+    lists = {n: to_optional_list(cols[n]) for n in names}
+    return [model(**{n: lists[n][i] for n in names}) for i in range(n_rows(cols))]
@@ -0,0 +1,47 @@
+from typing import Dict, Iterable, List, Optional, Set
+from ..models import Financials, Ratios, Issue
+from . import ratio_tools, validators, identities
+
+# Grafo de dependencias ruta de Financials -> ratios / checks / campos derivados que la leen.
+# Permite recalcular sólo lo afectado por un cambio (HITL o what-if) y devolver el delta.
+# Los campos derivados salen de las identidades contables (services.identities).
+
+def _invert(deps: Dict[str, Iterable[str]]) -> Dict[str, Set[str]]:
+    out: Dict[str, Set[str]] = {}
+    for node, paths in deps.items():
+        for p in paths:
+            out.setdefault(p, set()).add(node)
+    return out
+
+RATIOS_BY_PATH = _invert(ratio_tools.RATIO_DEPS)
+CHECKS_BY_PATH = _invert({name: spec["reads"] for name, spec in validators.CHECKS.items()})
+
+def propagate(fin: Financials, changed: Iterable[str]) -> Set[str]:
+    """Re-deriva campos derivados afectados (in place); devuelve el cierre de rutas cambiadas."""
+    closure = set(changed)
+    # Un valor extraído del documento o fijado por el usuario no se pisa: sólo se vuelven a
+    # despejar los derivados que leen lo cambiado
+    stale = identities.invalidate(fin, closure)
+    return closure | stale | set(identities.solve(fin))
+
+def affected(changed: Iterable[str]) -> Dict[str, Set[str]]:
+    ratios: Set[str] = set()
+    checks: Set[str] = set()
+    for p in changed:
+        ratios |= RATIOS_BY_PATH.get(p, set())
+        checks |= CHECKS_BY_PATH.get(p, set())
+    return {"ratios": ratios, "checks": checks}
+
+def ratio_delta(prev: Optional[Ratios], new: Ratios, names: Iterable[str]) -> Dict[str, Dict[str, Optional[float]]]:
+    out = {}
+    for n in sorted(names):
+        old = getattr(prev, n) if prev is not None else None
+        cur = getattr(new, n)
+        if old != cur:
+            out[n] = {"old": old, "new": cur}
+    return out
+
+def issue_delta(prev: List[Issue], new: List[Issue]) -> Dict[str, List[str]]:
+    before = {i.code for i in prev}
+    after = {i.code for i in new}
+    return {"resolved": sorted(before - after), "raised": sorted(after - before)}
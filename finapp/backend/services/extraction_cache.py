@@ -0,0 +1,94 @@
+import os, json, time, sqlite3, hashlib, threading
+from typing import Dict, Any, Optional
+from . import metrics
+from ..settings import (EXTRACTION_CACHE_ENABLED, EXTRACTION_CACHE_DB,
+                        EXTRACTION_CACHE_TTL_S, EXTRACTION_CACHE_MAX_ENTRIES)
+
+# Caché persistente de resultados de extracción.
+# Llave = sha256(contenido del documento) + modo (multimodal/texto) + huella de modelo/prompt/esquema.
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+metrics.register_collector("finapp_extraction_cache_total", "Contadores de la caché de extracción", "counter", lambda: stats)
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def make_key(content_hash: str, fingerprint: str, mode: str) -> str:
+    return f"{content_hash}:{mode}:{fingerprint}"
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(EXTRACTION_CACHE_DB), exist_ok=True)
+        _conn = sqlite3.connect(EXTRACTION_CACHE_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS extraction_cache (
+                            key TEXT PRIMARY KEY,
+                            result TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            last_hit REAL NOT NULL)""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_hit ON extraction_cache(last_hit)")
+        _conn.commit()
+    return _conn
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT result, created_at FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > EXTRACTION_CACHE_TTL_S:
+            if row is not None:
+                conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                conn.commit()
+                stats["evictions"] += 1
+            stats["misses"] += 1
+            return None
+        conn.execute("UPDATE extraction_cache SET last_hit = ? WHERE key = ?", (now, key))
+        conn.commit()
+        stats["hits"] += 1
+    return json.loads(row[0])
+
+def put(key: str, result: Dict[str, Any]) -> None:
+    if not EXTRACTION_CACHE_ENABLED:
+        return
+    # Resultados vacíos (fallback del modelo) no se guardan: conviene reintentar
+    if not result.get("fields"):
+        return
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute("INSERT OR REPLACE INTO extraction_cache(key, result, created_at, last_hit) VALUES (?, ?, ?, ?)",
+                     (key, json.dumps(result), now, now))
+        stats["stores"] += 1
+        _evict(conn, now)
+        conn.commit()
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    # TTL
+    cur = conn.execute("DELETE FROM extraction_cache WHERE created_at < ?", (now - EXTRACTION_CACHE_TTL_S,))
+    stats["evictions"] += cur.rowcount
+    # Tamaño: conserva las N entradas usadas más recientemente (LRU)
+    cur = conn.execute("""DELETE FROM extraction_cache WHERE key IN (
+                             SELECT key FROM extraction_cache ORDER BY last_hit DESC LIMIT -1 OFFSET ?)""",
+                       (EXTRACTION_CACHE_MAX_ENTRIES,))
+    stats["evictions"] += cur.rowcount
+
+def clear() -> None:
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM extraction_cache")
+        conn.commit()
+
+def get_stats() -> Dict[str, Any]:
+    with _lock:
+        entries = _get_conn().execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+    total = stats["hits"] + stats["misses"]
+    return {**stats, "entries": entries, "hit_rate": (stats["hits"] / total) if total else None}
@@ -0,0 +1,85 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from ..models import Issue
+from ..settings import EXTRACT_GROUP_PAGES, EXTRACT_GROUP_CHARS, EXTRACT_MAX_GROUPS
+
+# Map-reduce de extracción: divide el contexto en grupos de páginas (map), una llamada
+# al modelo por grupo, y fusiona los fields por ruta canónica con la mayor confianza (reduce).
+
+Page = Tuple[int, str]
+
+def split_groups(pages: List[Page], tables: List[Dict[str, Any]],
+                 max_pages: int = EXTRACT_GROUP_PAGES, max_chars: int = EXTRACT_GROUP_CHARS,
+                 max_groups: int = EXTRACT_MAX_GROUPS) -> List[Dict[str, Any]]:
+    """Grupos de páginas consecutivas acotados por páginas y caracteres."""
+    groups: List[List[Page]] = []
+    cur: List[Page] = []
+    size = 0
+    for pn, t in pages:
+        if cur and (len(cur) >= max_pages or size + len(t) > max_chars):
+            groups.append(cur)
+            cur, size = [], 0
+        cur.append((pn, t))
+        size += len(t)
+    if cur:
+        groups.append(cur)
+    if len(groups) > max_groups:
+        # Demasiados grupos: se reparte en max_groups bloques contiguos
+        per = -(-len(pages) // max_groups)
+        groups = [pages[i:i + per] for i in range(0, len(pages), per)]
+
+    out = []
+    for gi, g in enumerate(groups):
+        nums = {pn for pn, _ in g}
+        g_tables = [t for t in tables if t.get("page") in nums or (gi == 0 and t.get("page") is None)]
+        out.append({
+            "pages": [pn for pn, _ in g],
+            "text": "".join(f"\n[PAGE {pn}]\n{t}" for pn, t in g).strip(),
+            "tables": g_tables,
+        })
+    return out
+
+def needs_mapreduce(pages: List[Page], max_pages: int = EXTRACT_GROUP_PAGES,
+                    max_chars: int = EXTRACT_GROUP_CHARS) -> bool:
+    return len(pages) > max_pages or sum(len(t) for _, t in pages) > max_chars
+
+def _vote(values: List[Optional[str]]) -> Tuple[Optional[str], List[str]]:
+    seen = [str(v).strip().upper() for v in values if v not in (None, "")]
+    if not seen:
+        return None, []
+    winner = Counter(seen).most_common(1)[0][0]
+    # Devuelve el valor original (no normalizado) del ganador
+    original = next(v for v in values if v not in (None, "") and str(v).strip().upper() == winner)
+    return original, sorted(set(seen))
+
+def merge_results(results: List[Dict[str, Any]], groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fusiona por ruta con la mayor confianza (un valor no nulo gana a uno nulo)."""
+    best: Dict[str, Dict[str, Any]] = {}
+    for res, group in zip(results, groups):
+        for item in res.get("fields") or []:
+            path = item.get("path")
+            if not path:
+                continue
+            cand = {**item, "_pages": group["pages"]}
+            cur = best.get(path)
+            key = (item.get("value") is not None, float(item.get("confidence") or 0.0))
+            if cur is None or key > (cur.get("value") is not None, float(cur.get("confidence") or 0.0)):
+                best[path] = cand
+
+    merged: Dict[str, Any] = {"fields": list(best.values()), "conflicts": {}}
+    for meta in ("period", "currency", "scale_hint"):
+        value, distinct = _vote([r.get(meta) for r in results])
+        merged[meta] = value
+        if len(distinct) > 1:
+            merged["conflicts"][meta] = distinct
+    return merged
+
+CONFLICT_CODES = {"period": "PERIOD_MISMATCH", "currency": "CURRENCY_MISMATCH", "scale_hint": "SCALE_MISMATCH"}
+CONFLICT_MESSAGES = {"period": "Los grupos de páginas reportan periodos distintos",
+                     "currency": "Los grupos de páginas reportan monedas distintas",
+                     "scale_hint": "Los grupos de páginas reportan escalas distintas"}
+
+def conflict_issues(conflicts: Dict[str, List[str]]) -> List[Issue]:
+    return [Issue(code=CONFLICT_CODES[k], message=f"{CONFLICT_MESSAGES[k]}: {', '.join(v)}",
+                  severity="error", fields=[f"meta.{k}"])
+            for k, v in conflicts.items()]
@@ -0,0 +1,212 @@
+import os, re, time, sqlite3, threading, argparse
+from typing import Any, Dict, List, Optional, Tuple
+from . import columnar
+from ..models import Financials, Ratios
+from ..settings import FIN_STORE_ENABLED, FIN_STORE_DB
+
+# Almacén persistente de estados finalizados (financials + ratios), una fila por
+# (entidad, periodo, moneda, escala) y una columna por ruta canónica / ratio.
+# Las series de tiempo y cortes transversales salen de una sola lectura indexada.
+
+SCALE_FACTORS = {"UNIDAD": 1.0, "MILES": 1e3, "MILLONES": 1e6}
+
+def _col(name: str) -> str:
+    # "income.revenue" -> income__revenue ; "ratios.gross_margin" -> ratios__gross_margin
+    return name.replace(".", "__")
+
+FIELD_COLUMNS = {p: _col(p) for p in columnar.FIELD_PATHS}
+RATIO_COLUMNS = {f"ratios.{r}": _col(f"ratios.{r}") for r in columnar.RATIO_NAMES}
+ALL_COLUMNS = {**FIELD_COLUMNS, **RATIO_COLUMNS}
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+MONTHS = ("ENE", "FEB", "MAR", "ABR", "MAY", "JUN", "JUL", "AGO", "SEP", "OCT", "NOV", "DIC")
+
+def parse_period(period: str) -> Optional[Tuple[int, str]]:
+    """(yyyymm, tipo) de un periodo: 2024 / 2024Q3 / 2024T3 / 3T2024 / 2024-09 / dic-2024.
+    tipo: "A" anual, "Q" trimestre, "M" mes. El año se quita antes de buscar trimestre o mes
+    (si no, el último dígito del año seguido de Q/T se leería como trimestre)."""
+    p = (period or "").upper()
+    m = re.search(r"(19|20)\d{2}", p)
+    if not m:
+        return None
+    year = int(m.group(0))
+    rest = p[:m.start()] + " " + p[m.end():]
+    q = re.search(r"(?:Q|T)([1-4])\b|\b([1-4])(?:Q|T)", rest)
+    if q:
+        return year * 100 + int(q.group(1) or q.group(2)) * 3, "Q"
+    mm = re.search(r"(?:^|[-/])(0?[1-9]|1[0-2])(?:$|[-/])", rest.strip())
+    if mm:
+        return year * 100 + int(mm.group(1)), "M"
+    for i, name in enumerate(MONTHS):
+        if name in rest:
+            return year * 100 + i + 1, "M"
+    return year * 100 + 12, "A"  # anual = cierre de año
+
+def period_ord(period: str) -> Optional[int]:
+    """Orden cronológico de un periodo -> yyyymm (ver parse_period)."""
+    parsed = parse_period(period)
+    return parsed[0] if parsed else None
+
+def _parse_or_raise(period: str) -> Tuple[int, str]:
+    parsed = parse_period(period)
+    if parsed is None:
+        raise ValueError(f"Periodo no reconocido: {period!r}")
+    return parsed
+
+def _ord_or_raise(period: str) -> int:
+    return _parse_or_raise(period)[0]
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(FIN_STORE_DB), exist_ok=True)
+        _conn = sqlite3.connect(FIN_STORE_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        cols = ",\n".join(f"{c} REAL" for c in ALL_COLUMNS.values())
+        _conn.execute(f"""CREATE TABLE IF NOT EXISTS financials (
+                            entity TEXT NOT NULL,
+                            period TEXT NOT NULL,
+                            currency TEXT NOT NULL,
+                            scale TEXT NOT NULL,
+                            period_ord INTEGER,
+                            period_kind TEXT,
+                            run_id TEXT,
+                            updated_at REAL NOT NULL,
+                            {cols},
+                            PRIMARY KEY (entity, period, currency, scale))""")
+        # Columnas nuevas del modelo (si el esquema creció)
+        have = {r[1] for r in _conn.execute("PRAGMA table_info(financials)")}
+        for c in ALL_COLUMNS.values():
+            if c not in have:
+                _conn.execute(f"ALTER TABLE financials ADD COLUMN {c} REAL")
+        if "period_kind" not in have:
+            # Esquema anterior: sin tipo de periodo y con el orden de trimestres mal calculado
+            _conn.execute("ALTER TABLE financials ADD COLUMN period_kind TEXT")
+            rows = _conn.execute("SELECT DISTINCT period FROM financials").fetchall()
+            for (period,) in rows:
+                o, kind = parse_period(period) or (None, None)
+                _conn.execute("UPDATE financials SET period_ord = ?, period_kind = ? WHERE period = ?",
+                              (o, kind, period))
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_fin_entity_ord ON financials(entity, period_ord)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_fin_ord_entity ON financials(period_ord, entity)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_fin_run ON financials(run_id)")
+        _conn.commit()
+    return _conn
+
+def upsert(entity: str, fin: Financials, ratios: Optional[Ratios], run_id: Optional[str] = None) -> None:
+    """Guarda (o reemplaza) el estado finalizado de una entidad/periodo."""
+    if not FIN_STORE_ENABLED:
+        return
+    values: Dict[str, Any] = {}
+    for path, c in FIELD_COLUMNS.items():
+        sec, attr = path.split(".")
+        values[c] = getattr(getattr(fin, sec), attr)
+    for name, c in RATIO_COLUMNS.items():
+        values[c] = getattr(ratios, name.split(".", 1)[1]) if ratios is not None else None
+    o, kind = parse_period(fin.period) or (None, None)
+    row = {"entity": entity, "period": fin.period, "currency": fin.currency, "scale": fin.scale,
+           "period_ord": o, "period_kind": kind, "run_id": run_id, "updated_at": time.time(), **values}
+    names = ", ".join(row)
+    marks = ", ".join("?" for _ in row)
+    with _lock:
+        conn = _get_conn()
+        conn.execute(f"INSERT OR REPLACE INTO financials ({names}) VALUES ({marks})", list(row.values()))
+        conn.commit()
+
+def _select_columns(fields: Optional[List[str]]) -> Dict[str, str]:
+    if not fields:
+        return ALL_COLUMNS
+    unknown = [f for f in fields if f not in ALL_COLUMNS]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {unknown}")
+    return {f: ALL_COLUMNS[f] for f in fields}
+
+def _columnar(rows: List[sqlite3.Row], keys: List[str], cols: Dict[str, str], normalize: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {k: [r[k] for r in rows] for k in keys}
+    factors = [SCALE_FACTORS.get(r["scale"], 1.0) if normalize else 1.0 for r in rows]
+    out["values"] = {
+        # Ratios son adimensionales: no se escalan
+        f: [None if r[c] is None else (r[c] if f.startswith("ratios.") else r[c] * k) for r, k in zip(rows, factors)]
+        for f, c in cols.items()
+    }
+    return out
+
+def series(entity: str, fields: Optional[List[str]] = None, currency: Optional[str] = None,
+           start: Optional[str] = None, end: Optional[str] = None, normalize: bool = False) -> Dict[str, Any]:
+    """Serie de tiempo de una entidad (orden cronológico), columnar: {period, values: {campo: [...]}}."""
+    cols = _select_columns(fields)
+    where, args = ["entity = ?"], [entity]
+    if currency:
+        where.append("currency = ?"); args.append(currency)
+    if start:
+        where.append("period_ord >= ?"); args.append(_ord_or_raise(start))
+    if end:
+        where.append("period_ord <= ?"); args.append(_ord_or_raise(end))
+    sql = (f"SELECT period, currency, scale, run_id, {', '.join(cols.values())} FROM financials "
+           f"WHERE {' AND '.join(where)} ORDER BY period_ord, period")
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute(sql, args).fetchall()
+    out = _columnar(rows, ["period", "currency", "scale", "run_id"], cols, normalize)
+    return {"entity": entity, "normalized": normalize, **out}
+
+def cross_section(period: str, fields: Optional[List[str]] = None, entities: Optional[List[str]] = None,
+                  currency: Optional[str] = None, normalize: bool = True) -> Dict[str, Any]:
+    """Todas (o algunas) entidades en un periodo, columnar: {entity, period, values: {campo: [...]}}.
+    Sólo periodos del mismo tipo: "2024" (anual) no se mezcla con "2024Q4" ni "dic-2024"; `period`
+    por fila conserva la etiqueta original ("2024Q3" y "3T2024" caen en el mismo corte)."""
+    cols = _select_columns(fields)
+    o, kind = _parse_or_raise(period)
+    where, args = ["period_ord = ?", "period_kind = ?"], [o, kind]
+    if entities:
+        where.append(f"entity IN ({', '.join('?' for _ in entities)})"); args += entities
+    if currency:
+        where.append("currency = ?"); args.append(currency)
+    sql = (f"SELECT entity, period, currency, scale, run_id, {', '.join(cols.values())} FROM financials "
+           f"WHERE {' AND '.join(where)} ORDER BY entity")
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute(sql, args).fetchall()
+    out = _columnar(rows, ["entity", "period", "currency", "scale", "run_id"], cols, normalize)
+    return {"as_of": period, "normalized": normalize, **out}
+
+def entities(limit: int = 1000, offset: int = 0) -> List[Dict[str, Any]]:
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute("""SELECT entity, COUNT(*), MIN(period_ord), MAX(period_ord), MAX(updated_at)
+                               FROM financials GROUP BY entity ORDER BY entity LIMIT ? OFFSET ?""",
+                            (limit, offset)).fetchall()
+    return [{"entity": r[0], "periods": r[1], "first_ord": r[2], "last_ord": r[3], "updated_at": r[4]} for r in rows]
+
+def backfill(checkpoint_db: str) -> int:
+    """Carga al almacén las corridas terminadas que hoy sólo viven en checkpoints.db."""
+    from ..graph.retention import latest_states
+    n = 0
+    for thread_id, values in latest_states(checkpoint_db):
+        fin, ratios = values.get("financials"), values.get("ratios")
+        if fin is None or ratios is None:
+            continue
+        upsert(entity_for(values), fin, ratios, run_id=thread_id)
+        n += 1
+    return n
+
+def entity_for(state: Dict[str, Any]) -> str:
+    # Sin entidad declarada: el documento (mismo contenido => misma entidad)
+    if state.get("entity"):
+        return state["entity"]
+    return f"doc:{(state.get('doc_hash') or state.get('doc_id') or 'unknown')[:16]}"
+
+def main(argv=None) -> None:
+    from ..settings import CHECKPOINT_DB
+    ap = argparse.ArgumentParser(description="Almacén de financials: backfill desde checkpoints")
+    ap.add_argument("--backfill", action="store_true")
+    ap.add_argument("--db", default=CHECKPOINT_DB)
+    args = ap.parse_args(argv)
+    if args.backfill:
+        print(f"📥 Corridas cargadas: {backfill(args.db)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,96 @@
-import os, mimetypes, uuid
-from google.cloud import storage
-from ..settings import GCS_BUCKET
+import os, mimetypes, shutil, hashlib
+from functools import lru_cache
+from typing import BinaryIO, Optional, Tuple
+from ..settings import (GCS_BUCKET, GCS_BACKEND, GCS_LOCAL_DIR, GCS_CHUNKED_THRESHOLD,
+                        GCS_CHUNK_SIZE, GCS_UPLOAD_WORKERS)
 
-def upload_to_gcs(local_path: str) -> str:
+# Llaves por contenido: bytes idénticos => mismo objeto, se reutiliza sin volver a subir.
+
+class HashingReader:
+    """Envuelve un file-like y calcula sha256 conforme se lee (un solo pase).
+    Sólo lectura secuencial: no sirve para subidas que rebobinan al reintentar."""
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        chunk = self.raw.read(n)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    def tell(self) -> int:
+        return self.size
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+def object_key(content_hash: str, ext: str) -> str:
+    return f"uploads/{content_hash}{ext.lower()}"
+
+def _content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+class _GCSBackend:
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self.bucket = _client().bucket(bucket_name)
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(key).exists()
+
+    def upload_file(self, local_path: str, key: str, content_type: str) -> None:
+        blob = self.bucket.blob(key)
+        if os.path.getsize(local_path) >= GCS_CHUNKED_THRESHOLD:
+            # Subida por partes en paralelo (XML multipart) para archivos grandes
+            from google.cloud.storage import transfer_manager
+            transfer_manager.upload_chunks_concurrently(
+                local_path, blob, content_type=content_type, chunk_size=GCS_CHUNK_SIZE,
+                worker_type=transfer_manager.THREAD, max_workers=GCS_UPLOAD_WORKERS)
+        else:
+            blob.upload_from_filename(local_path, content_type=content_type)
+
+class _LocalBackend:
+    """Sustituto en disco del bucket para pruebas; mismas llaves y URIs gs://."""
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self.root = os.path.join(GCS_LOCAL_DIR, bucket_name)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def upload_file(self, local_path: str, key: str, content_type: str) -> None:
+        os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+        shutil.copyfile(local_path, self._path(key))
+
+@lru_cache(maxsize=1)
+def _client():
+    # Un solo cliente por proceso (reutiliza sesión HTTP y credenciales); import diferido (arranque)
+    from google.cloud import storage
+    return storage.Client()
+
+@lru_cache(maxsize=1)
+def get_backend():
     if not GCS_BUCKET:
         raise RuntimeError("GCS_BUCKET no configurado")
-    client = storage.Client()
-    bucket = client.bucket(GCS_BUCKET)
-    key = f"uploads/{uuid.uuid4().hex}{os.path.splitext(local_path)[1]}"
-    blob = bucket.blob(key)
-    content_type = mimetypes.guess_type(local_path)[0] or "application/octet-stream"
-    blob.upload_from_filename(local_path, content_type=content_type)
-    return f"gs://{GCS_BUCKET}/{key}", content_type
+    if GCS_BACKEND == "local":
+        return _LocalBackend(GCS_BUCKET)
+    return _GCSBackend(GCS_BUCKET)
+
+def upload_to_gcs(local_path: str, content_hash: Optional[str] = None) -> Tuple[str, str]:
+    backend = get_backend()
+    if content_hash is None:
+        with open(local_path, "rb") as f:
+            reader = HashingReader(f)
+            while reader.read(1 << 20):
+                pass
+        content_hash = reader.hexdigest()
+    key = object_key(content_hash, os.path.splitext(local_path)[1])
+    content_type = _content_type(local_path)
+    if not backend.exists(key):
+        backend.upload_file(local_path, key, content_type)
+    return f"gs://{backend.bucket_name}/{key}", content_type
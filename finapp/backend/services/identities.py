@@ -0,0 +1,195 @@
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from ..models import Financials, ExtractionField
+from ..settings import IDENTITY_SOLVER_ENABLED, IDENTITY_CONF_DECAY, IDENTITY_CONFLICT_MAX_CONF
+from . import columnar, metrics
+from .rules import ABS_TOL, REL_TOL  # las mismas que las reglas de identidad
+
+# Identidades contables lineales: lhs = suma con signo de rhs ("-ruta" resta, como en rules).
+# Si de una identidad se conocen todas las rutas menos una, la faltante se despeja; se itera
+# hasta un punto fijo porque un campo derivado puede habilitar otra identidad
+# (no circulante -> activo total -> capital). Sólo se llenan campos vacíos: un valor del
+# documento o del usuario nunca se pisa. El primer despeje no garantiza consistencia: una
+# identidad con todos sus términos presentes puede no cuadrar (p.ej. activo total = P + C
+# pero ≠ circulante + no circulante); `conflicts` las detecta y los derivados involucrados
+# bajan de confianza para que pasen por revisión.
+
+IDENTITIES: List[Dict[str, Any]] = [
+    {"id": "accounting_equation", "label": "Activos = Pasivos + Capital",
+     "lhs": "balance.total_assets", "rhs": ["balance.total_liabilities", "balance.shareholders_equity"]},
+    {"id": "assets_subtotals", "label": "Activo total = Circulante + No circulante",
+     "lhs": "balance.total_assets", "rhs": ["balance.current_assets", "balance.non_current_assets"]},
+    {"id": "liabilities_subtotals", "label": "Pasivo total = Circulante + No circulante",
+     "lhs": "balance.total_liabilities", "rhs": ["balance.current_liabilities", "balance.non_current_liabilities"]},
+    {"id": "gross_profit", "label": "Utilidad bruta = Ingresos − Costo de ventas",
+     "lhs": "income.gross_profit", "rhs": ["income.revenue", "-income.cogs"]},
+    {"id": "free_cash_flow", "label": "Flujo libre = Flujo de operación − CAPEX",
+     "lhs": "cashflow.free_cf", "rhs": ["cashflow.operating_cf", "-cashflow.capex"]},
+]
+
+# Se leen en magnitud: el documento puede presentarlos negativos o entre paréntesis
+MAGNITUDES = {"cashflow.capex"}
+
+def _terms(identity: Dict[str, Any]) -> List[Tuple[float, str]]:
+    # sum(coef * x) == 0
+    out = [(1.0, identity["lhs"])]
+    for t in identity["rhs"]:
+        out.append((1.0, t[1:]) if t.startswith("-") else (-1.0, t))
+    return out
+
+TERMS = {i["id"]: _terms(i) for i in IDENTITIES}
+BY_ID = {i["id"]: i for i in IDENTITIES}
+PATHS = sorted({p for terms in TERMS.values() for _, p in terms})
+
+def _get(fin: Financials, path: str) -> Optional[float]:
+    sec, attr = path.split(".")
+    v = getattr(getattr(fin, sec), attr)
+    return abs(v) if v is not None and path in MAGNITUDES else v
+
+def _set(fin: Financials, path: str, value: Optional[float]) -> None:
+    sec, attr = path.split(".")
+    setattr(getattr(fin, sec), attr, value)
+
+def is_derived(field: Optional[ExtractionField]) -> bool:
+    return field is not None and bool(field.source_hint) and "derived" in field.source_hint
+
+def closure(known: Iterable[str]) -> Set[str]:
+    """Rutas conocidas + las que se podrían derivar de ellas (sin valores; p.ej. para cobertura)."""
+    have = set(known)
+    changed = True
+    while changed:
+        changed = False
+        for terms in TERMS.values():
+            missing = [p for _, p in terms if p not in have]
+            if len(missing) == 1:
+                have.add(missing[0])
+                changed = True
+    return have
+
+def _confidence(fin: Financials, path: str) -> float:
+    # Sin entrada en fields_raw el valor lo fijó el usuario (o un what-if): confianza plena
+    f = fin.fields_raw.get(path)
+    return f.confidence if f is not None else 1.0
+
+def conflicts(fin: Financials) -> List[str]:
+    """Identidades con todos sus términos presentes que no cuadran dentro de tolerancia."""
+    out: List[str] = []
+    for ident_id, terms in TERMS.items():
+        values = [_get(fin, p) for _, p in terms]
+        if any(v is None for v in values):
+            continue
+        lhs = values[0]
+        rhs = -sum(c * v for (c, _), v in zip(terms[1:], values[1:]))
+        if abs(lhs - rhs) > max(ABS_TOL, REL_TOL * max(abs(lhs), abs(rhs))):
+            out.append(ident_id)
+    return out
+
+def _flag_conflicts(fin: Financials) -> None:
+    # Un derivado en una identidad que no cuadra (y lo que se despejó a partir de él) salió de
+    # datos contradictorios: queda marcado y con confianza por debajo de CONF_MED
+    hit: Dict[str, List[str]] = {}
+    for ident_id in conflicts(fin):
+        paths = {p for _, p in TERMS[ident_id] if is_derived(fin.fields_raw.get(p))}
+        for p in paths | stale(fin, paths):
+            hit.setdefault(p, []).append(ident_id)
+    for p, ids in hit.items():
+        f = fin.fields_raw[p]
+        f.source_hint["conflicts"] = ids
+        f.confidence = min(f.confidence, IDENTITY_CONFLICT_MAX_CONF)
+
+def solve(fin: Financials) -> List[str]:
+    """Llena (in place) los campos despejables; cada uno queda en fields_raw con su procedencia
+    (identidad y entradas) y confianza = mín(entradas) * IDENTITY_CONF_DECAY, topada en
+    IDENTITY_CONFLICT_MAX_CONF si alguna identidad que lo involucra no cuadra. Devuelve las
+    rutas derivadas en el orden en que se obtuvieron."""
+    if not IDENTITY_SOLVER_ENABLED:
+        return []
+    # Los marcados en un pase anterior se vuelven a despejar: la corrección que resolvió el
+    # conflicto no necesariamente tocó sus entradas
+    flagged = {p for p, f in fin.fields_raw.items() if is_derived(f) and "conflicts" in f.source_hint}
+    for p in flagged | stale(fin, flagged):
+        _set(fin, p, None)
+        del fin.fields_raw[p]
+    derived: List[str] = []
+    progress = True
+    while progress:
+        progress = False
+        for ident_id, terms in TERMS.items():
+            values = {p: _get(fin, p) for _, p in terms}
+            missing = [(c, p) for c, p in terms if values[p] is None]
+            if len(missing) != 1:
+                continue
+            coef, target = missing[0]
+            value = -sum(c * values[p] for c, p in terms if p != target) / coef
+            inputs = [p for _, p in terms if p != target]
+            units = [fin.fields_raw[p].unit for p in inputs if p in fin.fields_raw and fin.fields_raw[p].unit]
+            _set(fin, target, value)
+            fin.fields_raw[target] = ExtractionField(
+                path=target,
+                label=f"Derivado: {BY_ID[ident_id]['label']}",
+                value=value,
+                unit=units[0] if units else None,
+                confidence=round(min(_confidence(fin, p) for p in inputs) * IDENTITY_CONF_DECAY, 4),
+                source_hint={"derived": ident_id, "inputs": inputs},
+            )
+            metrics.IDENTITY_DERIVED.inc(identity=ident_id)
+            derived.append(target)
+            progress = True
+    _flag_conflicts(fin)
+    return derived
+
+def solve_columns(cols: Dict[str, np.ndarray]) -> Set[str]:
+    """Versión vectorizada de `solve` sobre columnas (NaN = ausente), sin procedencia: cada
+    fila se despeja por separado. Modifica `cols` in place; devuelve las rutas tocadas."""
+    if not IDENTITY_SOLVER_ENABLED or not cols:
+        return set()
+    n = len(next(iter(cols.values())))
+    touched: Set[str] = set()
+    progress = True
+    while progress:
+        progress = False
+        for terms in TERMS.values():
+            values = [(c, p, columnar.column(cols, p)) for c, p in terms]
+            values = [(c, p, np.abs(v) if p in MAGNITUDES else v) for c, p, v in values]
+            nan = np.stack([np.isnan(v) for _, _, v in values])
+            one = nan.sum(axis=0) == 1
+            if not one.any():
+                continue
+            for i, (coef, target, _) in enumerate(values):
+                rows = one & nan[i]
+                if not rows.any():
+                    continue
+                acc = np.zeros(n)
+                for j, (c, _, v) in enumerate(values):
+                    if j != i:
+                        acc = acc + c * np.nan_to_num(v)
+                out = columnar.column(cols, target).astype(np.float64, copy=True)
+                out[rows] = -acc[rows] / coef
+                cols[target] = out
+                touched.add(target)
+                progress = True
+    return touched
+
+def stale(fin: Financials, changed: Iterable[str]) -> Set[str]:
+    """Campos derivados que leen (directa o transitivamente) alguna ruta de `changed`."""
+    out: Set[str] = set()
+    frontier = set(changed)
+    while frontier:
+        hit = {p for p, f in fin.fields_raw.items()
+               if p not in out and is_derived(f) and frontier & set(f.source_hint["inputs"])}
+        out |= hit
+        frontier = hit
+    return out
+
+def invalidate(fin: Financials, changed: Iterable[str]) -> Set[str]:
+    """Vacía (in place) los derivados que dependen de `changed` para volver a despejarlos.
+    Una ruta cambiada que era derivada pasa a ser del usuario y ya no se recalcula."""
+    changed = set(changed)
+    for path in changed:
+        if is_derived(fin.fields_raw.get(path)):
+            del fin.fields_raw[path]
+    out = stale(fin, changed)
+    for path in out:
+        _set(fin, path, None)
+        del fin.fields_raw[path]
+    return out
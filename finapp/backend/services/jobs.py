@@ -0,0 +1,143 @@
+import asyncio, time, uuid
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ..models import JobStatus
+from . import metrics
+from ..settings import INGEST_WORKERS, JOB_QUEUE_MAX, JOB_RETENTION
+
+# Cola de trabajos en memoria con un pool acotado de workers asyncio.
+# Un trabajo = una corrida del grafo; el cliente sólo espera el encolado.
+# La cola y los resultados en memoria son del proceso; cada cambio de estado se persiste en
+# `store` (el checkpointer: tabla ingest_jobs junto al catálogo de corridas), así /jobs responde
+# desde cualquier instancia y tras un reinicio, y el resultado se reconstruye del checkpoint.
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    def __init__(self, workers: int = INGEST_WORKERS, maxsize: int = JOB_QUEUE_MAX, retention: int = JOB_RETENTION):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.retention = retention
+        self.jobs: "OrderedDict[str, JobStatus]" = OrderedDict()
+        self.results: Dict[str, Any] = {}
+        self.store = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, store=None) -> None:
+        """Arranca los workers en el event loop del servidor (lifespan de la app)."""
+        if self._queue is not None:
+            return
+        self.store = store
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancela los workers; lo que no terminó queda FAILED (la corrida sigue en su checkpoint)."""
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await t
+        for job in self.jobs.values():
+            if job.status in ("QUEUED", "RUNNING"):
+                job.status = "FAILED"
+                job.error = "Interrumpido al apagar la instancia"
+                job.finished_at = time.time()
+                await self._persist(job)
+        self._queue, self._tasks = None, []
+
+    async def _persist(self, job: JobStatus) -> None:
+        if self.store is None:
+            return
+        try:
+            await self.store.aput_job(job.model_dump())
+        except Exception as e:
+            print(f"⚠️ No se pudo persistir el trabajo {job.job_id}: {e}")
+
+    async def submit(self, run_id: str, doc_id: str, filename: Optional[str],
+                     fn: Callable[[], Awaitable[Any]]) -> JobStatus:
+        if self._queue is None:
+            raise RuntimeError("Cola de ingesta no iniciada; usa start() en el arranque de la app")
+        job = JobStatus(job_id=uuid.uuid4().hex, run_id=run_id, doc_id=doc_id,
+                        filename=filename, created_at=time.time())
+        # Persistido antes de encolar: un worker puede tomarlo en cuanto entra a la cola
+        self.jobs[job.job_id] = job
+        await self._persist(job)
+        try:
+            self._queue.put_nowait((job.job_id, fn))
+        except asyncio.QueueFull:
+            job.status = "FAILED"
+            job.error = "Cola de ingesta llena"
+            await self._persist(job)
+            raise QueueFull("Cola de ingesta llena")
+        self._trim()
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id, fn = await self._queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job is None:
+                    continue
+                job.status = "RUNNING"
+                job.started_at = time.time()
+                await self._persist(job)
+                result = await fn()
+                self.results[job_id] = result
+                job.result_status = result.get("status") if isinstance(result, dict) else None
+                job.status = "DONE"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if job is not None:
+                    job.status = "FAILED"
+                    job.error = f"{type(e).__name__}: {e}"
+            finally:
+                if job is not None and job.status != "RUNNING":
+                    job.finished_at = time.time()
+                    await self._persist(job)
+                self._queue.task_done()
+
+    def _trim(self):
+        # Olvida (de memoria) los trabajos terminados más viejos por encima de la retención
+        excess = len(self.jobs) - self.retention
+        if excess <= 0:
+            return
+        for job_id in [j.job_id for j in self.jobs.values() if j.status in ("DONE", "FAILED")][:excess]:
+            self.jobs.pop(job_id, None)
+            self.results.pop(job_id, None)
+
+    def free_slots(self) -> int:
+        if self._queue is None:
+            return self.maxsize
+        return self.maxsize - self._queue.qsize()
+
+    async def get(self, job_id: str) -> Optional[JobStatus]:
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            row = await self.store.aget_job(job_id)
+            job = JobStatus(**row) if row else None
+        return job
+
+    def result(self, job_id: str) -> Any:
+        return self.results.get(job_id)
+
+    async def list(self, status: Optional[str] = None, limit: int = 100) -> List[JobStatus]:
+        if self.store is not None:
+            return [JobStatus(**row) for row in await self.store.alist_jobs(status, limit)]
+        jobs = [j for j in reversed(self.jobs.values()) if status is None or j.status == status]
+        return jobs[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        # Trabajos de esta instancia (la cola y los workers son por proceso)
+        counts = {"QUEUED": 0, "RUNNING": 0, "DONE": 0, "FAILED": 0}
+        for j in self.jobs.values():
+            counts[j.status] = counts.get(j.status, 0) + 1
+        return {**counts, "workers": self.workers}
+
+ingest_queue = JobQueue()
+metrics.register_collector("finapp_ingest_jobs", "Trabajos de ingesta por estado", "gauge", ingest_queue.stats)
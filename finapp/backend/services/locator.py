@@ -0,0 +1,101 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from . import tables as tbl
+from ..settings import LOCATOR_MAX_PAGES, LOCATOR_MAX_TABLES, LOCATOR_MIN_REL_SCORE
+
+# Localizador local de páginas con estados financieros: puntúa cada página y tabla
+# para mandar al modelo sólo lo relevante (no portada, carta del auditor ni notas).
+
+LOCATOR_VERSION = "2"
+
+_PAGE_RE = re.compile(r"\[PAGE (\d+)\]\n")
+_NUM_RE = re.compile(r"\(?-?\$?\d{1,3}(?:[,.\s]\d{3})+(?:\.\d+)?\)?|\(?-?\$?\d{4,}(?:\.\d+)?\)?")
+
+# (patrón, peso). Títulos de estados pesan más que partidas sueltas.
+_POSITIVE: List[Tuple[re.Pattern, float]] = [(re.compile(p, re.I), w) for p, w in [
+    (r"estados? (consolidados? )?de situaci[oó]n financiera|balance general|statement of financial position|balance sheet", 8),
+    (r"estados? (consolidados? )?de resultados( integrales)?|income statement|statement of (comprehensive )?income|profit and loss", 8),
+    (r"estados? (consolidados? )?de flujos? de efectivo|cash flow statement|statement of cash flows", 6),
+    (r"total (del )?activo|activo total|total assets", 4),
+    (r"total (del )?pasivo|pasivo total|total liabilities", 4),
+    (r"capital contable|patrimonio|shareholders'? equity|stockholders'? equity", 3),
+    (r"activo circulante|activos? corrientes?|current assets", 3),
+    (r"pasivo circulante|pasivos? corrientes?|current liabilities", 3),
+    (r"ingresos|ventas netas|revenue|net sales", 2),
+    (r"costo de ventas|cost of (sales|goods sold)", 2),
+    (r"utilidad (bruta|de operaci[oó]n|neta)|gross profit|operating income|net income", 2),
+    (r"efectivo y equivalentes|cash and cash equivalents", 2),
+    (r"al 31 de diciembre|por el a[nñ]o terminado|for the year ended|as of december", 2),
+    (r"en (miles|millones) de (pesos|d[oó]lares)|in (thousands|millions) of", 2),
+]]
+_NEGATIVE: List[Tuple[re.Pattern, float]] = [(re.compile(p, re.I), w) for p, w in [
+    (r"informe de los auditores|opini[oó]n|independent auditor", 6),
+    (r"notas a los estados financieros|notes to the (consolidated )?financial statements", 4),
+    (r"[íi]ndice|contenido|table of contents", 3),
+]]
+
+def config_tag() -> str:
+    # Cambia el contexto enviado al modelo => forma parte de la llave de caché de extracción
+    return f"loc{LOCATOR_VERSION}-{LOCATOR_MAX_PAGES}-{LOCATOR_MAX_TABLES}-{LOCATOR_MIN_REL_SCORE}"
+
+def split_pages(text: str) -> List[Tuple[int, str]]:
+    """Separa el texto de parse_document por marcadores [PAGE n]."""
+    parts = _PAGE_RE.split(text or "")
+    # parts = [pre, n1, t1, n2, t2, ...]
+    return [(int(parts[i]), parts[i + 1]) for i in range(1, len(parts) - 1, 2)]
+
+def _score_text(text: str) -> float:
+    score = 0.0
+    for rx, w in _POSITIVE:
+        score += w * min(3, len(rx.findall(text)))
+    for rx, w in _NEGATIVE:
+        if rx.search(text):
+            score -= w
+    # Densidad numérica: los estados son mayormente cifras
+    tokens = max(1, len(text.split()))
+    score += 10 * min(1.0, len(_NUM_RE.findall(text)) / tokens * 3)
+    return score
+
+def score_page(text: str) -> float:
+    return _score_text(text)
+
+def score_table(table: Dict[str, Any]) -> float:
+    return _score_text(tbl.to_text(table, max_rows=60))
+
+def locate(text: str, tables: List[Dict[str, Any]], max_pages: int = LOCATOR_MAX_PAGES,
+           max_tables: int = LOCATOR_MAX_TABLES) -> Dict[str, Any]:
+    """Elige las mejores páginas/tablas; devuelve el contexto reducido y las páginas usadas."""
+    pages = split_pages(text)
+    scores = {pn: round(score_page(t), 2) for pn, t in pages}
+    if len(pages) > max_pages:
+        ranked = sorted(scores, key=lambda pn: -scores[pn])
+        top = scores[ranked[0]]
+        # Descarta páginas muy por debajo de la mejor (portada, notas) si hay señal clara
+        strong = [pn for pn in ranked if scores[pn] > 0 and scores[pn] >= LOCATOR_MIN_REL_SCORE * top]
+        keep = sorted((strong or ranked)[:max_pages])
+    else:
+        keep = [pn for pn, _ in pages]
+    keep_set = set(keep)
+    sel_text = "".join(f"\n[PAGE {pn}]\n{t}" for pn, t in pages if pn in keep_set).strip() if pages else (text or "")
+
+    # Tablas: primero las de páginas elegidas (o sin página: CSV/XLSX), por puntaje
+    cand = [t for t in tables if t.get("page") is None or t.get("page") in keep_set] or list(tables)
+    ranked = sorted(cand, key=lambda t: -score_table(t))[:max_tables]
+    return {"pages": keep, "scores": scores, "text": sel_text, "tables": ranked}
+
+def _num_variants(v: float) -> List[str]:
+    out = set()
+    for x in (abs(v),):
+        if float(x).is_integer():
+            n = int(x)
+            out.update({f"{n:,}", f"{n}", f"{n:,}".replace(",", ".")})
+        else:
+            out.update({f"{x:,.2f}", f"{x:.2f}", f"{x:,.1f}"})
+    return [s for s in out if len(s) >= 3]
+
+def pages_for_value(value: Optional[float], pages: List[Tuple[int, str]]) -> List[int]:
+    """Páginas cuyo texto contiene el valor (para ExtractionField.source_hint)."""
+    if value is None:
+        return []
+    variants = _num_variants(value)
+    return [pn for pn, t in pages if any(s in t for s in variants)]
@@ -0,0 +1,221 @@
+import time, threading, functools, inspect, contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from ..settings import METRICS_ENABLED, METRICS_TRACE_RUNS, METRICS_TRACE_MAX_SPANS
+
+# Métricas en proceso con exposición en formato de texto Prometheus (sin dependencias
+# extra) y spans por run_id para ver dónde se va el tiempo de cada ingesta.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MiB
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_value(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for k, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        # por etiqueta: [conteos por bucket..., suma, total]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        k = _key(labels)
+        with self._lock:
+            row = self._values.get(k)
+            if row is None:
+                row = self._values[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for k, row in sorted(self._values.items()):
+                acc = 0.0
+                for b, c in zip(self.buckets, row):
+                    acc += c
+                    lines.append(f"{self.name}_bucket{_fmt_labels(k, (('le', _fmt_value(b)),))} {_fmt_value(acc)}")
+                lines.append(f"{self.name}_bucket{_fmt_labels(k, (('le', '+Inf'),))} {_fmt_value(row[-1])}")
+                lines.append(f"{self.name}_sum{_fmt_labels(k)} {_fmt_value(row[-2])}")
+                lines.append(f"{self.name}_count{_fmt_labels(k)} {_fmt_value(row[-1])}")
+        return lines
+
+_registry: List[Any] = []
+_collectors: List[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = []
+
+def counter(name: str, help: str) -> Counter:
+    m = Counter(name, help)
+    _registry.append(m)
+    return m
+
+def histogram(name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+    m = Histogram(name, help, buckets)
+    _registry.append(m)
+    return m
+
+def register_collector(name: str, help: str, kind: str, fn: Callable[[], Dict[str, float]]) -> None:
+    """Exporta al momento del scrape un dict {key: valor} ya existente (p. ej. stats de un módulo)."""
+    _collectors.append((name, help, kind, fn))
+
+# --- Métricas del pipeline ---
+NODE_SECONDS = histogram("finapp_node_duration_seconds", "Duración de cada nodo del grafo")
+NODE_ERRORS = counter("finapp_node_errors_total", "Excepciones por nodo del grafo")
+NODE_PAYLOAD_BYTES = histogram("finapp_node_payload_bytes", "Bytes serializados de la actualización de estado por nodo",
+                               SIZE_BUCKETS)
+STAGE_SECONDS = histogram("finapp_stage_duration_seconds", "Duración de etapas dentro de los nodos (gcs_upload, model_call, ...)")
+CHECKPOINT_SECONDS = histogram("finapp_checkpoint_write_seconds", "Duración de escrituras del checkpointer")
+MODEL_TOKENS = counter("finapp_model_tokens_total", "Tokens reportados por usage_metadata")
+MODEL_COST = counter("finapp_model_cost_usd_total", "Costo estimado de las llamadas al modelo (USD)")
+IDENTITY_DERIVED = counter("finapp_identity_derived_total", "Campos derivados por identidades contables")
+
+# --- Spans por run_id ---
+current_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("finapp_run_id", default=None)
+_traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+def _record_span(run_id: Optional[str], span: Dict[str, Any]) -> None:
+    if not run_id or not METRICS_ENABLED:
+        return
+    with _traces_lock:
+        spans = _traces.get(run_id)
+        if spans is None:
+            spans = _traces[run_id] = []
+            while len(_traces) > METRICS_TRACE_RUNS:
+                _traces.popitem(last=False)
+        if len(spans) < METRICS_TRACE_MAX_SPANS:
+            spans.append(span)
+
+def trace(run_id: str) -> Optional[List[Dict[str, Any]]]:
+    with _traces_lock:
+        spans = _traces.get(run_id)
+        return list(spans) if spans is not None else None
+
+@contextmanager
+def span(name: str, hist: Optional[Histogram] = STAGE_SECONDS, label: str = "stage",
+         run_id: Optional[str] = None, ok_exceptions: Tuple[type, ...] = (), **attrs):
+    """Mide un bloque: observa `hist` con {label: name} y guarda el span bajo el run_id activo.
+
+    El dict que se entrega permite agregar atributos dentro del bloque.
+    """
+    run_id = run_id or current_run_id.get()
+    started, t0 = time.time(), time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except ok_exceptions:
+        status = "interrupted"
+        raise
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        if hist is not None:
+            hist.observe(elapsed, **{label: name})
+        _record_span(run_id, {"name": f"{label}:{name}", "start": started, "duration_s": round(elapsed, 6),
+                              "status": status, **attrs})
+
+def instrument_node(name: str, fn: Callable, sizer: Optional[Callable[[Any], int]] = None,
+                    ok_exceptions: Tuple[type, ...] = ()) -> Callable:
+    """Envuelve un nodo (sync o async) con duración, errores, tamaño del update y span por run_id."""
+    @contextmanager
+    def _node_span(state):
+        run_id = state.get("run_id") if isinstance(state, dict) else None
+        token = current_run_id.set(run_id)
+        try:
+            with span(name, NODE_SECONDS, "node", run_id=run_id, ok_exceptions=ok_exceptions) as attrs:
+                yield attrs
+        except ok_exceptions:
+            raise
+        except Exception as e:
+            NODE_ERRORS.inc(node=name, error=type(e).__name__)
+            raise
+        finally:
+            current_run_id.reset(token)
+
+    def _measure(update, attrs):
+        if sizer is not None and update:
+            attrs["payload_bytes"] = size = sizer(update)
+            NODE_PAYLOAD_BYTES.observe(size, node=name)
+        return update
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(state):
+            with _node_span(state) as attrs:
+                return _measure(await fn(state), attrs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(state):
+            with _node_span(state) as attrs:
+                return _measure(fn(state), attrs)
+    return wrapper
+
+def record_model_usage(resp, prices: Tuple[float, float], model: str) -> Dict[str, int]:
+    """Suma tokens de `usage_metadata` y el costo estimado (precios USD por millón in/out)."""
+    usage = getattr(resp, "usage_metadata", None)
+    tokens = {
+        "prompt": int(getattr(usage, "prompt_token_count", 0) or 0),
+        "completion": int(getattr(usage, "candidates_token_count", 0) or 0),
+    }
+    for kind, n in tokens.items():
+        MODEL_TOKENS.inc(n, kind=kind, model=model)
+    MODEL_COST.inc((tokens["prompt"] * prices[0] + tokens["completion"] * prices[1]) / 1e6, model=model)
+    return tokens
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _registry:
+        lines.extend(m.render())
+    for name, help, kind, fn in _collectors:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for k, v in sorted((fn() or {}).items()):
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                lines.append(f"{name}{_fmt_labels((('key', str(k)),))} {_fmt_value(v)}")
+    return "\n".join(lines) + "\n"
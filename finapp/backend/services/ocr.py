@@ -0,0 +1,259 @@
+import os, re, json, time, sqlite3, threading
+from statistics import median
+from typing import Any, Dict, List, Optional, Tuple
+from . import metrics
+from ..settings import (OCR_ENABLED, OCR_LANG, OCR_PSM, OCR_DPI, OCR_TILE_PX, OCR_TILE_OVERLAP_PX,
+                        OCR_MIN_WORD_CONF, OCR_MIN_CHARS, OCR_CACHE_DB, OCR_CACHE_MAX_ENTRIES)
+
+# OCR local con Tesseract: imágenes subidas y páginas escaneadas de PDFs producen
+# {"page", "text", "tables"} igual que el camino de pdfplumber. Las imágenes altas se cortan
+# en franjas horizontales traslapadas que se reconocen en paralelo (pool de procesos).
+# pytesseract es opcional: sin él (o sin el binario) las imágenes siguen yendo a multimodal.
+# Se importa al usarse (arrastra PIL), fuera del arranque en frío.
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+# Importes de estados: 1,234.56 / (1.234) / -1 234 / $ 12 / 15% ; "$" suelto se ignora
+_AMOUNT = re.compile(r"^[(\-–]?[$€]?\d{1,3}(?:[,.\s]\d{3})*(?:[.,]\d+)?\)?%?$|^[(\-–]?[$€]?\d+(?:[.,]\d+)?\)?%?$")
+_CURRENCY = {"$", "€", "MXN", "USD"}
+_PERIOD = re.compile(r"^(?:(?:19|20)\d{2}|[1-4][QT]|[QT][1-4]|\d{4}[QT][1-4])$", re.I)
+
+_available: Optional[bool] = None
+
+def available() -> bool:
+    global _available
+    if _available is None:
+        _available = False
+        if OCR_ENABLED:
+            try:
+                import pytesseract
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception as e:
+                print(f"⚠️ OCR local deshabilitado: {e}")
+    return _available
+
+def config_tag() -> str:
+    # Parte de las llaves de caché: cambiar idioma, segmentación o cortes invalida los resultados
+    return f"ocr:{OCR_LANG}:psm{OCR_PSM}:dpi{OCR_DPI}:t{OCR_TILE_PX}-{OCR_TILE_OVERLAP_PX}:c{OCR_MIN_WORD_CONF:g}"
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTS
+
+def usable(text: str) -> bool:
+    """¿El OCR dio texto suficiente para el camino de texto (sin subir la imagen a multimodal)?"""
+    return len(text or "") >= OCR_MIN_CHARS and sum(bool(_AMOUNT.match(t)) for t in (text or "").split()) >= 5
+
+# --- Franjas ---
+
+def tiles(height: int, tile: int = OCR_TILE_PX, overlap: int = OCR_TILE_OVERLAP_PX) -> List[Tuple[int, int, int, int]]:
+    """[(y0, y1, keep0, keep1)]: franjas que cubren la imagen. Cada palabra se conserva sólo en la
+    franja dueña de su centro (mitad del traslape para cada lado), así no se duplican líneas."""
+    if height <= tile:
+        return [(0, height, 0, height)]
+    bounds = []
+    y = 0
+    while True:
+        y1 = min(y + tile, height)
+        bounds.append((y, y1))
+        if y1 >= height:
+            break
+        y += tile - overlap
+    out = []
+    for i, (y0, y1) in enumerate(bounds):
+        keep0 = y0 + overlap // 2 if i > 0 else 0
+        keep1 = y1 - overlap // 2 if i < len(bounds) - 1 else height
+        out.append((y0, y1, keep0, keep1))
+    return out
+
+def _words(img, dy: int = 0, keep: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+    import pytesseract
+    # Paralelismo por procesos: un hilo de Tesseract por worker evita sobre-suscribir la CPU
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    d = pytesseract.image_to_data(img.convert("L"), lang=OCR_LANG, config=f"--psm {OCR_PSM}",
+                                  output_type=pytesseract.Output.DICT)
+    out = []
+    for i, text in enumerate(d["text"]):
+        text = (text or "").strip()
+        conf = float(d["conf"][i])
+        if not text or conf < OCR_MIN_WORD_CONF:
+            continue
+        w = {"text": text, "x": d["left"][i], "y": d["top"][i] + dy, "w": d["width"][i], "h": d["height"][i],
+             "conf": conf}
+        cy = w["y"] + w["h"] / 2
+        if keep is None or keep[0] <= cy < keep[1]:
+            out.append(w)
+    return out
+
+def _ocr_tile(path: str, frame: int, box: Tuple[int, int, int, int], keep: Tuple[int, int]) -> List[Dict[str, Any]]:
+    # Se ejecuta en el worker: abre la imagen y recorta su franja (no viajan pixeles entre procesos)
+    from PIL import Image
+    with Image.open(path) as im:
+        im.seek(frame)
+        return _words(im.crop(box), dy=box[1], keep=keep)
+
+# --- Líneas y tablas ---
+
+def _lines(words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Agrupa palabras en líneas por el centro vertical (las franjas rompen los ids de línea de Tesseract)."""
+    if not words:
+        return []
+    tol = max(4.0, 0.6 * median(w["h"] for w in words))
+    lines: List[List[Dict[str, Any]]] = []
+    cy = None
+    for w in sorted(words, key=lambda w: (w["y"] + w["h"] / 2, w["x"])):
+        c = w["y"] + w["h"] / 2
+        if lines and abs(c - cy) <= tol:
+            lines[-1].append(w)
+            cy += (c - cy) / len(lines[-1])
+        else:
+            lines.append([w])
+            cy = c
+    return [sorted(line, key=lambda w: w["x"]) for line in lines]
+
+def _split(line: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # Etiqueta = palabras iniciales; importes = tokens numéricos al final de la línea
+    i = len(line)
+    while i > 0 and (_AMOUNT.match(line[i - 1]["text"]) or line[i - 1]["text"] in _CURRENCY):
+        i -= 1
+    return line[:i], [w for w in line[i:] if w["text"] not in _CURRENCY]
+
+def _columns(rights: List[float], gap: float) -> List[float]:
+    """Centros de columna a partir de los bordes derechos de los importes (alineados a la derecha)."""
+    clusters: List[List[float]] = []
+    for r in sorted(rights):
+        if clusters and r - clusters[-1][-1] <= gap:
+            clusters[-1].append(r)
+        else:
+            clusters.append([r])
+    return [sum(c) / len(c) for c in clusters]
+
+def _table(block: List[List[Dict[str, Any]]], header: Optional[List[Dict[str, Any]]]) -> List[List[Any]]:
+    split = [_split(line) for line in block]
+    nums = [w for _, ws in split for w in ws]
+    gap = 2 * median(w["h"] for w in nums)
+    cols = _columns([w["x"] + w["w"] for w in nums], gap)
+
+    def _place(ws: List[Dict[str, Any]]) -> List[Optional[str]]:
+        cells: List[Optional[str]] = [None] * len(cols)
+        for w in ws:
+            j = min(range(len(cols)), key=lambda k: abs(cols[k] - (w["x"] + w["w"])))
+            cells[j] = w["text"] if cells[j] is None else f"{cells[j]} {w['text']}"
+        return cells
+
+    # Mismo formato que pdfplumber: lista de filas (encabezado incluido) con celdas de texto
+    rows = []
+    if header is not None:
+        rows.append([None] + _place(header))
+    for label, ws in split:
+        rows.append([" ".join(w["text"] for w in label) or None] + _place(ws))
+    return rows
+
+def _tables(lines: List[List[Dict[str, Any]]], min_rows: int = 3) -> List[List[List[Any]]]:
+    """Bloques de líneas consecutivas con importes al final (se toleran subtítulos sueltos)."""
+    out = []
+    # Una línea sólo de periodos ("2024 2023") es encabezado, no fila de importes
+    header_like = [all(_PERIOD.match(w["text"]) for w in line) for line in lines]
+    numeric = [bool(_split(line)[1]) and not h for line, h in zip(lines, header_like)]
+    i = 0
+    while i < len(lines):
+        if not numeric[i]:
+            i += 1
+            continue
+        j = i
+        while j + 1 < len(lines) and (numeric[j + 1] or (j + 2 < len(lines) and numeric[j + 2])):
+            j += 1
+        block = lines[i:j + 1]
+        if sum(numeric[i:j + 1]) >= min_rows:
+            # Encabezado de periodos justo arriba del bloque
+            header = lines[i - 1] if i > 0 and header_like[i - 1] else None
+            out.append(_table(block, header))
+        i = j + 1
+    return out
+
+def page_result(page: int, words: List[Dict[str, Any]]) -> Dict[str, Any]:
+    lines = _lines(words)
+    return {"page": page, "text": "\n".join(" ".join(w["text"] for w in line) for line in lines),
+            "tables": _tables(lines)}
+
+# --- Entradas ---
+
+def ocr_pil(img, page: int) -> Dict[str, Any]:
+    """OCR de una imagen ya en memoria (página renderizada de un PDF), franja por franja en este proceso."""
+    words = []
+    for y0, y1, k0, k1 in tiles(img.height):
+        words += _words(img.crop((0, y0, img.width, y1)), dy=y0, keep=(k0, k1))
+    return page_result(page, words)
+
+def ocr_image(path: str, pool=None) -> List[Dict[str, Any]]:
+    """[{"page", "text", "tables"}] por cuadro de la imagen (un TIFF multipágina = varias páginas).
+    Con `pool` y más de una franja, las franjas se reconocen en paralelo."""
+    from PIL import Image
+    jobs = []
+    with Image.open(path) as im:
+        for frame in range(getattr(im, "n_frames", 1)):
+            im.seek(frame)
+            for y0, y1, k0, k1 in tiles(im.height):
+                jobs.append((frame, (0, y0, im.width, y1), (k0, k1)))
+    if pool is not None and len(jobs) > 1:
+        futures = [pool.submit(_ocr_tile, path, f, box, keep) for f, box, keep in jobs]
+        results = [fut.result() for fut in futures]
+    else:
+        results = [_ocr_tile(path, f, box, keep) for f, box, keep in jobs]
+    by_frame: Dict[int, List[Dict[str, Any]]] = {}
+    for (frame, _, _), words in zip(jobs, results):
+        by_frame.setdefault(frame, []).extend(words)
+    return [page_result(frame + 1, words) for frame, words in sorted(by_frame.items())]
+
+# --- Caché por contenido (OCR es determinista para un mismo archivo y configuración) ---
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+metrics.register_collector("finapp_ocr_cache_total", "Contadores de la caché de OCR", "counter", lambda: stats)
+
+def cache_key(content_hash: str, kind: str) -> str:
+    return f"{content_hash}:{kind}:{config_tag()}"
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(OCR_CACHE_DB), exist_ok=True)
+        _conn = sqlite3.connect(OCR_CACHE_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS ocr_cache (
+                            key TEXT PRIMARY KEY,
+                            result TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            last_hit REAL NOT NULL)""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_hit ON ocr_cache(last_hit)")
+        _conn.commit()
+    return _conn
+
+def cache_get(key: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """(texto, tablas compactas) de un documento ya reconocido."""
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT result FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            stats["misses"] += 1
+            return None
+        conn.execute("UPDATE ocr_cache SET last_hit = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        stats["hits"] += 1
+    res = json.loads(row[0])
+    return res["text"], res["tables"]
+
+def cache_put(key: str, text: str, tables: List[Dict[str, Any]]) -> None:
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute("INSERT OR REPLACE INTO ocr_cache(key, result, created_at, last_hit) VALUES (?, ?, ?, ?)",
+                     (key, json.dumps({"text": text, "tables": tables}), now, now))
+        stats["stores"] += 1
+        # LRU: conserva las N entradas usadas más recientemente
+        cur = conn.execute("""DELETE FROM ocr_cache WHERE key IN (
+                                 SELECT key FROM ocr_cache ORDER BY last_hit DESC LIMIT -1 OFFSET ?)""",
+                           (OCR_CACHE_MAX_ENTRIES,))
+        stats["evictions"] += cur.rowcount
+        conn.commit()
@@ -1,30 +1,238 @@
-import os, io, pdfplumber, pandas as pd
-from typing import Tuple, List, Dict
+import os, io, re, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple, List, Dict, Iterator, Optional
+from . import tables as tbl, ocr
+from .extraction_cache import file_sha256
+from ..settings import (PARSE_WORKERS, PARSE_PAGE_BATCH, PARSE_POOL_MIN_PAGES,
+                        PARSE_STOP_EARLY, PARSE_STOP_TRAILING_PAGES, PARSE_MAX_SHEETS, PARSE_MAX_ROWS,
+                        PARSE_CSV_ENGINE, OCR_DPI, OCR_PDF_MIN_CHARS)
 
-def parse_document(path: str) -> Tuple[str, List[Dict]]:
+# pdfplumber/pandas/openpyxl se importan al usarse (o en warm_up), no al importar el módulo:
+# quedan fuera del arranque en frío de la API.
+
+# Marcadores de estados financieros para detener el parseo temprano
+STATEMENT_MARKERS = {
+    "balance": re.compile(r"estado de situaci[oó]n financiera|balance general|statement of financial position|balance sheet", re.I),
+    "income": re.compile(r"estado de resultados|income statement|statement of (comprehensive )?income|profit and loss", re.I),
+}
+
+def config_tag() -> str:
+    # Cortes del parseo (parada temprana, hojas y filas máximas): cambian el texto/tablas que
+    # llegan al modelo => forman parte de la llave de caché de extracción
+    return f"parse{int(PARSE_STOP_EARLY)}-{PARSE_STOP_TRAILING_PAGES}-s{PARSE_MAX_SHEETS}-r{PARSE_MAX_ROWS}"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: el proceso del API tiene hilos (uvicorn/threadpool) y fork no es seguro
+        _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _warm_worker() -> int:
+    import pdfplumber
+    return os.getpid()
+
+def warm_up(pool: bool = False) -> None:
+    """Importa las librerías de parseo; con `pool` levanta también los procesos del pool."""
+    import pdfplumber, pandas, openpyxl
+    ocr.available()
+    if pool and PARSE_WORKERS > 1:
+        p = _get_pool()
+        for fut in [p.submit(_warm_worker) for _ in range(PARSE_WORKERS)]:
+            fut.result()
+
+def _extract_pages(path: str, page_numbers: List[int]) -> List[Dict]:
+    # Se ejecuta en el worker: abre el PDF una vez por lote de páginas
+    import pdfplumber
+    out = []
+    with pdfplumber.open(path) as pdf:
+        for pn in page_numbers:
+            page = pdf.pages[pn - 1]
+            t = page.extract_text() or ""
+            if len(t.strip()) < OCR_PDF_MIN_CHARS and ocr.available():
+                # Página escaneada (sin capa de texto): se renderiza y pasa por OCR en este worker
+                out.append({**ocr.ocr_pil(page.to_image(resolution=OCR_DPI).original, pn), "ocr": True})
+                page.flush_cache()
+                continue
+            try:
+                tables = page.extract_tables() or []
+            except Exception:
+                tables = []
+            out.append({"page": pn, "text": t, "tables": tables})
+            page.flush_cache()
+    return out
+
+def _pdf_page_count(path: str) -> int:
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+def iter_pdf_pages(path: str, workers: int = PARSE_WORKERS, batch_size: int = PARSE_PAGE_BATCH) -> Iterator[Dict]:
+    """Genera {"page", "text", "tables"} por página, en orden.
+
+    Con suficientes páginas reparte lotes en un pool de procesos; si el consumidor
+    deja de iterar, los lotes pendientes se cancelan.
+    """
+    n_pages = _pdf_page_count(path)
+    batches = [list(range(s + 1, min(s + batch_size, n_pages) + 1)) for s in range(0, n_pages, batch_size)]
+
+    if workers <= 1 or n_pages < PARSE_POOL_MIN_PAGES:
+        for pages in batches:
+            yield from _extract_pages(path, pages)
+        return
+
+    pool = _get_pool()
+    window = max(2, workers * 2)  # lotes en vuelo; acota memoria y trabajo desperdiciado al parar
+    pending = []
+    next_batch = 0
+    try:
+        while next_batch < len(batches) or pending:
+            while next_batch < len(batches) and len(pending) < window:
+                pending.append(pool.submit(_extract_pages, path, batches[next_batch]))
+                next_batch += 1
+            yield from pending.pop(0).result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+def statement_kinds(text: str) -> set:
+    return {kind for kind, rx in STATEMENT_MARKERS.items() if rx.search(text or "")}
+
+def _parse_pdf(path: str, stop_early: bool, content_hash: Optional[str] = None) -> Tuple[str, List[Dict]]:
+    # Sólo los PDFs que pasaron por OCR quedan en caché (el resto se parsea rápido)
+    key = ocr.cache_key(content_hash, f"pdf:{int(stop_early)}:{PARSE_STOP_TRAILING_PAGES}") if content_hash else None
+    if key and ocr.available():
+        hit = ocr.cache_get(key)
+        if hit is not None:
+            return hit
+    parts: List[str] = []
+    tables: List[Dict] = []
+    found: set = set()
+    trailing = None
+    used_ocr = False
+    for p in iter_pdf_pages(path):
+        if trailing is not None:
+            if trailing <= 0:
+                break
+            trailing -= 1
+        parts.append(f"\n[PAGE {p['page']}]\n{p['text']}\n")
+        for table in p["tables"]:
+            tables.append(tbl.from_rows(table, page=p["page"]))
+        used_ocr = used_ocr or p.get("ocr", False)
+        if stop_early and trailing is None:
+            found |= statement_kinds(p["text"])
+            if found >= set(STATEMENT_MARKERS):
+                # Los estados pueden continuar en las páginas siguientes
+                trailing = PARSE_STOP_TRAILING_PAGES
+    text = "".join(parts)
+    if key and used_ocr:
+        ocr.cache_put(key, text, tables)
+    return text, tables
+
+def _parse_image(path: str, content_hash: Optional[str] = None) -> Tuple[str, List[Dict]]:
+    """Imagen (o TIFF multipágina) por OCR local; franjas en el pool de procesos, resultado en caché."""
+    if not ocr.available():
+        return "", []  # sin Tesseract: multimodal la leerá
+    key = ocr.cache_key(content_hash or file_sha256(path), "image")
+    hit = ocr.cache_get(key)
+    if hit is not None:
+        return hit
+    pages = ocr.ocr_image(path, pool=_get_pool() if PARSE_WORKERS > 1 else None)
+    text = "".join(f"\n[PAGE {p['page']}]\n{p['text']}\n" for p in pages)
+    tables = [tbl.from_rows(t, page=p["page"]) for p in pages for t in p["tables"]]
+    ocr.cache_put(key, text, tables)
+    return text, tables
+
+# Hojas con estados financieros primero; las de detalle después (y son las que recorta el tope)
+SHEET_PRIORITY = re.compile(r"balance|situaci[oó]n|resultado|income|p&l|p[eé]rdidas|flujo|cash|estado", re.I)
+
+def _sheet_order(names: List[str]) -> List[str]:
+    return sorted(names, key=lambda n: (0 if SHEET_PRIORITY.search(n) else 1, names.index(n)))[:PARSE_MAX_SHEETS]
+
+def _parse_xlsx(path: str) -> List[Dict]:
+    """Todas las hojas con openpyxl en modo read-only (streaming, sin cargar el libro completo)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        out = []
+        for name in _sheet_order(wb.sheetnames):
+            rows = wb[name].iter_rows(values_only=True)
+            # Primera fila no vacía = encabezado (como pandas)
+            header = next((r for r in rows if any(v is not None and str(v).strip() for v in r)), None)
+            if header is None:
+                continue
+            t = tbl.from_rows(rows, columns=list(header), sheet=name, max_rows=PARSE_MAX_ROWS)
+            if t["n_rows"] or t["columns"]:
+                out.append(t)
+        return out
+    finally:
+        wb.close()
+
+def _parse_xls(path: str) -> List[Dict]:
+    # Formato binario viejo: openpyxl no lo lee; pandas (xlrd) con tope de filas
+    import pandas as pd
+    frames = pd.read_excel(path, sheet_name=None, nrows=PARSE_MAX_ROWS)
+    return [tbl.from_frame(frames[n], sheet=n) for n in _sheet_order(list(frames))]
+
+def _read_csv_arrow(path: str):
+    """DataFrame leído por bloques con el lector incremental de pyarrow, deteniéndose al pasar
+    PARSE_MAX_ROWS (pd.read_csv(engine="pyarrow") no acepta nrows y cargaría el archivo completo).
+    None si pyarrow no está instalado o el CSV es irregular para él."""
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pacsv
+    except ImportError:
+        return None
+    import pandas as pd
+    # Encabezados como los deja pandas (vacíos -> "Unnamed: i", repetidos -> "x.1"); arrow los
+    # conservaría tal cual
+    names = [str(c) for c in pd.read_csv(path, nrows=0).columns]
+    opts = pacsv.ReadOptions(column_names=names, skip_rows=1)
+    batches, rows = [], 0
+    try:
+        with pacsv.open_csv(path, read_options=opts) as reader:
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows > PARSE_MAX_ROWS:
+                    break
+            schema = reader.schema
+    except pa.lib.ArrowInvalid:
+        return None  # p.ej. tipos que cambian entre bloques o filas de ancho variable
+    return pa.Table.from_batches(batches, schema=schema).to_pandas()
+
+def _parse_csv(path: str) -> List[Dict]:
+    """CSV con el motor de pyarrow (multihilo, inferencia de tipos); respaldo al motor C."""
+    import pandas as pd
+    df = _read_csv_arrow(path) if PARSE_CSV_ENGINE == "pyarrow" else None
+    if df is None:
+        df = pd.read_csv(path, nrows=PARSE_MAX_ROWS + 1)
+    t = tbl.from_frame(df.head(PARSE_MAX_ROWS))
+    if len(df) > PARSE_MAX_ROWS:
+        t["truncated"] = True
+    return [t]
+
+def parse_document(path: str, stop_early: bool = PARSE_STOP_EARLY,
+                   content_hash: Optional[str] = None) -> Tuple[str, List[Dict]]:
     text = ""
     tables = []
     ext = os.path.splitext(path)[1].lower()
 
     if ext in [".pdf"]:
-        with pdfplumber.open(path) as pdf:
-            for pi, page in enumerate(pdf.pages):
-                t = page.extract_text() or ""
-                text += f"\n[PAGE {pi+1}]\n{t}\n"
-                try:
-                    for table in page.extract_tables() or []:
-                        tables.append({"page": pi+1, "rows": table})
-                except Exception:
-                    pass
+        text, tables = _parse_pdf(path, stop_early, content_hash)
 
     elif ext in [".csv"]:
-        df = pd.read_csv(path)
-        tables.append({"page": None, "rows": df.values.tolist(), "columns": df.columns.tolist()})
-    elif ext in [".xls", ".xlsx"]:
-        df = pd.read_excel(path)
-        tables.append({"page": None, "rows": df.values.tolist(), "columns": df.columns.tolist()})
+        tables = _parse_csv(path)
+    elif ext in [".xlsx", ".xlsm"]:
+        tables = _parse_xlsx(path)
+    elif ext in [".xls"]:
+        tables = _parse_xls(path)
+    elif ext in ocr.IMAGE_EXTS:
+        text, tables = _parse_image(path, content_hash)
     else:
-        # binario imagen: no extraemos texto aquí; multimodal lo leerá
+        # otro binario: no extraemos texto aquí; multimodal lo leerá
         pass
 
     return text.strip(), tables
@@ -1,30 +1,101 @@
+import numpy as np
+from typing import Dict, List, Set
 from .validators import safe_div
+from . import columnar
 from ..models import Financials, Ratios
 
-def compute(fin: Financials) -> Ratios:
-    b, i = fin.balance, fin.income
-    r = Ratios()
+# Rutas de Financials que lee cada ratio (grafo de dependencias para recálculo incremental)
+RATIO_DEPS: Dict[str, List[str]] = {
+    "current_ratio": ["balance.current_assets", "balance.current_liabilities"],
+    "quick_ratio": ["balance.cash", "balance.accounts_receivable", "balance.current_liabilities"],
+    "working_capital": ["balance.current_assets", "balance.current_liabilities"],
+    "debt_to_equity": ["balance.total_liabilities", "balance.shareholders_equity"],
+    "interest_coverage": ["income.ebitda", "income.operating_income", "income.interest_expense"],
+    "gross_margin": ["income.gross_profit", "income.revenue"],
+    "operating_margin": ["income.operating_income", "income.revenue"],
+    "net_margin": ["income.net_income", "income.revenue"],
+    "roa": ["income.net_income", "balance.total_assets"],
+    "roe": ["income.net_income", "balance.shareholders_equity"],
+    "ebitda_margin": ["income.ebitda", "income.revenue"],
+    "asset_turnover": ["income.revenue", "balance.total_assets"],
+    "inventory_turnover": ["income.cogs", "balance.inventory"],
+}
 
-    # Liquidez
-    r.current_ratio = safe_div(b.current_assets, b.current_liabilities)
-    quick_assets = (b.cash or 0) + (b.accounts_receivable or 0)
-    r.quick_ratio = safe_div(quick_assets, b.current_liabilities)
+def _working_capital(b, i):
     if b.current_assets is not None and b.current_liabilities is not None:
-        r.working_capital = (b.current_assets or 0) - (b.current_liabilities or 0)
+        return (b.current_assets or 0) - (b.current_liabilities or 0)
+    return None
 
+# Un cálculo por ratio (b = balance, i = income), para poder recalcular sólo los afectados
+RATIO_FUNCS = {
+    # Liquidez
+    "current_ratio": lambda b, i: safe_div(b.current_assets, b.current_liabilities),
+    "quick_ratio": lambda b, i: safe_div((b.cash or 0) + (b.accounts_receivable or 0), b.current_liabilities),
+    "working_capital": _working_capital,
     # Apalancamiento
-    r.debt_to_equity = safe_div(b.total_liabilities, b.shareholders_equity)
-    r.interest_coverage = safe_div((i.ebitda or i.operating_income), i.interest_expense)
-
+    "debt_to_equity": lambda b, i: safe_div(b.total_liabilities, b.shareholders_equity),
+    "interest_coverage": lambda b, i: safe_div((i.ebitda or i.operating_income), i.interest_expense),
     # Rentabilidad
-    r.gross_margin = safe_div(i.gross_profit, i.revenue)
-    r.operating_margin = safe_div(i.operating_income, i.revenue)
-    r.net_margin = safe_div(i.net_income, i.revenue)
-    r.roa = safe_div(i.net_income, b.total_assets)
-    r.roe = safe_div(i.net_income, b.shareholders_equity)
-    r.ebitda_margin = safe_div(i.ebitda, i.revenue)
+    "gross_margin": lambda b, i: safe_div(i.gross_profit, i.revenue),
+    "operating_margin": lambda b, i: safe_div(i.operating_income, i.revenue),
+    "net_margin": lambda b, i: safe_div(i.net_income, i.revenue),
+    "roa": lambda b, i: safe_div(i.net_income, b.total_assets),
+    "roe": lambda b, i: safe_div(i.net_income, b.shareholders_equity),
+    "ebitda_margin": lambda b, i: safe_div(i.ebitda, i.revenue),
+    # Eficiencia
+    "asset_turnover": lambda b, i: safe_div(i.revenue, b.total_assets),
+    "inventory_turnover": lambda b, i: safe_div(i.cogs, b.inventory),
+}
+
+def compute(fin: Financials) -> Ratios:
+    b, i = fin.balance, fin.income
+    return Ratios(**{name: fn(b, i) for name, fn in RATIO_FUNCS.items()})
 
+def recompute(fin: Financials, prev: Ratios, names: Set[str]) -> Ratios:
+    """Recalcula sólo los ratios en `names` y conserva el resto de `prev`."""
+    b, i = fin.balance, fin.income
+    return prev.model_copy(update={n: RATIO_FUNCS[n](b, i) for n in names})
+
+# --- Motor vectorizado (N estados a la vez) ---
+
+def _vdiv(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Misma semántica que safe_div: None (NaN) si falta a/b o b == 0
+    out = np.full(np.broadcast(a, b).shape, np.nan)
+    ok = ~np.isnan(a) & ~np.isnan(b) & (b != 0)
+    np.divide(a, b, out=out, where=ok)
+    return out
+
+def compute_batch(cols: columnar.Columns) -> columnar.Columns:
+    """Calcula todos los ratios para N estados en columnas; NaN = None."""
+    c = lambda p: columnar.column(cols, p)
+    cash, ar, inv = c("balance.cash"), c("balance.accounts_receivable"), c("balance.inventory")
+    ca, cl, ta = c("balance.current_assets"), c("balance.current_liabilities"), c("balance.total_assets")
+    tl, eq = c("balance.total_liabilities"), c("balance.shareholders_equity")
+    rev, cogs, gp = c("income.revenue"), c("income.cogs"), c("income.gross_profit")
+    oi, ebitda = c("income.operating_income"), c("income.ebitda")
+    ie, ni = c("income.interest_expense"), c("income.net_income")
+
+    r: columnar.Columns = {}
+    # Liquidez
+    r["current_ratio"] = _vdiv(ca, cl)
+    r["quick_ratio"] = _vdiv(np.nan_to_num(cash) + np.nan_to_num(ar), cl)
+    r["working_capital"] = ca - cl
+    # Apalancamiento (ebitda "falsy" -> operating_income, igual que `ebitda or operating_income`)
+    r["debt_to_equity"] = _vdiv(tl, eq)
+    r["interest_coverage"] = _vdiv(np.where(np.isnan(ebitda) | (ebitda == 0), oi, ebitda), ie)
+    # Rentabilidad
+    r["gross_margin"] = _vdiv(gp, rev)
+    r["operating_margin"] = _vdiv(oi, rev)
+    r["net_margin"] = _vdiv(ni, rev)
+    r["roa"] = _vdiv(ni, ta)
+    r["roe"] = _vdiv(ni, eq)
+    r["ebitda_margin"] = _vdiv(ebitda, rev)
     # Eficiencia
-    r.asset_turnover = safe_div(i.revenue, b.total_assets)
-    r.inventory_turnover = safe_div(i.cogs, b.inventory)
+    r["asset_turnover"] = _vdiv(rev, ta)
+    r["inventory_turnover"] = _vdiv(cogs, inv)
     return r
+
+def compute_many(fins: List[Financials]) -> List[Ratios]:
+    if not fins:
+        return []
+    return columnar.to_models(compute_batch(columnar.to_columns(fins)), Ratios)
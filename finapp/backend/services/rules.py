@@ -0,0 +1,190 @@
+import json
+import numpy as np
+from typing import Any, Dict, List, Optional
+from ..models import Issue
+from ..settings import RULES_FILE
+from . import columnar
+
+# Motor de reglas declarativo: cada regla (dict/JSON) se compila a una evaluación
+# vectorizada sobre columnas (services.columnar) y produce los mismos Issue que validators.
+#
+# Tipos soportados:
+#   identity: sum(lhs) == sum(rhs) con tolerancia abs_tol / rel_tol (relativa a la escala).
+#             Un término "-ruta" resta. Si falta algún operando la regla no aplica.
+#   compare:  lhs <op> rhs, op en <=, <, >=, >  (p.ej. current_assets <= total_assets)
+#   sign:     path con sign = nonnegative | positive | nonpositive | negative
+#   required: paths que no pueden faltar (un Issue por estado con la lista de faltantes)
+
+# Tolerancia por defecto de identidades y comparaciones (también la usa services.identities)
+ABS_TOL, REL_TOL = 1e-6, 1e-4
+
+CRITICAL_FIELDS = ["balance.total_assets", "balance.total_liabilities", "balance.shareholders_equity",
+                   "income.revenue", "income.net_income"]
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"id": "accounting_equation", "type": "identity", "code": "EQ_IMBALANCE", "severity": "error",
+     "message": "Activos ≠ Pasivos + Capital",
+     "lhs": ["balance.total_assets"], "rhs": ["balance.total_liabilities", "balance.shareholders_equity"],
+     "abs_tol": ABS_TOL, "rel_tol": REL_TOL},
+    {"id": "gross_profit_identity", "type": "identity", "code": "GROSS_PROFIT_MISMATCH",
+     "message": "Utilidad bruta ≠ Ingresos − Costo de ventas",
+     "lhs": ["income.gross_profit"], "rhs": ["income.revenue", "-income.cogs"], "abs_tol": ABS_TOL, "rel_tol": REL_TOL},
+    {"id": "current_assets_le_total", "type": "compare", "code": "SUBTOTAL_EXCEEDS_TOTAL",
+     "message": "Activo circulante mayor que activo total",
+     "lhs": "balance.current_assets", "op": "<=", "rhs": "balance.total_assets", "rel_tol": REL_TOL},
+    {"id": "current_liabilities_le_total", "type": "compare", "code": "SUBTOTAL_EXCEEDS_TOTAL",
+     "message": "Pasivo circulante mayor que pasivo total",
+     "lhs": "balance.current_liabilities", "op": "<=", "rhs": "balance.total_liabilities", "rel_tol": REL_TOL},
+    {"id": "interest_sign", "type": "sign", "code": "NEGATIVE_NOT_ALLOWED",
+     "message": "Gasto por intereses no debe ser negativo", "path": "income.interest_expense", "sign": "nonnegative"},
+    {"id": "revenue_sign", "type": "sign", "code": "NEGATIVE_NOT_ALLOWED",
+     "message": "Ingresos no deben ser negativos", "path": "income.revenue", "sign": "nonnegative"},
+    {"id": "critical_missing", "type": "required", "code": "MISSING_REQUIRED", "severity": "error",
+     "message": "Faltan campos críticos", "paths": CRITICAL_FIELDS},
+]
+
+_OPS = {"<=": np.less_equal, "<": np.less, ">=": np.greater_equal, ">": np.greater}
+_SIGNS = {"nonnegative": lambda x: x >= 0, "positive": lambda x: x > 0,
+          "nonpositive": lambda x: x <= 0, "negative": lambda x: x < 0}
+
+def _check_path(rule_id: str, path: Any) -> str:
+    if not isinstance(path, str):
+        raise ValueError(f"Regla {rule_id}: se esperaba una ruta, no {path!r}")
+    if path.lstrip("-") not in columnar.FIELD_PATHS:
+        raise ValueError(f"Regla {rule_id}: ruta desconocida {path}")
+    return path
+
+def _check_paths(rule_id: str, paths: Any) -> List[str]:
+    if not isinstance(paths, list):
+        raise ValueError(f"Regla {rule_id}: se esperaba una lista de rutas, no {paths!r}")
+    return [_check_path(rule_id, p) for p in paths]
+
+def _sum_terms(cols: columnar.Columns, terms: List[str]) -> np.ndarray:
+    total = 0.0
+    for t in terms:
+        col = columnar.column(cols, t.lstrip("-"))
+        total = total - col if t.startswith("-") else total + col
+    return total  # NaN si falta cualquier término
+
+def _tolerance(rule: Dict[str, Any], a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.maximum(rule.get("abs_tol", 0.0), rule.get("rel_tol", 0.0) * np.maximum(np.abs(a), np.abs(b)))
+
+class CompiledRule:
+    def __init__(self, rule: Dict[str, Any]):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Regla inválida: {rule!r}")
+        self.rule = rule
+        self.id = rule["id"]
+        self.type = rule["type"]
+        self.code = rule.get("code", self.id.upper())
+        self.message = rule.get("message", self.id)
+        self.severity = rule.get("severity", "warn")
+        for tol in ("abs_tol", "rel_tol"):
+            if not isinstance(rule.get(tol, 0.0), (int, float)):
+                raise ValueError(f"Regla {self.id}: {tol} debe ser numérico")
+        if self.type == "identity":
+            terms = _check_paths(self.id, rule["lhs"]) + _check_paths(self.id, rule["rhs"])
+            self.fields = [p.lstrip("-") for p in terms]
+        elif self.type == "compare":
+            if rule["op"] not in _OPS:
+                raise ValueError(f"Regla {self.id}: operador no soportado {rule['op']}")
+            self.fields = [_check_path(self.id, rule["lhs"]), _check_path(self.id, rule["rhs"])]
+        elif self.type == "sign":
+            if rule["sign"] not in _SIGNS:
+                raise ValueError(f"Regla {self.id}: signo no soportado {rule['sign']}")
+            self.fields = [_check_path(self.id, rule["path"])]
+        elif self.type == "required":
+            self.fields = _check_paths(self.id, rule["paths"])
+        else:
+            raise ValueError(f"Regla {self.id}: tipo no soportado {self.type}")
+
+    def violations(self, cols: columnar.Columns) -> np.ndarray:
+        """Máscara booleana de estados que violan la regla (NaN en operandos = no aplica)."""
+        r = self.rule
+        if self.type == "identity":
+            a, b = _sum_terms(cols, r["lhs"]), _sum_terms(cols, r["rhs"])
+            with np.errstate(invalid="ignore"):
+                return np.abs(a - b) > _tolerance(r, a, b)
+        if self.type == "compare":
+            a, b = columnar.column(cols, r["lhs"]), columnar.column(cols, r["rhs"])
+            ok = ~np.isnan(a) & ~np.isnan(b)
+            # Holgura relativa para no marcar diferencias de redondeo
+            slack = _tolerance(r, a, b)
+            if r["op"] in ("<=", "<"):
+                b = b + slack
+            else:
+                b = b - slack
+            return ok & ~_OPS[r["op"]](a, b)
+        if self.type == "sign":
+            x = columnar.column(cols, r["path"])
+            return ~np.isnan(x) & ~_SIGNS[r["sign"]](np.nan_to_num(x))
+        # required
+        return self.missing(cols).any(axis=0)
+
+    def check_row(self, values: Dict[str, Optional[float]]) -> Optional[Issue]:
+        """Un solo estado ({ruta: valor}): mismo criterio que `violations` pero con floats, sin
+        el costo fijo de numpy por regla en arreglos de una fila (ingesta y HITL)."""
+        r = self.rule
+        if self.type == "required":
+            missing = [p for p in self.fields if values.get(p) is None]
+            return Issue(code=self.code, message=self.message, severity=self.severity,
+                         fields=missing) if missing else None
+        if any(values.get(p) is None for p in self.fields):
+            return None
+        if self.type == "identity":
+            def total(terms):
+                return sum(-values[t[1:]] if t.startswith("-") else values[t] for t in terms)
+            a, b = total(r["lhs"]), total(r["rhs"])
+            bad = abs(a - b) > max(r.get("abs_tol", 0.0), r.get("rel_tol", 0.0) * max(abs(a), abs(b)))
+        elif self.type == "compare":
+            a, b = values[r["lhs"]], values[r["rhs"]]
+            slack = max(r.get("abs_tol", 0.0), r.get("rel_tol", 0.0) * max(abs(a), abs(b)))
+            bad = not _OPS[r["op"]](a, b + slack if r["op"] in ("<=", "<") else b - slack)
+        else:
+            bad = not _SIGNS[r["sign"]](values[r["path"]])
+        return Issue(code=self.code, message=self.message, severity=self.severity,
+                     fields=list(self.fields)) if bad else None
+
+    def missing(self, cols: columnar.Columns) -> np.ndarray:
+        return np.vstack([np.isnan(columnar.column(cols, p)) for p in self.fields])
+
+    def issue(self, cols: columnar.Columns, row: int, missing: Optional[np.ndarray] = None) -> Issue:
+        fields = self.fields
+        if missing is not None:
+            fields = [p for p, m in zip(self.fields, missing[:, row]) if m]
+        return Issue(code=self.code, message=self.message, severity=self.severity, fields=list(fields))
+
+def load_rules(path: Optional[str] = RULES_FILE) -> List[Dict[str, Any]]:
+    if not path:
+        return DEFAULT_RULES
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compile_rules(rules: List[Dict[str, Any]]) -> List[CompiledRule]:
+    compiled = [CompiledRule(r) for r in rules]
+    ids = [r.id for r in compiled]
+    if len(ids) != len(set(ids)):
+        raise ValueError("IDs de regla duplicados")
+    return compiled
+
+_default_compiled: Optional[List[CompiledRule]] = None
+
+def default_rules() -> List[CompiledRule]:
+    global _default_compiled
+    if _default_compiled is None:
+        _default_compiled = compile_rules(load_rules())
+    return _default_compiled
+
+def validate_batch(cols: columnar.Columns, rules: Optional[List[CompiledRule]] = None) -> List[List[Issue]]:
+    """Evalúa todas las reglas sobre N estados; devuelve la lista de Issue de cada uno."""
+    rules = default_rules() if rules is None else rules
+    out: List[List[Issue]] = [[] for _ in range(columnar.n_rows(cols))]
+    for rule in rules:
+        mask = rule.violations(cols)
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            continue
+        missing = rule.missing(cols) if rule.type == "required" else None
+        for row in rows.tolist():
+            out[row].append(rule.issue(cols, row, missing))
+    return out
@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from ..models import Financials, Ratios, SweepAxis
+from ..settings import SWEEP_MAX_SCENARIOS
+from . import columnar, identities, ratio_tools
+
+# Sweeps de sensibilidad: grid completo o N sorteos Monte Carlo sobre varias rutas,
+# evaluados en un solo pase vectorizado del motor de ratios.
+
+def _axis_points(axis: SweepAxis) -> np.ndarray:
+    return np.linspace(axis.low, axis.high, max(1, axis.steps))
+
+def _axis_draws(axis: SweepAxis, n: int, rng: np.random.Generator) -> np.ndarray:
+    if axis.dist == "normal":
+        # low/high se interpretan como ~95% central (±2σ)
+        return rng.normal((axis.low + axis.high) / 2, (axis.high - axis.low) / 4, n)
+    if axis.dist == "triangular":
+        return rng.triangular(axis.low, (axis.low + axis.high) / 2, axis.high, n)
+    if axis.dist != "uniform":
+        raise ValueError(f"Distribución no soportada: {axis.dist}")
+    return rng.uniform(axis.low, axis.high, n)
+
+def _apply(base: float, x: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "value":
+        return x.astype(np.float64)
+    if mode == "factor":
+        return base * x
+    if mode == "pct":
+        return base * (1 + x / 100.0)
+    raise ValueError(f"Modo no soportado: {mode}")
+
+def sample(axes: List[SweepAxis], method: str, draws: int, seed: Optional[int]) -> Dict[str, np.ndarray]:
+    """Valores del parámetro de cada eje (antes de aplicarlos al valor base)."""
+    if not axes:
+        raise ValueError("Se requiere al menos un eje")
+    if method == "grid":
+        n = int(np.prod([max(1, a.steps) for a in axes]))
+        if n > SWEEP_MAX_SCENARIOS:
+            raise ValueError(f"El grid genera {n} escenarios (máximo {SWEEP_MAX_SCENARIOS})")
+        mesh = np.meshgrid(*[_axis_points(a) for a in axes], indexing="ij")
+        return {a.path: m.ravel() for a, m in zip(axes, mesh)}
+    if method == "montecarlo":
+        if draws > SWEEP_MAX_SCENARIOS:
+            raise ValueError(f"Máximo {SWEEP_MAX_SCENARIOS} sorteos")
+        rng = np.random.default_rng(seed)
+        return {a.path: _axis_draws(a, draws, rng) for a in axes}
+    raise ValueError(f"Método no soportado: {method}")
+
+def sweep(fin: Financials, axes: List[SweepAxis], method: str = "grid", draws: int = 1000,
+          seed: Optional[int] = None) -> Tuple[columnar.Columns, columnar.Columns]:
+    """Devuelve (inputs, ratios) en columnas de longitud N escenarios."""
+    for a in axes:
+        if a.path not in columnar.FIELD_PATHS:
+            raise ValueError(f"Ruta desconocida: {a.path}")
+    params = sample(axes, method, draws, seed)
+    n = len(next(iter(params.values())))
+    base = columnar.to_columns([fin])
+    cols = {p: np.repeat(v, n) for p, v in base.items()}
+    inputs: columnar.Columns = {}
+    for a in axes:
+        # Igual que whatif: un factor sobre un valor ausente lo deja ausente
+        cols[a.path] = _apply(base[a.path][0], params[a.path], a.mode)
+        inputs[a.path] = cols[a.path]
+    # Igual que whatif (dependencies.propagate): los derivados que leen un eje se vacían y se
+    # vuelven a despejar por escenario antes de calcular los ratios
+    for path in identities.stale(fin, inputs):
+        cols[path] = np.full(n, np.nan)
+    identities.solve_columns(cols)
+    return inputs, ratio_tools.compute_batch(cols)
+
+def base_ratios(fin: Financials) -> Ratios:
+    """Ratios del escenario sin cambios, con el mismo despeje de identidades que cada fila
+    del sweep (unos financials sin utilidad bruta pero con ingresos y costo la derivan)."""
+    cols = columnar.to_columns([fin])
+    identities.solve_columns(cols)
+    return columnar.to_models(ratio_tools.compute_batch(cols), Ratios)[0]
+
+def summarize(cols: columnar.Columns, percentiles: List[float]) -> Dict[str, Dict[str, Optional[float]]]:
+    out = {}
+    for name, arr in cols.items():
+        valid = arr[~np.isnan(arr)]
+        if valid.size == 0:
+            out[name] = {"count": 0}
+            continue
+        stats = {"count": float(valid.size), "mean": float(valid.mean()), "std": float(valid.std()),
+                 "min": float(valid.min()), "max": float(valid.max())}
+        for p, v in zip(percentiles, np.percentile(valid, percentiles)):
+            stats[f"p{p:g}"] = float(v)
+        out[name] = stats
+    return out
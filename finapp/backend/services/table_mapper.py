@@ -0,0 +1,245 @@
+import re, unicodedata
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from .validators import CRITICAL_FIELDS
+from . import tables as tbl, identities
+from ..settings import TABLE_MAP_MIN_SCORE, TABLE_MAP_FUZZY_MAX_CONF, IDENTITY_SOLVER_ENABLED
+
+# Camino rápido sin LLM para CSV/XLSX: mapea etiquetas de renglón a rutas canónicas con
+# un diccionario de sinónimos (es/en) + coincidencia difusa, detecta la columna del
+# periodo, la escala y la moneda, y devuelve el mismo formato que la extracción del modelo.
+
+MAPPER_VERSION = "4"
+
+SYNONYMS: Dict[str, List[str]] = {
+    "balance.cash": ["efectivo", "efectivo y equivalentes", "efectivo y equivalentes de efectivo", "caja y bancos",
+                     "disponible", "cash", "cash and cash equivalents", "cash and equivalents"],
+    "balance.accounts_receivable": ["cuentas por cobrar", "clientes", "clientes y cuentas por cobrar", "deudores",
+                                    "accounts receivable", "trade receivables", "receivables"],
+    "balance.inventory": ["inventarios", "inventario", "almacen", "inventory", "inventories"],
+    "balance.current_assets": ["activo circulante", "activo corriente", "total activo circulante",
+                               "total activo corriente", "activos circulantes", "total de activos circulantes",
+                               "current assets", "total current assets"],
+    "balance.non_current_assets": ["activo no circulante", "activo no corriente", "total activo no circulante",
+                                   "total activo no corriente", "activos no circulantes", "activo a largo plazo",
+                                   "non current assets", "total non current assets"],
+    "balance.total_assets": ["total activo", "activo total", "total de activos", "activos totales", "total activos",
+                             "total assets", "assets total"],
+    "balance.accounts_payable": ["proveedores", "cuentas por pagar", "cuentas por pagar a proveedores",
+                                 "accounts payable", "trade payables", "payables"],
+    "balance.short_term_debt": ["deuda a corto plazo", "prestamos bancarios a corto plazo", "deuda de corto plazo",
+                                "porcion circulante de la deuda", "short term debt", "current portion of long term debt",
+                                "short term borrowings"],
+    "balance.current_liabilities": ["pasivo circulante", "pasivo corriente", "total pasivo circulante",
+                                    "total pasivo corriente", "pasivos circulantes", "current liabilities",
+                                    "total current liabilities"],
+    "balance.long_term_debt": ["deuda a largo plazo", "prestamos bancarios a largo plazo", "deuda de largo plazo",
+                               "long term debt", "long term borrowings"],
+    "balance.non_current_liabilities": ["pasivo no circulante", "pasivo no corriente", "total pasivo no circulante",
+                                        "total pasivo no corriente", "pasivo a largo plazo",
+                                        "total pasivo a largo plazo", "non current liabilities",
+                                        "total non current liabilities"],
+    "balance.total_liabilities": ["total pasivo", "pasivo total", "total de pasivos", "pasivos totales",
+                                  "total pasivos", "total liabilities", "liabilities total"],
+    "balance.shareholders_equity": ["capital contable", "total capital contable", "patrimonio",
+                                    "patrimonio neto", "capital", "total capital", "shareholders equity",
+                                    "stockholders equity", "total equity", "equity"],
+    "income.revenue": ["ingresos", "ventas", "ventas netas", "ingresos totales", "ingresos netos",
+                       "ingresos por ventas", "revenue", "revenues", "net sales", "sales", "total revenue"],
+    "income.cogs": ["costo de ventas", "costo de lo vendido", "costo de ventas netas", "costo de los ingresos",
+                    "cost of sales", "cost of goods sold", "cogs", "cost of revenue"],
+    "income.gross_profit": ["utilidad bruta", "margen bruto", "gross profit", "gross margin"],
+    "income.operating_income": ["utilidad de operacion", "resultado de operacion", "utilidad operativa",
+                                "operating income", "operating profit", "income from operations", "ebit"],
+    "income.ebitda": ["ebitda", "uafida"],
+    "income.interest_expense": ["gastos por intereses", "intereses pagados", "gasto por intereses",
+                                "gastos financieros", "interest expense", "finance costs"],
+    "income.net_income": ["utilidad neta", "resultado neto", "utilidad neta del ejercicio", "utilidad del ejercicio",
+                          "perdida neta", "perdida del ejercicio", "net income", "net profit",
+                          "profit for the year", "net earnings", "net loss", "loss for the year"],
+    "cashflow.operating_cf": ["flujo de efectivo de operacion", "flujos netos de efectivo de actividades de operacion",
+                              "actividades de operacion", "operating cash flow", "net cash from operating activities",
+                              "cash flow from operations"],
+    "cashflow.investing_cf": ["flujo de efectivo de inversion", "flujos netos de efectivo de actividades de inversion",
+                              "actividades de inversion", "investing cash flow",
+                              "net cash used in investing activities"],
+    "cashflow.financing_cf": ["flujo de efectivo de financiamiento",
+                              "flujos netos de efectivo de actividades de financiamiento",
+                              "actividades de financiamiento", "financing cash flow",
+                              "net cash from financing activities"],
+    "cashflow.capex": ["adquisicion de propiedades planta y equipo", "adquisiciones de propiedades planta y equipo",
+                       "inversiones en propiedades planta y equipo", "inversion en activo fijo", "capex",
+                       "capital expenditures", "purchases of property plant and equipment",
+                       "purchase of property plant and equipment"],
+    "cashflow.free_cf": ["flujo de efectivo libre", "flujo libre de efectivo", "free cash flow"],
+}
+
+SCALE_PATTERNS = [
+    ("MILLONES", re.compile(r"\b(en\s+)?millones\b|\bmillions?\b|\bin\s+mm\b", re.I)),
+    ("MILES", re.compile(r"\b(en\s+)?miles\b|\bthousands?\b|\bin\s+000s?\b|\(000\)", re.I)),
+]
+CURRENCY_PATTERNS = [
+    ("USD", re.compile(r"\bUSD\b|US\$|d[oó]lares|dollars", re.I)),
+    ("EUR", re.compile(r"\bEUR\b|€|euros", re.I)),
+    ("MXN", re.compile(r"\bMXN\b|pesos", re.I)),
+]
+# Los estados presentan costos/gastos entre paréntesis o negativos; el modelo canónico los quiere positivos
+EXPENSE_PATHS = {"income.cogs", "income.interest_expense", "cashflow.capex"}
+# Resultados con signo: un renglón rotulado como pérdida ("Pérdida neta | 50") trae la magnitud
+PROFIT_PATHS = {"income.gross_profit", "income.operating_income", "income.ebitda", "income.net_income"}
+YEAR = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+# La similitud de caracteres no distingue sentido: "ingresos por intereses" queda a un paso de
+# "gastos por intereses". Una coincidencia difusa no puede cruzar ingreso <-> gasto, y los
+# totales combinados ("total pasivo y capital") no se acercan a ninguno de sus componentes.
+INCOME_WORDS = {"ingreso", "ingresos", "ganancia", "ganancias", "income", "revenue", "revenues", "gain", "gains"}
+EXPENSE_WORDS = {"gasto", "gastos", "costo", "costos", "perdida", "perdidas", "pagados", "pagado",
+                 "cost", "costs", "expense", "expenses", "loss", "losses"}
+COMPOUND_TOTAL = re.compile(r"\bpasivos? (y|mas) (el )?(capital|patrimonio)|\bliabilities and (\w+ )?equity")
+
+def normalize(label: Any) -> str:
+    """minúsculas, sin acentos, sin paréntesis/números/puntuación."""
+    s = unicodedata.normalize("NFKD", str(label)).encode("ascii", "ignore").decode().lower()
+    s = re.sub(r"\(.*?\)", " ", s)
+    s = re.sub(r"[^a-z ]+", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+def _polarity(norm: str) -> Optional[str]:
+    # "income" | "expense" | None (sin palabras de sentido o con ambas, p.ej. "costo de los ingresos")
+    words = set(norm.split())
+    income, expense = bool(words & INCOME_WORDS), bool(words & EXPENSE_WORDS)
+    return "income" if income and not expense else "expense" if expense and not income else None
+
+_INDEX: Dict[str, str] = {normalize(syn): path for path, syns in SYNONYMS.items() for syn in syns}
+_POLARITY: Dict[str, Optional[str]] = {syn: _polarity(syn) for syn in _INDEX}
+
+def match_label(label: Any, min_score: float = TABLE_MAP_MIN_SCORE) -> Tuple[Optional[str], float]:
+    """Ruta canónica y puntaje [0..1] de una etiqueta (1.0 = sinónimo exacto)."""
+    norm = normalize(label)
+    if not norm:
+        return None, 0.0
+    if norm in _INDEX:
+        return _INDEX[norm], 1.0
+    if COMPOUND_TOTAL.search(norm):
+        return None, 0.0
+    polarity = _polarity(norm)
+    best, best_score = None, 0.0
+    for syn, path in _INDEX.items():
+        if polarity and _POLARITY[syn] and _POLARITY[syn] != polarity:
+            continue
+        # quick_ratio es una cota superior barata: descarta antes del ratio completo
+        sm = SequenceMatcher(None, norm, syn)
+        if sm.quick_ratio() <= best_score:
+            continue
+        score = sm.ratio()
+        if score > best_score:
+            best, best_score = path, score
+    return (best, best_score) if best_score >= min_score else (None, best_score)
+
+def parse_number(v: Any) -> Optional[float]:
+    """"1,234" / "(1,234)" / "$ -1 234.5" / 1234 -> float; vacíos y guiones -> None."""
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return None if v != v else float(v)  # NaN -> None
+    s = str(v).strip()
+    if s in ("", "-", "—", "–", "n/a", "N/A", "nan"):
+        return None
+    neg = s.startswith("(") and s.endswith(")")
+    s = re.sub(r"[^\d.\-]", "", s.replace(",", ""))
+    try:
+        x = float(s)
+    except ValueError:
+        return None
+    return -abs(x) if neg else x
+
+def _year_of(c: Any) -> Optional[str]:
+    # Año de un encabezado: 2024, 2024.0, "2024", "Dic-2024", "FY2023"
+    if isinstance(c, (int, float)):
+        return str(int(c)) if c == c and float(c).is_integer() and 1900 <= c <= 2099 else None
+    m = YEAR.search(str(c)) if c is not None else None
+    return m.group(1) if m else None
+
+def _header_and_rows(table: Dict[str, Any]) -> Tuple[List[Any], List[List[Any]]]:
+    # Si las columnas no traen años, busca una fila de encabezado con años entre las primeras
+    columns = list(table.get("columns") or [])
+    rows = list(tbl.iter_rows(table))
+    if any(_year_of(c) for c in columns):
+        return columns, rows
+    for i, row in enumerate(rows[:8]):
+        if any(_year_of(c) for c in row[1:]):
+            return row, rows[i + 1:]
+    return columns, rows
+
+def _label_column(rows: List[List[Any]]) -> int:
+    # La columna con más celdas de texto no numérico
+    width = max((len(r) for r in rows), default=0)
+    counts = [sum(1 for r in rows if i < len(r) and r[i] is not None and parse_number(r[i]) is None
+                  and normalize(r[i])) for i in range(width)]
+    return max(range(width), key=lambda i: counts[i]) if width else 0
+
+def _period_column(header: List[Any], rows: List[List[Any]], label_col: int) -> Tuple[Optional[int], Optional[str]]:
+    """Columna del periodo más reciente (por año en el encabezado) o la primera numérica."""
+    years = [(y, i) for i, h in enumerate(header) if i != label_col and (y := _year_of(h))]
+    if years:
+        year, col = max(years)
+        return col, year
+    width = max((len(r) for r in rows), default=0)
+    for i in range(width):
+        if i != label_col and any(i < len(r) and parse_number(r[i]) is not None for r in rows):
+            return i, None
+    return None, None
+
+def _detect(patterns, texts: List[str]) -> Optional[str]:
+    for name, rx in patterns:
+        if any(rx.search(t) for t in texts):
+            return name
+    return None
+
+def map_tables(tables: List[Dict[str, Any]], text: str = "") -> Dict[str, Any]:
+    """Resultado con la forma de la extracción del modelo + `coverage` de los campos críticos."""
+    fields: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    period = None
+    context = [text] if text else []
+    for t in tables:
+        header, rows = _header_and_rows(t)
+        if not rows:
+            continue
+        context += [str(c) for c in list(t.get("columns") or []) + list(header) if c is not None]
+        # Títulos ("Cifras en miles de pesos") suelen estar en las primeras filas
+        context += [str(c) for r in rows[:6] for c in r if isinstance(c, str)]
+        label_col = _label_column(rows)
+        col, t_period = _period_column(header, rows, label_col)
+        if col is None:
+            continue
+        period = period or t_period
+        for r in rows:
+            if label_col >= len(r) or col >= len(r):
+                continue
+            path, score = match_label(r[label_col])
+            value = parse_number(r[col])
+            if path is None or value is None:
+                continue
+            if path in EXPENSE_PATHS:
+                value = abs(value)
+            elif path in PROFIT_PATHS and _polarity(normalize(r[label_col])) == "expense":
+                value = -abs(value)
+            # Primera aparición gana a igual puntaje (los totales suelen venir antes que los desgloses)
+            if path in scores and score <= scores[path]:
+                continue
+            # Sinónimo exacto: 0.95; sólo difusa: por debajo de CONF_MED para forzar revisión
+            conf = 0.95 if score >= 1.0 else min(round(0.95 * score, 4), TABLE_MAP_FUZZY_MAX_CONF)
+            scores[path] = score
+            fields[path] = {"path": path, "value": value, "confidence": conf,
+                            "label": str(r[label_col]).strip(), "unit": None}
+
+    # Un crítico despejable por identidades contables también cuenta como cubierto
+    known = identities.closure(fields) if IDENTITY_SOLVER_ENABLED else set(fields)
+    found = [p for p in CRITICAL_FIELDS if p in known]
+    return {
+        "period": period,
+        "currency": _detect(CURRENCY_PATTERNS, context),
+        "scale_hint": _detect(SCALE_PATTERNS, context),
+        "fields": list(fields.values()),
+        "coverage": len(found) / len(CRITICAL_FIELDS),
+    }
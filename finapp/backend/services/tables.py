@@ -0,0 +1,117 @@
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Representación compacta de tablas (columnar), la que guardan parsers/blobstore:
+#   {"page": int|None, "sheet": str|None, "columns": [...], "n_rows": int,
+#    "dtypes": ["num"|"str", ...], "data": [[...col 0...], [...col 1...], ...]}
+# Cada columna es homogénea: números como float (None = vacío) o texto (None = vacío).
+# Filas y columnas totalmente vacías se descartan al construirla.
+
+Table = Dict[str, Any]
+
+def _clean(v: Any) -> Any:
+    if v is None:
+        return None
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if isinstance(v, str):
+        v = v.strip()
+        return v or None
+    if isinstance(v, bool):
+        return str(v)
+    if isinstance(v, (int, float)):
+        return float(v)
+    return str(v)  # fechas, decimales, etc.
+
+def from_rows(rows: Iterable[Iterable[Any]], columns: Optional[List[Any]] = None,
+              page: Optional[int] = None, sheet: Optional[str] = None,
+              max_rows: Optional[int] = None) -> Table:
+    """Construye la tabla consumiendo `rows` una sola vez (sirve con iteradores en streaming)."""
+    data: List[List[Any]] = []
+    n = 0
+    truncated = False
+    for raw in rows:
+        row = [_clean(v) for v in raw]
+        if not any(v is not None for v in row):
+            continue
+        if max_rows is not None and n >= max_rows:
+            truncated = True
+            break
+        if len(row) > len(data):
+            data.extend([None] * n for _ in range(len(row) - len(data)))
+        for i, col in enumerate(data):
+            col.append(row[i] if i < len(row) else None)
+        n += 1
+
+    cols = [None if c is None else str(c) for c in (columns or [])]
+    cols += [None] * (len(data) - len(cols))
+    # Descarta columnas sin datos ni encabezado
+    keep = [i for i, col in enumerate(data) if cols[i] is not None or any(v is not None for v in col)]
+    data = [data[i] for i in keep]
+    cols = [cols[i] for i in keep]
+    dtypes = ["num" if all(v is None or isinstance(v, float) for v in col) else "str" for col in data]
+    # Columnas de texto: todo a str para que sean homogéneas
+    data = [col if dt == "num" else [None if v is None else _fmt(v) for v in col] for col, dt in zip(data, dtypes)]
+    table: Table = {"page": page, "sheet": sheet, "columns": cols if any(c is not None for c in cols) else [],
+                    "n_rows": n, "dtypes": dtypes, "data": data}
+    if truncated:
+        table["truncated"] = True
+    return table
+
+def _fmt(v: Any) -> str:
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+def from_frame(df, page: Optional[int] = None, sheet: Optional[str] = None) -> Table:
+    """DataFrame -> tabla compacta sin pasar por df.values.tolist() (que crea objetos por celda)."""
+    data, dtypes, cols = [], [], []
+    for name in df.columns:
+        s = df[name]
+        if s.dtype.kind in "biuf":
+            col = [None if math.isnan(v) else v for v in s.astype("float64").tolist()]
+            dt = "num"
+        else:
+            col = [None if v is None or (isinstance(v, float) and math.isnan(v)) else str(v).strip() or None
+                   for v in s.tolist()]
+            dt = "str"
+        if any(v is not None for v in col) or not str(name).startswith("Unnamed"):
+            data.append(col)
+            dtypes.append(dt)
+            cols.append(str(name))
+    # Filas vacías fuera
+    n = len(df)
+    keep = [r for r in range(n) if any(col[r] is not None for col in data)]
+    if len(keep) != n:
+        data = [[col[r] for r in keep] for col in data]
+    return {"page": page, "sheet": sheet, "columns": cols, "n_rows": len(keep), "dtypes": dtypes, "data": data}
+
+def n_rows(table: Table) -> int:
+    if "data" in table:
+        return table.get("n_rows", 0)
+    return len(table.get("rows") or [])
+
+def iter_rows(table: Table, limit: Optional[int] = None) -> Iterator[List[Any]]:
+    """Vista por filas; acepta también el formato anterior {"rows": [[...], ...]}."""
+    if "data" not in table:
+        rows = table.get("rows") or []
+        yield from (list(r) for r in (rows if limit is None else rows[:limit]))
+        return
+    data = table["data"]
+    n = table.get("n_rows", 0) if limit is None else min(limit, table.get("n_rows", 0))
+    for r in range(n):
+        yield [col[r] for col in data]
+
+def head(table: Table, n: int) -> List[List[Any]]:
+    return list(iter_rows(table, n))
+
+def to_text(table: Table, max_rows: int = 20) -> str:
+    """Texto simplificado "a | b | c" para prompts y puntajes."""
+    out = []
+    if table.get("sheet"):
+        out.append(f"[SHEET {table['sheet']}]")
+    if table.get("columns"):
+        out.append(" | ".join("" if c is None else str(c) for c in table["columns"]))
+    for r in iter_rows(table, max_rows):
+        out.append(" | ".join("" if v is None else _fmt(v) for v in r))
+    return "\n".join(out)
@@ -1,5 +1,7 @@
-from typing import List
+from typing import Callable, Dict, List, Optional, Set
 from ..models import Financials, Issue
+from ..settings import IDENTITY_SOLVER_ENABLED
+from . import identities, rules
 
 def safe_div(a, b):
     if a is None or b in (None, 0):
@@ -9,41 +11,74 @@ def safe_div(a, b):
     except ZeroDivisionError:
         return None
 
-def check_accounting_constraints(fin: Financials) -> List[Issue]:
-    issues: List[Issue] = []
-    b, i = fin.balance, fin.income
-
-    # Ecuación contable
-    if b.total_assets is not None and b.total_liabilities is not None and b.shareholders_equity is not None:
-        diff = abs((b.total_liabilities or 0) + (b.shareholders_equity or 0) - (b.total_assets or 0))
-        if diff > 1e-6:  # tolerancia básica
-            issues.append(Issue(code="EQ_IMBALANCE",
-                                message="Activos ≠ Pasivos + Capital",
-                                severity="error",
-                                fields=["balance.total_assets","balance.total_liabilities","balance.shareholders_equity"]))
-
-    # Signos
-    if i.interest_expense is not None and i.interest_expense < 0:
-        issues.append(Issue(code="NEGATIVE_NOT_ALLOWED",
-                            message="Gasto por intereses no debe ser negativo",
-                            fields=["income.interest_expense"]))
-
-    # Derivaciones básicas
-    if i.gross_profit is None and i.revenue is not None and i.cogs is not None:
-        # No es issue; se puede derivar más adelante
-        pass
-
-    # Faltantes críticos
-    critical_missing = []
-    for fpath in ["balance.total_assets","balance.total_liabilities","balance.shareholders_equity",
-                  "income.revenue","income.net_income"]:
-        # revisión ligera en fields_raw sería mejor; por simplicidad revisamos atributos
-        obj, attr = fpath.split(".")
-        if getattr(getattr(fin, obj), attr) is None:
-            critical_missing.append(fpath)
-    if critical_missing:
-        issues.append(Issue(code="MISSING_REQUIRED",
-                            message="Faltan campos críticos",
+# Registro de checks: cada uno declara qué rutas lee (para revalidación incremental)
+# y qué códigos de Issue puede emitir. Las reglas declarativas (rules.default_rules(): las
+# de fábrica o las de RULES_FILE) se registran una por una, así la ingesta, el HITL y
+# /validate/batch comparten reglas y tolerancias; con @check sólo van los que necesitan
+# algo más que valores (p.ej. la procedencia de los campos derivados).
+CheckFn = Callable[[Financials], List[Issue]]
+CHECKS: Dict[str, Dict] = {}
+
+def check(name: str, reads: List[str], codes: List[str]):
+    def deco(fn: CheckFn) -> CheckFn:
+        CHECKS[name] = {"fn": fn, "reads": reads, "codes": codes}
+        return fn
+    return deco
+
+CRITICAL_FIELDS = rules.CRITICAL_FIELDS
+
+for _rule in rules.default_rules():
+    CHECKS[_rule.id] = {"rule": _rule, "reads": list(_rule.fields), "codes": [_rule.code]}
+
+# Identidades que ya evalúa una regla con los mismos términos (A = P + C, utilidad bruta)
+_COVERED = {i["id"] for i in identities.IDENTITIES for r in rules.default_rules()
+            if r.type == "identity" and r.rule["lhs"] == [i["lhs"]] and r.rule["rhs"] == i["rhs"]}
+
+@check("identity_conflicts", reads=identities.PATHS, codes=["IDENTITY_CONFLICT"])
+def _check_identity_conflicts(fin: Financials) -> List[Issue]:
+    # Identidades sobredeterminadas que no cuadran, señalando si involucran derivados
+    if not IDENTITY_SOLVER_ENABLED:
+        return []
+    issues = []
+    for ident_id in identities.conflicts(fin):
+        if ident_id in _COVERED:
+            continue
+        paths = [p for _, p in identities.TERMS[ident_id]]
+        derived = [p for p in paths if identities.is_derived(fin.fields_raw.get(p))]
+        issues.append(Issue(code="IDENTITY_CONFLICT",
+                            message=f"No cuadra: {identities.BY_ID[ident_id]['label']}"
+                                    + (f" (derivado: {', '.join(derived)})" if derived else ""),
                             severity="error",
-                            fields=critical_missing))
+                            fields=paths))
     return issues
+
+def _value(fin: Financials, path: str) -> Optional[float]:
+    sec, attr = path.split(".")
+    return getattr(getattr(fin, sec), attr)
+
+def check_accounting_constraints(fin: Financials, only: Optional[Set[str]] = None) -> List[Issue]:
+    issues: List[Issue] = []
+    values: Dict[str, Optional[float]] = {}
+    for name, spec in CHECKS.items():
+        if only is not None and name not in only:
+            continue
+        rule = spec.get("rule")
+        if rule is None:
+            issues.extend(spec["fn"](fin))
+            continue
+        for p in rule.fields:
+            if p not in values:
+                values[p] = _value(fin, p)
+        issue = rule.check_row(values)
+        if issue is not None:
+            issues.append(issue)
+    return issues
+
+def recheck(fin: Financials, prev_issues: List[Issue], checks: Set[str]) -> List[Issue]:
+    """Re-ejecuta sólo `checks`; conserva los issues previos de los demás."""
+    rerun_codes = {c for name in checks for c in CHECKS[name]["codes"]}
+    # Varias reglas pueden compartir código (p.ej. NEGATIVE_NOT_ALLOWED): al descartar los
+    # issues previos de un código se re-ejecutan todas las que lo emiten
+    checks = set(checks) | {name for name, spec in CHECKS.items() if rerun_codes & set(spec["codes"])}
+    kept = [i for i in prev_issues if i.code not in rerun_codes]
+    return kept + check_accounting_constraints(fin, only=checks)
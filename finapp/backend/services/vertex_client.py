@@ -1,66 +1,154 @@
-import os, json
-from typing import Dict, Any, List, Tuple
-from ..settings import GCP_PROJECT, GCP_LOCATION, VERTEX_MODEL_ID, GCS_BUCKET
-from vertexai import init as vertex_init
-from vertexai.generative_models import GenerativeModel, Part, Tool, FunctionDeclaration, GenerationConfig, Content
+import os, json, hashlib, asyncio, random, time
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Tuple
+from ..settings import (GCP_PROJECT, GCP_LOCATION, VERTEX_MODEL_ID, GCS_BUCKET, VERTEX_BACKEND,
+                        VERTEX_FAKE_RESPONSE, VERTEX_MAX_CONCURRENCY, VERTEX_TIMEOUT_S, VERTEX_MAX_RETRIES,
+                        VERTEX_BACKOFF_BASE_S, VERTEX_BACKOFF_MAX_S, VERTEX_PRICE_INPUT_PER_M,
+                        VERTEX_PRICE_OUTPUT_PER_M)
+from . import metrics
+from . import tables as tbl
+
+# El SDK de Vertex tarda segundos en importarse: se carga en la primera extracción
+# (o en el warm-up), no al importar la app.
+@lru_cache(maxsize=1)
+def _gm():
+    from vertexai import generative_models
+    return generative_models
+
+@lru_cache(maxsize=1)
+def _gexc():
+    from google.api_core import exceptions
+    return exceptions
 
 vertex_initialized = False
-model: GenerativeModel = None
+model = None  # vertexai GenerativeModel o FakeModel
+
+class FakeModel:
+    """Backend falso para pruebas sin red: responde submit_extraction con args fijos.
+
+    `fail_times` hace que las primeras N llamadas lancen ServiceUnavailable (prueba de reintentos).
+    """
+    def __init__(self, args: Optional[Dict[str, Any]] = None, delay_s: float = 0.0, fail_times: int = 0):
+        self.args = args or {"fields": [], "period": None, "currency": None, "scale_hint": None}
+        self.delay_s = delay_s
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def _response(self):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise _gexc().ServiceUnavailable("fake: no disponible")
+        part = SimpleNamespace(function_call=SimpleNamespace(name="submit_extraction", args=self.args))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+                               text=json.dumps(self.args),
+                               usage_metadata=SimpleNamespace(prompt_token_count=0, candidates_token_count=0,
+                                                              total_token_count=0))
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(self.delay_s)
+        return self._response()
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(self.delay_s)
+        return self._response()
+
+def _fake_model() -> FakeModel:
+    args = None
+    if VERTEX_FAKE_RESPONSE:
+        with open(VERTEX_FAKE_RESPONSE, encoding="utf-8") as f:
+            args = json.load(f)
+    return FakeModel(args)
 
 def init_vertex():
     global vertex_initialized, model
     if vertex_initialized:
         return
+    if VERTEX_BACKEND == "fake":
+        model = _fake_model()
+        vertex_initialized = True
+        return
     if not GCP_PROJECT:
         raise RuntimeError("GCP_PROJECT no configurado")
-    vertex_init(project=GCP_PROJECT, location=GCP_LOCATION or "us-central1")
-    model = GenerativeModel(VERTEX_MODEL_ID or "gemini-2.0-flash")
+    import vertexai
+    vertexai.init(project=GCP_PROJECT, location=GCP_LOCATION or "us-central1")
+    model = _gm().GenerativeModel(VERTEX_MODEL_ID or "gemini-2.0-flash")
     vertex_initialized = True
 
-def _build_extraction_tool() -> Tool:
+def warm_up() -> None:
+    """Importa el SDK, arma tool/config y crea el modelo (sin llamadas de red)."""
+    _retryable()
+    _request_kwargs()
+    init_vertex()
+
+def set_model(m) -> None:
+    """Inyecta un modelo (p.ej. FakeModel) en lugar de Vertex."""
+    global vertex_initialized, model
+    model = m
+    vertex_initialized = True
+
+# Esquema de la function submit_extraction (también forma parte de la llave de caché)
+EXTRACTION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "period": {"type": "string", "description": "Periodo reportado, por ej. 2024Q4 o 2024-12-31"},
+        "currency": {"type": "string"},
+        "scale_hint": {"type": "string", "enum": ["UNIDAD", "MILES", "MILLONES"]},
+        "fields": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "p.ej. balance.total_assets"},
+                    "value": {"type": "number", "nullable": True},
+                    "unit": {"type": "string", "nullable": True},
+                    "confidence": {"type": "number"}
+                },
+                "required": ["path","confidence"]
+            }
+        }
+    },
+    "required": ["fields"]
+}
+
+def _build_extraction_tool():
     # Function schema: el modelo "llama" submit_extraction con los campos y confidencias
-    submit_extraction = FunctionDeclaration(
+    gm = _gm()
+    submit_extraction = gm.FunctionDeclaration(
         name="submit_extraction",
         description="Devuelve valores extraídos de estados financieros normalizados con confianza 0-1",
-        parameters={
-            "type": "object",
-            "properties": {
-                "period": {"type": "string", "description": "Periodo reportado, por ej. 2024Q4 o 2024-12-31"},
-                "currency": {"type": "string"},
-                "scale_hint": {"type": "string", "enum": ["UNIDAD", "MILES", "MILLONES"]},
-                "fields": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "p.ej. balance.total_assets"},
-                            "value": {"type": "number", "nullable": True},
-                            "unit": {"type": "string", "nullable": True},
-                            "confidence": {"type": "number"}
-                        },
-                        "required": ["path","confidence"]
-                    }
-                }
-            },
-            "required": ["fields"]
-        }
+        parameters=EXTRACTION_SCHEMA
     )
-    return Tool(function_declarations=[submit_extraction])
+    return gm.Tool(function_declarations=[submit_extraction])
+
+# Súbelo al cambiar el prompt de forma semántica (invalida la caché de extracción)
+PROMPT_VERSION = "2"
 
 SYSTEM_PROMPT = """Eres un extractor financiero. 
 Lee el documento (texto/tablas/imagen) y devuelve campos en el esquema pedido. 
 NO inventes valores. Cuando no estés seguro deja value = null y confidence baja.
 Usa nombres canónicos:
-balance.(cash,accounts_receivable,inventory,current_assets,total_assets,accounts_payable,short_term_debt,current_liabilities,long_term_debt,total_liabilities,shareholders_equity)
+balance.(cash,accounts_receivable,inventory,current_assets,non_current_assets,total_assets,accounts_payable,short_term_debt,current_liabilities,long_term_debt,non_current_liabilities,total_liabilities,shareholders_equity)
 income.(revenue,cogs,gross_profit,operating_income,ebitda,interest_expense,net_income)
-cashflow.(operating_cf,investing_cf,financing_cf,free_cf)
+cashflow.(operating_cf,investing_cf,financing_cf,capex,free_cf)
+capex es la inversión en propiedades, planta y equipo, en valor positivo.
 Devuelve con function calling a submit_extraction."""
 
-def extract_with_vertex(gcs_uri_mime: Tuple[str,str] = None,
-                        inline_text: str = "",
-                        tables: List[Dict[str,Any]] = None) -> Dict[str, Any]:
-    """Intenta extracción multimodal (GCS). Si no, usa texto/tablas como contexto."""
-    init_vertex()
+def extraction_fingerprint() -> str:
+    """Huella de modelo + prompt + esquema; si cambia cualquiera, la caché se invalida."""
+    h = hashlib.sha256()
+    h.update((VERTEX_MODEL_ID or "gemini-2.0-flash").encode())
+    h.update(PROMPT_VERSION.encode())
+    h.update(SYSTEM_PROMPT.encode())
+    h.update(json.dumps(EXTRACTION_SCHEMA, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+def _build_parts(gcs_uri_mime: Tuple[str,str] = None,
+                 inline_text: str = "",
+                 tables: List[Dict[str,Any]] = None) -> List[Any]:
+    Part = _gm().Part
     parts = [Part.from_text(SYSTEM_PROMPT)]
     if gcs_uri_mime:
         uri, mime = gcs_uri_mime
@@ -71,20 +159,19 @@ def extract_with_vertex(gcs_uri_mime: Tuple[str,str] = None,
         # Adjunta tablas como texto simplificado
         tb = ""
         for t in tables[:5]:
-            rows = t.get("rows") or []
-            cols = t.get("columns")
-            if cols:
-                tb += " | ".join(map(str, cols)) + "\n"
-            for r in rows[:20]:
-                tb += " | ".join(map(lambda x: str(x) if x is not None else "", r)) + "\n"
-            tb += "\n"
+            tb += tbl.to_text(t, max_rows=20) + "\n\n"
         parts.append(Part.from_text(f"CONTEXT_TABLES:\n{tb[:12000]}"))
+    return parts
 
-    resp = model.generate_content(
-        [Content(role="user", parts=parts)],
-        tools=[_build_extraction_tool()],
-        generation_config=GenerationConfig(temperature=0)
-    )
+def _to_plain(obj):
+    # Los args de function_call llegan como MapComposite/RepeatedComposite (proto); a dict/list
+    if isinstance(obj, Mapping):
+        return {k: _to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, Sequence) and not isinstance(obj, (str, bytes)):
+        return [_to_plain(v) for v in obj]
+    return obj
+
+def _parse_response(resp) -> Dict[str, Any]:
     # Busca function_call
     fn_call = None
     for cand in (resp.candidates or []):
@@ -101,5 +188,118 @@ def extract_with_vertex(gcs_uri_mime: Tuple[str,str] = None,
             return {"fields": [], "period": None, "currency": None, "scale_hint": None}
 
     # Args de la function
-    args = json.loads(fn_call.args) if isinstance(fn_call.args, str) else dict(fn_call.args)
+    args = json.loads(fn_call.args) if isinstance(fn_call.args, str) else _to_plain(fn_call.args)
     return args
+
+@lru_cache(maxsize=1)
+def _retryable() -> tuple:
+    # Errores de cuota / transitorios que vale la pena reintentar
+    gexc = _gexc()
+    return (gexc.ResourceExhausted, gexc.TooManyRequests, gexc.ServiceUnavailable,
+            gexc.DeadlineExceeded, gexc.InternalServerError, asyncio.TimeoutError, TimeoutError)
+
+def _backoff(attempt: int) -> float:
+    # Backoff exponencial con "full jitter"
+    return random.uniform(0, min(VERTEX_BACKOFF_MAX_S, VERTEX_BACKOFF_BASE_S * (2 ** attempt)))
+
+def _request_kwargs() -> Dict[str, Any]:
+    return {"tools": [_build_extraction_tool()], "generation_config": _gm().GenerationConfig(temperature=0)}
+
+_sync_executor: Optional[ThreadPoolExecutor] = None
+
+def _generate_with_timeout(contents):
+    # El SDK síncrono no acepta timeout: la llamada corre en un hilo y se deja de esperar a los
+    # VERTEX_TIMEOUT_S, como asyncio.wait_for en el camino async (TimeoutError se reintenta)
+    global _sync_executor
+    if _sync_executor is None:
+        _sync_executor = ThreadPoolExecutor(max_workers=VERTEX_MAX_CONCURRENCY, thread_name_prefix="vertex")
+    return _sync_executor.submit(model.generate_content, contents, **_request_kwargs()).result(timeout=VERTEX_TIMEOUT_S)
+
+def extract_with_vertex(gcs_uri_mime: Tuple[str,str] = None,
+                        inline_text: str = "",
+                        tables: List[Dict[str,Any]] = None) -> Dict[str, Any]:
+    """Intenta extracción multimodal (GCS). Si no, usa texto/tablas como contexto."""
+    init_vertex()
+    contents = [_gm().Content(role="user", parts=_build_parts(gcs_uri_mime, inline_text, tables))]
+    for attempt in range(VERTEX_MAX_RETRIES + 1):
+        try:
+            with metrics.span("model_call", attempt=attempt) as attrs:
+                resp = _generate_with_timeout(contents)
+                attrs.update(_usage(resp))
+            return _parse_response(resp)
+        except _retryable():
+            if attempt == VERTEX_MAX_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+
+def _usage(resp) -> Dict[str, int]:
+    return metrics.record_model_usage(resp, (VERTEX_PRICE_INPUT_PER_M, VERTEX_PRICE_OUTPUT_PER_M), VERTEX_MODEL_ID)
+
+# --- Cliente async: tope de concurrencia, reintentos y single-flight ---
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_inflight: Dict[str, asyncio.Future] = {}
+stats = {"calls": 0, "retries": 0, "coalesced": 0}
+metrics.register_collector("finapp_vertex_client_total", "Contadores del cliente Vertex (llamadas, reintentos, agrupadas)",
+                           "counter", lambda: stats)
+
+def _request_key(gcs_uri_mime, inline_text, tables) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([gcs_uri_mime, inline_text, tables], default=str, sort_keys=True).encode())
+    h.update(extraction_fingerprint().encode())
+    return h.hexdigest()
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(VERTEX_MAX_CONCURRENCY)
+    return _semaphore
+
+async def _call_with_retries(contents) -> Dict[str, Any]:
+    for attempt in range(VERTEX_MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                stats["calls"] += 1
+                with metrics.span("model_call", attempt=attempt) as attrs:
+                    resp = await asyncio.wait_for(model.generate_content_async(contents, **_request_kwargs()),
+                                                  timeout=VERTEX_TIMEOUT_S)
+                    attrs.update(_usage(resp))
+            return _parse_response(resp)
+        except _retryable():
+            if attempt == VERTEX_MAX_RETRIES:
+                raise
+            stats["retries"] += 1
+            # El backoff se espera fuera del semáforo para no retener el cupo
+            await asyncio.sleep(_backoff(attempt))
+
+async def aextract_with_vertex(gcs_uri_mime: Tuple[str,str] = None,
+                               inline_text: str = "",
+                               tables: List[Dict[str,Any]] = None) -> Dict[str, Any]:
+    """Versión async de extract_with_vertex.
+
+    Llamadas simultáneas con entradas idénticas se agrupan: sólo una llega al modelo
+    y todas reciben el mismo resultado (o la misma excepción).
+    """
+    init_vertex()
+    key = _request_key(gcs_uri_mime, inline_text, tables)
+    fut = _inflight.get(key)
+    if fut is not None:
+        stats["coalesced"] += 1
+        return await asyncio.shield(fut)
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        contents = [_gm().Content(role="user", parts=_build_parts(gcs_uri_mime, inline_text, tables))]
+        result = await _call_with_retries(contents)
+        fut.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # marca la excepción como recuperada si nadie más espera
+        raise
+    finally:
+        _inflight.pop(key, None)
@@ -0,0 +1,66 @@
+import time, asyncio
+from typing import Any, Callable, Dict, Optional
+from . import parsers, vertex_client
+from ..settings import GCS_BUCKET, WARMUP_PARSE_POOL, WARMUP_ON_STARTUP
+
+# Arranque en frío: la app abre el puerto con lo mínimo (settings + grafo) y el resto
+# (SDK de Vertex, librerías de parseo, cliente de GCS) se precarga aquí, en segundo plano
+# al iniciar o bajo demanda con POST /warmup. /ready responde 200 cuando terminó.
+
+state: Dict[str, Any] = {"graph": False, "warm": False, "phases": {}, "errors": {}}
+_task: Optional[asyncio.Task] = None
+
+def mark(phase: str, seconds: float) -> None:
+    state["phases"][phase] = round(seconds, 4)
+
+def _gcs() -> None:
+    if GCS_BUCKET:
+        from . import gcs
+        gcs.get_backend()
+
+STEPS: Dict[str, Callable[[], None]] = {
+    "parsers": lambda: parsers.warm_up(pool=WARMUP_PARSE_POOL),
+    "vertex": vertex_client.warm_up,
+    "gcs": _gcs,
+}
+
+async def _run() -> Dict[str, Any]:
+    for name, fn in STEPS.items():
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+            state["errors"].pop(name, None)
+        except Exception as e:
+            # Un paso fallido no bloquea /ready (p.ej. sin GCP_PROJECT el camino CSV sigue sirviendo)
+            state["errors"][name] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Warm-up {name}: {e}")
+        mark(f"warmup:{name}", time.perf_counter() - t0)
+    state["warm"] = True
+    return report()
+
+def start() -> asyncio.Task:
+    """Lanza el warm-up una sola vez; llamadas concurrentes comparten la misma tarea."""
+    global _task
+    if _task is None or (_task.done() and not state["warm"]):
+        _task = asyncio.create_task(_run())
+    return _task
+
+async def stop() -> None:
+    # Al apagar: el hilo en curso termina solo, pero la tarea no debe quedar colgada del loop
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+    state["graph"] = False
+
+def is_ready() -> bool:
+    # Sin warm-up al iniciar, basta con el grafo (lo demás se carga en la primera petición)
+    return state["graph"] and (state["warm"] or not WARMUP_ON_STARTUP)
+
+def report() -> Dict[str, Any]:
+    return {"ready": is_ready(), "graph": state["graph"], "warm": state["warm"],
+            "phases": dict(state["phases"]), "errors": dict(state["errors"])}
@@ -7,6 +7,12 @@ load_dotenv()
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 
+# === Respuestas: compresión negociada (gzip/zstd) y msgpack opcional ===
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+RESPONSE_MSGPACK_ENABLED = os.getenv("RESPONSE_MSGPACK_ENABLED", "1") == "1"
+
 # === Umbrales de confianza ===
 CONF_HIGH = float(os.getenv("CONF_HIGH", "0.80"))
 CONF_MED = float(os.getenv("CONF_MED", "0.50"))
@@ -16,6 +22,13 @@ GCP_PROJECT = os.getenv("GCP_PROJECT")
 GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
 VERTEX_MODEL_ID = os.getenv("VERTEX_MODEL_ID", "gemini-2.0-flash")
 GCS_BUCKET = os.getenv("GCS_BUCKET")
+VERTEX_BACKEND = os.getenv("VERTEX_BACKEND", "vertex")  # vertex | fake (pruebas sin red)
+VERTEX_FAKE_RESPONSE = os.getenv("VERTEX_FAKE_RESPONSE")  # JSON con los args de submit_extraction
+VERTEX_MAX_CONCURRENCY = int(os.getenv("VERTEX_MAX_CONCURRENCY", "4"))
+VERTEX_TIMEOUT_S = float(os.getenv("VERTEX_TIMEOUT_S", "120"))
+VERTEX_MAX_RETRIES = int(os.getenv("VERTEX_MAX_RETRIES", "4"))
+VERTEX_BACKOFF_BASE_S = float(os.getenv("VERTEX_BACKOFF_BASE_S", "1.0"))
+VERTEX_BACKOFF_MAX_S = float(os.getenv("VERTEX_BACKOFF_MAX_S", "30"))
 
 # === App Config ===
 BASE_CURRENCY = os.getenv("BASE_CURRENCY", "MXN")
@@ -27,27 +40,137 @@ IS_CLOUD_RUN = os.getenv("K_SERVICE") is not None
 
 if IS_CLOUD_RUN:
     # En Cloud Run: usar /tmp/ que es el único directorio escribible
-    print("🔷 Ejecutando en Cloud Run - usando /tmp/ para almacenamiento temporal")
     STORAGE_DIR = "/tmp/finapp_storage"
     DOCS_DIR = "/tmp/finapp_storage/docs"
     CHECKPOINT_DB = "/tmp/finapp_storage/checkpoints.db"
 else:
     # En local: usar directorio relativo como antes
-    print("💻 Ejecutando en local - usando directorio ./storage")
     STORAGE_DIR = os.path.join(os.path.dirname(__file__), "storage")
     DOCS_DIR = os.path.join(STORAGE_DIR, "docs")
     CHECKPOINT_DB = os.path.join(STORAGE_DIR, "checkpoints.db")
 
-# Crear directorios si no existen
-try:
-    os.makedirs(DOCS_DIR, exist_ok=True)
-    print(f"✅ Directorio DOCS_DIR creado/verificado: {DOCS_DIR}")
-except Exception as e:
-    print(f"⚠️ Advertencia: No se pudo crear DOCS_DIR: {e}")
-    # En Cloud Run esto no es crítico si usamos GCS directamente
-
-# === VALIDACIÓN: Si estamos en Cloud Run, GCS_BUCKET es obligatorio ===
-if IS_CLOUD_RUN and not GCS_BUCKET:
-    print("⚠️ ADVERTENCIA: Ejecutando en Cloud Run sin GCS_BUCKET configurado.")
-    print("   Los archivos temporales se perderán al reiniciar la instancia.")
-    print("   Configura GCS_BUCKET para almacenamiento permanente.")
+CHECKPOINT_BUSY_TIMEOUT_MS = int(os.getenv("CHECKPOINT_BUSY_TIMEOUT_MS", "5000"))
+
+# === Checkpoints compactos: blobs por contenido, compresión y retención ===
+BLOBS_DIR = os.getenv("BLOBS_DIR", os.path.join(STORAGE_DIR, "blobs"))
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "1024"))
+CHECKPOINT_TTL_HOURS = float(os.getenv("CHECKPOINT_TTL_HOURS", "72"))
+CHECKPOINT_MAX_MB = float(os.getenv("CHECKPOINT_MAX_MB", "256"))
+CHECKPOINT_PRUNE_INTERVAL_S = int(os.getenv("CHECKPOINT_PRUNE_INTERVAL_S", "1800"))
+# Blobs sin referencia se borran al podar, salvo los más nuevos que esto (corridas en curso)
+BLOB_GC_GRACE_S = int(os.getenv("BLOB_GC_GRACE_S", "900"))
+
+
+# === GCS: backend ("gcs" real o "local" para pruebas) y subida en paralelo ===
+GCS_BACKEND = os.getenv("GCS_BACKEND", "gcs")
+GCS_LOCAL_DIR = os.getenv("GCS_LOCAL_DIR", os.path.join(STORAGE_DIR, "gcs_local"))
+GCS_CHUNKED_THRESHOLD = int(os.getenv("GCS_CHUNKED_THRESHOLD", str(64 * 1024 * 1024)))
+GCS_CHUNK_SIZE = int(os.getenv("GCS_CHUNK_SIZE", str(32 * 1024 * 1024)))
+GCS_UPLOAD_WORKERS = int(os.getenv("GCS_UPLOAD_WORKERS", "8"))
+
+# === Caché de extracción (hash de contenido + modelo + prompt + esquema) ===
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1") == "1"
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB", os.path.join(STORAGE_DIR, "extraction_cache.db"))
+EXTRACTION_CACHE_TTL_S = int(os.getenv("EXTRACTION_CACHE_TTL_S", str(30 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+
+# === Almacén de financials finalizados (series de tiempo / cortes por periodo) ===
+FIN_STORE_ENABLED = os.getenv("FIN_STORE_ENABLED", "1") == "1"
+FIN_STORE_DB = os.getenv("FIN_STORE_DB", os.path.join(STORAGE_DIR, "financials.db"))
+
+# === Parseo de PDFs (pool de procesos por página) ===
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARSE_PAGE_BATCH = int(os.getenv("PARSE_PAGE_BATCH", "8"))
+PARSE_POOL_MIN_PAGES = int(os.getenv("PARSE_POOL_MIN_PAGES", "16"))
+PARSE_STOP_EARLY = os.getenv("PARSE_STOP_EARLY", "0") == "1"
+PARSE_STOP_TRAILING_PAGES = int(os.getenv("PARSE_STOP_TRAILING_PAGES", "2"))
+# Hojas de cálculo: todas las hojas en streaming, con topes de hojas y filas por hoja
+PARSE_MAX_SHEETS = int(os.getenv("PARSE_MAX_SHEETS", "20"))
+PARSE_MAX_ROWS = int(os.getenv("PARSE_MAX_ROWS", "5000"))  # por hoja / CSV
+PARSE_CSV_ENGINE = os.getenv("PARSE_CSV_ENGINE", "pyarrow")  # pyarrow | c (respaldo automático a c)
+
+# === OCR local (Tesseract) para imágenes y páginas escaneadas de PDFs ===
+OCR_ENABLED = os.getenv("OCR_ENABLED", "1") == "1"
+OCR_LANG = os.getenv("OCR_LANG", "spa+eng")
+OCR_PSM = int(os.getenv("OCR_PSM", "6"))  # 6 = bloque uniforme de texto (estados tabulares)
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))  # render de páginas PDF sin capa de texto
+OCR_TILE_PX = int(os.getenv("OCR_TILE_PX", "2000"))  # alto de cada franja de la imagen
+OCR_TILE_OVERLAP_PX = int(os.getenv("OCR_TILE_OVERLAP_PX", "120"))  # > 2 líneas de texto a OCR_DPI
+OCR_MIN_WORD_CONF = float(os.getenv("OCR_MIN_WORD_CONF", "40"))  # palabras con menos confianza se descartan
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "200"))  # menos texto: la imagen sigue yendo a multimodal
+OCR_PDF_MIN_CHARS = int(os.getenv("OCR_PDF_MIN_CHARS", "20"))  # páginas PDF con menos texto se tratan como escaneadas
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", os.path.join(STORAGE_DIR, "ocr_cache.db"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "2000"))
+
+# === Localizador de páginas de estados financieros (antes de extraer) ===
+LOCATOR_ENABLED = os.getenv("LOCATOR_ENABLED", "1") == "1"
+LOCATOR_MAX_PAGES = int(os.getenv("LOCATOR_MAX_PAGES", "6"))
+LOCATOR_MAX_TABLES = int(os.getenv("LOCATOR_MAX_TABLES", "5"))
+LOCATOR_MIN_REL_SCORE = float(os.getenv("LOCATOR_MIN_REL_SCORE", "0.2"))
+
+# === Extracción map-reduce por grupos de páginas ===
+EXTRACT_MAPREDUCE_ENABLED = os.getenv("EXTRACT_MAPREDUCE_ENABLED", "1") == "1"
+EXTRACT_GROUP_PAGES = int(os.getenv("EXTRACT_GROUP_PAGES", "3"))
+EXTRACT_GROUP_CHARS = int(os.getenv("EXTRACT_GROUP_CHARS", "18000"))  # mismo tope que el prompt
+EXTRACT_MAX_GROUPS = int(os.getenv("EXTRACT_MAX_GROUPS", "8"))
+
+# === Camino rápido sin LLM para CSV/XLSX ===
+TABLE_FASTPATH_ENABLED = os.getenv("TABLE_FASTPATH_ENABLED", "1") == "1"
+TABLE_FASTPATH_MIN_COVERAGE = float(os.getenv("TABLE_FASTPATH_MIN_COVERAGE", "0.8"))  # fracción de campos críticos
+TABLE_MAP_MIN_SCORE = float(os.getenv("TABLE_MAP_MIN_SCORE", "0.82"))  # similitud mínima etiqueta~sinónimo
+# Tope de confianza de una coincidencia sólo difusa: debajo de CONF_MED para que pase por revisión
+TABLE_MAP_FUZZY_MAX_CONF = float(os.getenv("TABLE_MAP_FUZZY_MAX_CONF", "0.45"))
+
+# === Streaming de eventos (SSE) ===
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+
+# === Métricas / trazas ===
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TRACE_RUNS = int(os.getenv("METRICS_TRACE_RUNS", "500"))  # corridas con spans en memoria
+METRICS_TRACE_MAX_SPANS = int(os.getenv("METRICS_TRACE_MAX_SPANS", "200"))
+METRICS_PAYLOAD_SIZES = os.getenv("METRICS_PAYLOAD_SIZES", "1") == "1"  # serializa cada update para medirlo
+# Precio USD por millón de tokens (entrada / salida) para estimar costo
+VERTEX_PRICE_INPUT_PER_M = float(os.getenv("VERTEX_PRICE_INPUT_PER_M", "0.10"))
+VERTEX_PRICE_OUTPUT_PER_M = float(os.getenv("VERTEX_PRICE_OUTPUT_PER_M", "0.40"))
+
+# === Ingesta por lotes (cola de trabajos) ===
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "5000"))
+
+# === Sweeps de escenarios (what-if vectorizado) ===
+SWEEP_MAX_SCENARIOS = int(os.getenv("SWEEP_MAX_SCENARIOS", "200000"))
+
+# === Reglas de validación declarativas (JSON opcional; si no, reglas por defecto) ===
+RULES_FILE = os.getenv("RULES_FILE")
+
+# === Identidades contables: derivar campos faltantes antes de validar ===
+IDENTITY_SOLVER_ENABLED = os.getenv("IDENTITY_SOLVER_ENABLED", "1") == "1"
+IDENTITY_CONF_DECAY = float(os.getenv("IDENTITY_CONF_DECAY", "0.95"))  # confianza derivada = mín(entradas) * decay
+# Tope de confianza de un derivado que participa en una identidad que no cuadra (debajo de CONF_MED)
+IDENTITY_CONFLICT_MAX_CONF = float(os.getenv("IDENTITY_CONFLICT_MAX_CONF", "0.40"))
+
+# === Arranque en frío: warm-up en segundo plano al iniciar (ver /ready y /warmup) ===
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_PARSE_POOL = os.getenv("WARMUP_PARSE_POOL", "0") == "1"  # levanta también los procesos del pool de PDFs
+
+def prepare_storage() -> None:
+    """Crea directorios y reporta el modo de almacenamiento. Se llama en el arranque de la app,
+    no al importar este módulo (importarlo no toca el disco ni imprime)."""
+    if IS_CLOUD_RUN:
+        print("🔷 Ejecutando en Cloud Run - usando /tmp/ para almacenamiento temporal")
+    else:
+        print("💻 Ejecutando en local - usando directorio ./storage")
+    # Crear directorios si no existen
+    try:
+        os.makedirs(DOCS_DIR, exist_ok=True)
+        print(f"✅ Directorio DOCS_DIR creado/verificado: {DOCS_DIR}")
+    except Exception as e:
+        print(f"⚠️ Advertencia: No se pudo crear DOCS_DIR: {e}")
+        # En Cloud Run esto no es crítico si usamos GCS directamente
+
+    # === VALIDACIÓN: Si estamos en Cloud Run, GCS_BUCKET es obligatorio ===
+    if IS_CLOUD_RUN and not GCS_BUCKET:
+        print("⚠️ ADVERTENCIA: Ejecutando en Cloud Run sin GCS_BUCKET configurado.")
+        print("   Los archivos temporales se perderán al reiniciar la instancia.")
+        print("   Configura GCS_BUCKET para almacenamiento permanente.")
@@ -0,0 +1,171 @@
+import os, random
+from typing import List, Optional
+import pandas as pd
+from ..backend.models import Financials, BalanceSheet, IncomeStatement, CashFlow
+
+# Generadores de datos sintéticos para los benchmarks: estados financieros coherentes
+# (activo = pasivo + capital) y documentos PDF/CSV/XLSX de tamaño configurable.
+
+BALANCE_LABELS = [
+    ("Efectivo y equivalentes", "cash"), ("Cuentas por cobrar", "accounts_receivable"),
+    ("Inventarios", "inventory"), ("Activo circulante", "current_assets"), ("Total activo", "total_assets"),
+    ("Proveedores", "accounts_payable"), ("Deuda a corto plazo", "short_term_debt"),
+    ("Pasivo circulante", "current_liabilities"), ("Deuda a largo plazo", "long_term_debt"),
+    ("Total pasivo", "total_liabilities"), ("Capital contable", "shareholders_equity"),
+]
+INCOME_LABELS = [
+    ("Ingresos", "revenue"), ("Costo de ventas", "cogs"), ("Utilidad bruta", "gross_profit"),
+    ("Utilidad de operación", "operating_income"), ("EBITDA", "ebitda"),
+    ("Gastos por intereses", "interest_expense"), ("Utilidad neta", "net_income"),
+]
+FILLER = ("Informe anual. Nota {n}: la administración presenta información complementaria sobre "
+          "políticas contables, riesgos de mercado, partes relacionadas y eventos posteriores. ")
+
+def synthetic_financials(n: int, seed: int = 0) -> List[Financials]:
+    """n estados coherentes con valores aleatorios (≈5% con campos faltantes)."""
+    rng = random.Random(seed)
+    out = []
+    for k in range(n):
+        cash, ar, inv = (rng.uniform(1e3, 5e4) for _ in range(3))
+        ca = cash + ar + inv
+        ta = ca + rng.uniform(1e4, 2e5)
+        ap, std = rng.uniform(1e3, 3e4), rng.uniform(0, 2e4)
+        cl = ap + std
+        ltd = rng.uniform(0, 1e5)
+        tl = cl + ltd
+        rev = rng.uniform(5e4, 5e5)
+        cogs = rev * rng.uniform(0.3, 0.8)
+        op = (rev - cogs) * rng.uniform(0.1, 0.6)
+        fin = Financials(
+            period=str(2000 + k % 25), currency="MXN", scale="MILES",
+            balance=BalanceSheet(cash=cash, accounts_receivable=ar, inventory=inv, current_assets=ca,
+                                 total_assets=ta, accounts_payable=ap, short_term_debt=std,
+                                 current_liabilities=cl, long_term_debt=ltd, total_liabilities=tl,
+                                 shareholders_equity=ta - tl),
+            income=IncomeStatement(revenue=rev, cogs=cogs, gross_profit=rev - cogs, operating_income=op,
+                                   ebitda=op * 1.2, interest_expense=-rng.uniform(0, 5e3),
+                                   net_income=op * 0.7),
+            cashflow=CashFlow(operating_cf=op * 0.9, investing_cf=-rng.uniform(0, 5e4),
+                              financing_cf=rng.uniform(-2e4, 2e4), free_cf=op * 0.5),
+        )
+        if rng.random() < 0.05:
+            fin.income.interest_expense = None
+            fin.balance.shareholders_equity = None
+        out.append(fin)
+    return out
+
+def statement_rows(fin: Financials) -> List[List[str]]:
+    rows = [["Concepto", fin.period]]
+    for label, attr in BALANCE_LABELS:
+        rows.append([label, _fmt(getattr(fin.balance, attr))])
+    for label, attr in INCOME_LABELS:
+        rows.append([label, _fmt(getattr(fin.income, attr))])
+    return rows
+
+def _fmt(v: Optional[float]) -> str:
+    return "" if v is None else f"{v:,.0f}"
+
+# --- PDF mínimo (sin dependencias): texto Helvetica + tablas con líneas para pdfplumber ---
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _text_ops(lines: List[str], x: float = 50, y: float = 760, size: int = 10, leading: float = 14) -> str:
+    ops = [f"BT /F1 {size} Tf {leading} TL {x} {y} Td"]
+    for line in lines:
+        ops.append(f"({_pdf_escape(line)}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops)
+
+def _table_ops(rows: List[List[str]], x: float = 50, y: float = 700, widths=(260, 140), h: float = 16) -> str:
+    ops = ["0.5 w"]
+    total_w = sum(widths)
+    for r in range(len(rows) + 1):
+        yy = y - r * h
+        ops.append(f"{x} {yy} m {x + total_w} {yy} l S")
+    xx = x
+    for w in (0,) + tuple(widths):
+        xx += w
+        ops.append(f"{xx} {y} m {xx} {y - len(rows) * h} l S")
+    for r, row in enumerate(rows):
+        xx = x
+        for w, cell in zip(widths, row):
+            ops.append(f"BT /F1 9 Tf {xx + 4} {y - (r + 1) * h + 4} Td ({_pdf_escape(cell)}) Tj ET")
+            xx += w
+    return "\n".join(ops)
+
+def _latin1(s: str) -> bytes:
+    # Helvetica con WinAnsiEncoding: acentos en latin-1
+    return s.encode("latin-1", errors="replace")
+
+def write_pdf(path: str, pages: int = 20, statement_every: int = 10, seed: int = 0) -> str:
+    """PDF de `pages` páginas: una página de balance y una de resultados cada `statement_every`."""
+    fins = synthetic_financials(max(1, pages // max(1, statement_every)), seed)
+    streams = []
+    for p in range(pages):
+        block, pos = divmod(p, max(1, statement_every))
+        fin = fins[min(block, len(fins) - 1)]
+        if pos == 0:
+            rows = [["Concepto", fin.period]] + [[l, _fmt(getattr(fin.balance, a))] for l, a in BALANCE_LABELS]
+            body = _text_ops(["Estado de situación financiera", f"Cifras en miles de pesos (MXN) {fin.period}"])
+            body += "\n" + _table_ops(rows)
+        elif pos == 1:
+            rows = [["Concepto", fin.period]] + [[l, _fmt(getattr(fin.income, a))] for l, a in INCOME_LABELS]
+            body = _text_ops(["Estado de resultados", f"Cifras en miles de pesos (MXN) {fin.period}"])
+            body += "\n" + _table_ops(rows)
+        else:
+            body = _text_ops([(FILLER.format(n=p))[i:i + 90] for i in range(0, 90 * 30, 90)])
+        streams.append(_latin1(body))
+
+    # Objetos: 1 catálogo, 2 páginas, 3 fuente, luego (página, contenido) por hoja
+    objs: List[bytes] = []
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objs.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for i, stream in enumerate(streams):
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+def _frame(rows: int, periods: int = 3, seed: int = 0) -> pd.DataFrame:
+    """Tabla ancha: una fila por concepto, una columna por periodo; repite conceptos hasta `rows`."""
+    fins = synthetic_financials(periods, seed)
+    labels = BALANCE_LABELS + INCOME_LABELS
+    data = {"Concepto": []}
+    for fin in fins:
+        data[fin.period] = []
+    for r in range(rows):
+        label, attr = labels[r % len(labels)]
+        data["Concepto"].append(label if r < len(labels) else f"{label} ({r // len(labels)})")
+        for fin in fins:
+            section = fin.balance if r % len(labels) < len(BALANCE_LABELS) else fin.income
+            data[fin.period].append(getattr(section, attr))
+    return pd.DataFrame(data)
+
+def write_csv(path: str, rows: int = 500, periods: int = 3, seed: int = 0) -> str:
+    _frame(rows, periods, seed).to_csv(path, index=False)
+    return path
+
+def write_xlsx(path: str, rows: int = 500, periods: int = 3, sheets: int = 1, seed: int = 0) -> str:
+    with pd.ExcelWriter(path, engine="openpyxl") as xw:
+        for s in range(sheets):
+            _frame(rows, periods, seed + s).to_excel(xw, sheet_name=f"Hoja{s + 1}", index=False)
+    return path
+
+def ensure_dir(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path
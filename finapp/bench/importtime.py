@@ -0,0 +1,78 @@
+import os, sys, json, argparse, subprocess
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Reporte de tiempo de import (arranque en frío) a partir de `python -X importtime`:
+#   python -m finapp.bench.importtime                 # top de módulos y paquetes
+#   python -m finapp.bench.importtime --strict        # falla si se cuela un import pesado
+# Corre en un proceso nuevo para medir el import en frío (sin módulos ya cargados).
+
+DEFAULT_MODULE = "finapp.backend.app"
+# No deben cargarse al importar la app: se importan al usarse o en el warm-up
+DEFERRED = ("vertexai", "google.cloud.aiplatform", "google.cloud.storage", "pdfplumber", "pandas", "openpyxl")
+
+def profile(module: str) -> List[Dict[str, Any]]:
+    """[{"module", "self_us", "cumulative_us", "depth"}] en el orden en que se importaron."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:       314 |    3344940 |   vertexai" (la sangría del nombre = profundidad)
+        self_us, cum, name = line.split(":", 1)[1].split("|", 2)
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cum),
+                     "depth": (len(name) - len(name.lstrip())) // 2})
+    return rows
+
+def summarize(rows: List[Dict[str, Any]], module: str, top: int) -> Dict[str, Any]:
+    by_pkg: Dict[str, int] = defaultdict(int)
+    for r in rows:
+        by_pkg[r["module"].split(".")[0]] += r["self_us"]
+    total = next((r["cumulative_us"] for r in rows if r["module"] == module), sum(r["self_us"] for r in rows))
+    loaded = {r["module"] for r in rows}
+    return {
+        "module": module,
+        "total_s": total / 1e6,
+        "modules": len(rows),
+        "top_cumulative": sorted(rows, key=lambda r: -r["cumulative_us"])[:top],
+        "top_packages": sorted(({"package": p, "self_s": us / 1e6} for p, us in by_pkg.items()),
+                               key=lambda x: -x["self_s"])[:top],
+        "deferred_loaded": [m for m in DEFERRED if m in loaded],
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Perfil de tiempo de import (arranque en frío)")
+    ap.add_argument("--module", default=DEFAULT_MODULE)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--budget-s", type=float, help="falla si el import total supera este tiempo")
+    ap.add_argument("--strict", action="store_true", help="falla si se importa algún módulo diferido")
+    ap.add_argument("--out", help="escribe el reporte en este JSON")
+    args = ap.parse_args(argv)
+
+    rep = summarize(profile(args.module), args.module, args.top)
+    print(f"⏱️ import {rep['module']}: {rep['total_s']:.3f} s ({rep['modules']} módulos)")
+    print("\nMódulos (acumulado):")
+    for r in rep["top_cumulative"]:
+        print(f"  {r['cumulative_us'] / 1e3:>9.1f} ms  {'  ' * r['depth']}{r['module']}")
+    print("\nPaquetes (propio):")
+    for p in rep["top_packages"]:
+        print(f"  {p['self_s'] * 1e3:>9.1f} ms  {p['package']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rep, f, indent=2)
+
+    status = 0
+    if rep["deferred_loaded"]:
+        print(f"\n⚠️ Imports pesados en el arranque: {', '.join(rep['deferred_loaded'])}")
+        status = 1 if args.strict else 0
+    if args.budget_s is not None and rep["total_s"] > args.budget_s:
+        print(f"❌ {rep['total_s']:.3f} s > presupuesto {args.budget_s:.3f} s")
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
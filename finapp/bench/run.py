@@ -0,0 +1,152 @@
+import os, sys, json, time, shutil, argparse, platform, statistics, tempfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+from ..backend.models import ExtractionField
+from ..backend.services import parsers, ratio_tools, validators, table_mapper
+from ..backend.graph.serde import CompressedSerializer
+from . import generators
+
+# Suite de microbenchmarks offline de los caminos calientes.
+#   python -m finapp.bench.run --save            # graba la línea base
+#   python -m finapp.bench.run --check           # compara y falla si hay regresión
+# Los tiempos se reportan por unidad (página, fila, estado) para poder cambiar tamaños.
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "baseline.json")
+
+Bench = Tuple[str, int, Callable[[], Any]]  # (unidad, unidades por corrida, función)
+
+def _with_fields_raw(fins):
+    # Estado realista: cada campo con su ExtractionField como lo deja node_extract
+    for fin in fins:
+        for section in ("balance", "income", "cashflow"):
+            for attr, value in getattr(fin, section).model_dump().items():
+                if value is not None:
+                    path = f"{section}.{attr}"
+                    fin.fields_raw[path] = ExtractionField(path=path, value=value, confidence=0.9,
+                                                           source_hint={"pages": [1, 2], "found_in": [1]})
+    return fins
+
+def build_benches(workdir: str, args) -> Dict[str, Bench]:
+    pdf = generators.write_pdf(os.path.join(workdir, "bench.pdf"), pages=args.pdf_pages)
+    csv = generators.write_csv(os.path.join(workdir, "bench.csv"), rows=args.rows)
+    xlsx = generators.write_xlsx(os.path.join(workdir, "bench.xlsx"), rows=args.rows)
+    fins = generators.synthetic_financials(args.statements, seed=1)
+    states = [{"financials": f} for f in _with_fields_raw(generators.synthetic_financials(args.states, seed=2))]
+    csv_text, csv_tables = parsers.parse_document(csv)
+    serde = CompressedSerializer()
+    dumped = [serde.dumps_typed(s) for s in states]
+
+    return {
+        "parse_pdf": ("page", args.pdf_pages, lambda: parsers.parse_document(pdf, stop_early=False)),
+        "parse_csv": ("row", args.rows, lambda: parsers.parse_document(csv)),
+        "parse_xlsx": ("row", args.rows, lambda: parsers.parse_document(xlsx)),
+        "table_map": ("row", args.rows, lambda: table_mapper.map_tables(csv_tables, csv_text)),
+        "ratios_compute": ("statement", len(fins), lambda: [ratio_tools.compute(f) for f in fins]),
+        "ratios_compute_many": ("statement", len(fins), lambda: ratio_tools.compute_many(fins)),
+        "validators_check": ("statement", len(fins),
+                             lambda: [validators.check_accounting_constraints(f) for f in fins]),
+        "checkpoint_dumps": ("state", len(states), lambda: [serde.dumps_typed(s) for s in states]),
+        "checkpoint_loads": ("state", len(dumped), lambda: [serde.loads_typed(d) for d in dumped]),
+    }
+
+def time_bench(fn: Callable[[], Any], units: int, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) / units)
+    samples.sort()
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": samples[0],
+        "p95_s": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+    }
+
+def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="finapp-bench-")
+    try:
+        benches = build_benches(workdir, args)
+        selected = [n for n in benches if not args.only or n in args.only]
+        results = {}
+        for name in selected:
+            unit, units, fn = benches[name]
+            stats = time_bench(fn, units, args.repeat)
+            results[name] = {"unit": unit, "units": units, **stats}
+            print(f"{name:<22} {stats['median_s'] * 1e6:>12.1f} µs/{unit}  (min {stats['min_s'] * 1e6:.1f}, "
+                  f"p95 {stats['p95_s'] * 1e6:.1f}, n={units})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": 1,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "params": {"pdf_pages": args.pdf_pages, "rows": args.rows, "statements": args.statements,
+                   "states": args.states, "repeat": args.repeat},
+        "results": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Compara medianas por unidad; regresión si current > baseline * (1 + threshold)."""
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            rows.append({"bench": name, "status": "new"})
+            continue
+        ratio = cur["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        rows.append({"bench": name, "baseline_s": base["median_s"], "current_s": cur["median_s"],
+                     "ratio": ratio, "status": "REGRESSION" if ratio > 1 + threshold else "ok"})
+    return rows
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Microbenchmarks offline de parseo, ratios, validadores y checkpoints")
+    ap.add_argument("--pdf-pages", type=int, default=40)
+    ap.add_argument("--rows", type=int, default=2000, help="filas de los CSV/XLSX sintéticos")
+    ap.add_argument("--statements", type=int, default=2000, help="estados para ratios/validadores")
+    ap.add_argument("--states", type=int, default=500, help="estados serializados como checkpoint")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", nargs="*", help="subconjunto de benchmarks por nombre")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save", action="store_true", help="guarda los resultados como línea base")
+    ap.add_argument("--check", action="store_true", help="compara contra la línea base")
+    ap.add_argument("--threshold", type=float, default=0.25, help="regresión tolerada (0.25 = +25%%)")
+    ap.add_argument("--out", help="escribe los resultados en este JSON")
+    args = ap.parse_args(argv)
+
+    current = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"💾 Línea base guardada en {args.baseline}")
+    if not args.check:
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"❌ No existe la línea base {args.baseline}; corre primero con --save")
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("params") != current["params"]:
+        print(f"⚠️ Parámetros distintos a la línea base: {baseline.get('params')} vs {current['params']}")
+    rows = compare(current, baseline, args.threshold)
+    for r in rows:
+        if r["status"] == "new":
+            print(f"{r['bench']:<22} (sin línea base)")
+        else:
+            print(f"{r['bench']:<22} x{r['ratio']:.2f}  {r['status']}")
+    regressions = [r["bench"] for r in rows if r["status"] == "REGRESSION"]
+    if regressions:
+        print(f"❌ Regresiones > {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("✅ Sin regresiones")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
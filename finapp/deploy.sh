@@ -301,6 +301,10 @@ if gcloud run services describe "$SERVICE_NAME" --region "$REGION" --project "$P
   echo -e "${YELLOW}⚠️ Servicio ya existe. Se actualizará con una nueva revisión.${NC}"
 fi
 
+# --no-cpu-throttling: los trabajos de /ingest/batch corren en workers en segundo plano
+# después de responder 202; con CPU sólo durante requests quedarían congelados hasta la
+# siguiente petición. Su estado se persiste en checkpoints.db, así que /jobs responde
+# aunque la instancia que los encoló se haya reciclado (lo pendiente queda FAILED).
 gcloud run deploy "$SERVICE_NAME" \
   --image "$IMAGE_URL" \
   --region "$REGION" \
@@ -312,6 +316,7 @@ gcloud run deploy "$SERVICE_NAME" \
   --concurrency "$CONCURRENCY" \
   --max-instances "$MAX_INSTANCES" \
   --min-instances 0 \
+  --no-cpu-throttling \
   --port "$APP_PORT" \
   --env-vars-file .env.yaml \
   --project "$PROJECT_ID" >/dev/null
@@ -1,6 +1,11 @@
-import os, requests, pandas as pd, streamlit as st, plotly.graph_objects as go
+import os, json, requests, pandas as pd, streamlit as st, plotly.graph_objects as go
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_BASE = os.getenv("API_BASE", "http://localhost:8000/api/v1")
+# Lecturas cortas: nunca bloquean la UI más de unos segundos (la ingesta va por SSE o por jobs)
+READ_TIMEOUT = (5, 30)
+JOB_POLL_S = 2
 
 st.set_page_config(page_title="FinApp", layout="wide")
 
@@ -14,34 +19,192 @@ if "financials" not in st.session_state:
     st.session_state.financials = None
 if "ratios" not in st.session_state:
     st.session_state.ratios = None
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+if "rev" not in st.session_state:
+    # Se incrementa cada vez que cambia el estado de la corrida (invalida las lecturas cacheadas)
+    st.session_state.rev = 0
 
 st.title("📄 FinApp — Extracción + HITL + Ratios")
 
+NODE_LABELS = {"parse": "Leyendo documento", "locate": "Buscando páginas de estados",
+               "extract": "Extrayendo campos", "validate": "Validando", "hitl": "Preparando revisión",
+               "apply_feedback": "Aplicando correcciones", "ratios": "Calculando ratios"}
+
+@st.cache_resource
+def http() -> requests.Session:
+    """Sesión compartida entre reruns: conexiones keep-alive y reintentos en GET idempotentes."""
+    s = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods={"GET"})
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+def api_get(path, **params):
+    r = http().get(f"{API_BASE}{path}", params=params, timeout=READ_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+# Lecturas cacheadas: la corrida sólo cambia con una revisión, así que (run_id, checkpoint/rev)
+# identifica el contenido; el listado expira solo.
+@st.cache_data(ttl=15, show_spinner=False)
+def recent_runs(status="READY", limit=20):
+    return api_get("/runs", status=status, limit=limit)["items"]
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def run_fields(run_id, version, fields="doc_id,financials,ratios"):
+    return api_get(f"/runs/{run_id}", fields=fields)["state"]
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def job_result(job_id):
+    return api_get(f"/jobs/{job_id}/result")
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def whatif(run_id, version, changes_json):
+    r = http().post(f"{API_BASE}/ratios/whatif", json={
+        "run_id": run_id,
+        "scenario_name": "UI Scenario",
+        "changes": json.loads(changes_json)
+    }, timeout=READ_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+def diff_corrections(orig: pd.DataFrame, edited: pd.DataFrame) -> list:
+    """Correcciones sólo para los paths cuyo valor cambió (comparación vectorizada, NaN == NaN)."""
+    edited = edited.dropna(subset=["path"]).drop_duplicates("path", keep="last")
+    after = pd.to_numeric(edited.set_index("path")["value_extracted"], errors="coerce")
+    before = pd.to_numeric(orig.set_index("path")["value"], errors="coerce").reindex(after.index)
+    changed = after[after.ne(before) & ~(after.isna() & before.isna())]
+    return [{"path": path, "new_value": None if pd.isna(v) else float(v), "reason": "UI edit"}
+            for path, v in changed.items()]
+
+def load_result(resp):
+    """Guarda en sesión la respuesta de ingesta/revisión (pausa HITL o lista)."""
+    st.session_state.run_id = resp["run_id"]
+    st.session_state.doc_id = resp["doc_id"]
+    st.session_state.rev += 1
+    if resp["status"] == "NEEDS_REVIEW":
+        st.session_state.payload = resp
+    else:
+        st.session_state.financials = resp["financials"]
+        st.session_state.ratios = resp["ratios"]
+        st.session_state.payload = None
+
+def iter_sse(resp):
+    """(evento, datos) de un stream text/event-stream."""
+    event, data = None, []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if event and data:
+                yield event, json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+def run_stream(url, **kwargs):
+    """Consume el SSE del backend pintando el avance; devuelve la respuesta final (evento "done")."""
+    final = None
+    with st.status("Procesando…", expanded=True) as status:
+        partial = st.empty()
+        with http().post(url, stream=True, timeout=(10, 300), **kwargs) as r:
+            if not r.ok:
+                status.update(label="Error", state="error")
+                st.error(r.text)
+                return None
+            for event, data in iter_sse(r):
+                if event == "node_started":
+                    status.update(label=NODE_LABELS.get(data["node"], data["node"]) + "…")
+                elif event == "document_parsed":
+                    st.write(f"📄 {data['pages']} páginas, {data['tables']} tablas"
+                             + (f" (hojas: {', '.join(data['sheets'])})" if data.get("sheets") else ""))
+                elif event == "pages_found":
+                    st.write(f"🔎 Páginas con estados: {data['selected_pages']}")
+                elif event == "group_extracted":
+                    st.write(f"🧩 Grupo {data['group'] + 1}/{data['of']} (páginas {data['pages']}): "
+                             f"{len(data['fields'])} campos")
+                elif event == "fields_extracted":
+                    st.write(f"✅ {len(data['fields'])} campos extraídos ({data['source']})")
+                    if data["fields"]:
+                        # Resultado parcial utilizable antes de que termine la validación
+                        partial.dataframe(pd.DataFrame(data["fields"])[["path", "value", "confidence"]],
+                                          use_container_width=True)
+                elif event == "validated":
+                    for it in data["issues"]:
+                        st.write(f"⚠️ {it['code']}: {it['message']}")
+                elif event == "ratios":
+                    st.write("📈 Ratios calculados")
+                elif event == "error":
+                    status.update(label="Error", state="error")
+                    st.error(data["detail"])
+                    return None
+                elif event == "done":
+                    final = data
+        status.update(label="Listo", state="complete", expanded=False)
+    return final
+
 tab1, tab2, tab3 = st.tabs(["1) Upload & Extract", "2) Revisión (HITL)", "3) Dashboard & What-if"])
 
+@st.fragment(run_every=JOB_POLL_S)
+def jobs_panel():
+    """Avance de los jobs encolados: sólo este bloque se repinta en cada sondeo."""
+    jobs = st.session_state.jobs
+    for job_id, job in jobs.items():
+        if job["status"] in ("QUEUED", "RUNNING"):
+            try:
+                jobs[job_id] = api_get(f"/jobs/{job_id}")
+            except requests.RequestException as e:
+                st.caption(f"⚠️ {job.get('filename')}: {e}")
+    st.dataframe(pd.DataFrame(jobs.values())[["filename", "status", "result_status", "error"]],
+                 use_container_width=True)
+    done = [j for j in jobs.values() if j["status"] == "DONE"]
+    if done:
+        c1, c2 = st.columns([3, 1])
+        pick = c1.selectbox("Resultado", options=[j["job_id"] for j in done],
+                            format_func=lambda i: f"{jobs[i]['filename']} ({jobs[i]['result_status']})")
+        if c2.button("Abrir"):
+            try:
+                load_result(job_result(pick))
+            except requests.RequestException as e:
+                st.error(str(e))
+            else:
+                st.rerun()
+
 with tab1:
     st.subheader("Sube un estado financiero (PDF/imagen/Excel/CSV)")
     period = st.text_input("Periodo", value="2024Q4")
     currency = st.text_input("Moneda", value="MXN")
-    f = st.file_uploader("Archivo", type=["pdf","png","jpg","jpeg","csv","xls","xlsx"])
-    if st.button("Extraer", type="primary") and f:
-        with st.spinner("Procesando…"):
+    entity = st.text_input("Entidad (opcional)", value="")
+    mode = st.radio("Modo", options=["Streaming", "Cola (varios archivos)"], horizontal=True)
+    data = {"period": period, "currency": currency, "language": "es", "entity": entity or None}
+    if mode == "Streaming":
+        f = st.file_uploader("Archivo", type=["pdf","png","jpg","jpeg","csv","xls","xlsx"])
+        if st.button("Extraer", type="primary") and f:
             files = {"file": (f.name, f.getvalue(), f.type)}
-            data = {"period": period, "currency": currency, "language": "es"}
-            r = requests.post(f"{API_BASE}/ingest", files=files, data=data, timeout=(10, 900))
-        if r.ok:
-            resp = r.json()
-            st.session_state.run_id = resp["run_id"]
-            st.session_state.doc_id = resp["doc_id"]
-            if resp["status"] == "NEEDS_REVIEW":
-                st.session_state.payload = resp
-                st.success("Se requiere revisión humana (HITL). Ve a la pestaña 2.")
+            resp = run_stream(f"{API_BASE}/ingest/stream", files=files, data=data)
+            if resp:
+                load_result(resp)
+                if resp["status"] == "NEEDS_REVIEW":
+                    st.success("Se requiere revisión humana (HITL). Ve a la pestaña 2.")
+                else:
+                    st.success("¡Listo! Ve a Dashboard.")
+    else:
+        fs = st.file_uploader("Archivos", type=["pdf","png","jpg","jpeg","csv","xls","xlsx"],
+                              accept_multiple_files=True)
+        if st.button("Encolar", type="primary") and fs:
+            # Responde de inmediato (202) con los job ids; el avance se sondea con lecturas cortas
+            files = [("files", (f.name, f.getvalue(), f.type)) for f in fs]
+            r = http().post(f"{API_BASE}/ingest/batch", files=files, data=data, timeout=(10, 120))
+            if r.ok:
+                st.session_state.jobs.update({j["job_id"]: j for j in r.json()["jobs"]})
             else:
-                st.session_state.financials = resp["financials"]
-                st.session_state.ratios = resp["ratios"]
-                st.success("¡Listo! Ve a Dashboard.")
-        else:
-            st.error(f"Error: {r.text}")
+                st.error(r.text)
+        if st.session_state.jobs:
+            jobs_panel()
 
 with tab2:
     st.subheader("Revisión humana (HITL)")
@@ -57,56 +220,55 @@ with tab2:
             for it in payload["issues"]:
                 st.write(f"- [{it['severity']}] {it['code']}: {it['message']}")
 
-        # Tabla editable
+        # Tabla editable: dentro de un form, editar celdas no re-ejecuta la app hasta enviar
         df = pd.DataFrame(payload["fields"])
         # Solo mostramos columnas importantes
-        show = df[["path","value","unit","confidence"]].copy()
-        show.rename(columns={"value":"value_extracted"}, inplace=True)
-        edited = st.data_editor(show, num_rows="dynamic", use_container_width=True)
-
-        # Confirmación de escala
-        scale = st.selectbox("Confirma la escala:", options=["UNIDAD","MILES","MILLONES"], index=["UNIDAD","MILES","MILLONES"].index(payload.get("scale_hint") or "UNIDAD"))
-        currency_sel = st.text_input("Confirma moneda", value=payload.get("currency") or "MXN")
-
-        if st.button("Aplicar correcciones y continuar", type="primary"):
-            orig_map = {row["path"]: row["value"] for _, row in df.iterrows()}
-            corrections = []
-            for _, row in edited.iterrows():
-                path = row["path"]
-                new_v = row.get("value_extracted")
-                orig_v = orig_map.get(path, None)
-
-                if pd.isna(orig_v):
-                    orig_v = None
-                if pd.isna(new_v):
-                    new_v = None
-
-                if new_v != orig_v:
-                    corr = {"path": path, "reason": "UI edit"}
-                    corr["new_value"] = None if new_v is None else float(new_v)
-                    corrections.append(corr)
+        show = df[["path","value","unit","confidence"]].rename(columns={"value":"value_extracted"})
+        with st.form("review"):
+            edited = st.data_editor(show, num_rows="dynamic", use_container_width=True)
+
+            # Confirmación de escala
+            scale = st.selectbox("Confirma la escala:", options=["UNIDAD","MILES","MILLONES"], index=["UNIDAD","MILES","MILLONES"].index(payload.get("scale_hint") or "UNIDAD"))
+            currency_sel = st.text_input("Confirma moneda", value=payload.get("currency") or "MXN")
+            submitted = st.form_submit_button("Aplicar correcciones y continuar", type="primary")
+
+        if submitted:
+            # Sólo viajan los campos cambiados
+            corrections = diff_corrections(df, edited)
 
             # siempre confirmar escala y moneda
             corrections.append({"path": "meta.scale_confirmed", "new_value": scale})
             corrections.append({"path": "meta.currency_confirmed", "new_value": currency_sel})
 
-            with st.spinner("Revalidando…"):
-                r = requests.post(f"{API_BASE}/review", json={"run_id": st.session_state.run_id, "corrections": corrections}, timeout=(10, 600))
-            if r.ok:
-                resp = r.json()
+            resp = run_stream(f"{API_BASE}/review/stream", json={"run_id": st.session_state.run_id, "corrections": corrections})
+            if resp:
+                load_result(resp)
                 if resp["status"] == "NEEDS_REVIEW":
-                    st.session_state.payload = resp
                     st.warning("Aún quedan issues. Revisa nuevamente.")
                 else:
-                    st.session_state.financials = resp["financials"]
-                    st.session_state.ratios = resp["ratios"]
-                    st.session_state.payload = None
                     st.success("¡Validado! Ve a Dashboard.")
-            else:
-                st.error(r.text)
 
 with tab3:
     st.subheader("Ratios y What-if")
+    with st.expander("Abrir una corrida anterior"):
+        try:
+            runs = recent_runs()
+        except requests.RequestException as e:
+            runs = []
+            st.caption(f"⚠️ {e}")
+        if runs:
+            by_id = {r["run_id"]: r for r in runs}
+            pick = st.selectbox("Corrida", options=list(by_id),
+                                format_func=lambda i: f"{by_id[i]['entity'] or by_id[i]['doc_id']} · {by_id[i]['period']} · {i[:8]}")
+            if st.button("Cargar"):
+                # El checkpoint_id versiona la lectura: misma corrida sin cambios = cache
+                try:
+                    got = run_fields(pick, by_id[pick]["checkpoint_id"])
+                except requests.RequestException as e:
+                    st.error(str(e))
+                else:
+                    load_result({**got, "run_id": pick, "status": "READY"})
+                    st.rerun()
     if not st.session_state.ratios:
         st.info("Valida primero en la pestaña 2.")
     else:
@@ -141,15 +303,12 @@ with tab3:
                 changes.append({"path": path, "new_value": new_value})
             else:
                 changes.append({"path": path, "factor": factor})
-            r = requests.post(f"{API_BASE}/ratios/whatif", json={
-                "run_id": st.session_state.run_id,
-                "scenario_name": "UI Scenario",
-                "changes": changes
-            }, timeout=60)
-            if r.ok:
-                resp = r.json()
+            try:
+                # Mismo escenario sobre la misma corrida => respuesta cacheada
+                resp = whatif(st.session_state.run_id, st.session_state.rev, json.dumps(changes, sort_keys=True))
+            except requests.RequestException as e:
+                st.error(getattr(e.response, "text", None) or str(e))
+            else:
                 st.session_state.financials = resp["financials"]
                 st.session_state.ratios = resp["ratios"]
                 st.success("Recalculado.")
-            else:
-                st.error(r.text)
@@ -19,20 +19,16 @@ python -m uvicorn finapp.backend.app:app \
     --port ${API_PORT} \
     --workers 1 &
 
-# Esperar que el backend esté listo
+# Esperar que el backend esté listo (/ready: grafo abierto + warm-up de Vertex/parsers)
 echo "⏳ Esperando que el backend esté listo..."
-sleep 5
-
-# Verificar que el backend responda
-max_attempts=30
+max_attempts=120
 attempt=0
 while [ $attempt -lt $max_attempts ]; do
-    if curl -f http://localhost:${API_PORT}/docs > /dev/null 2>&1; then
+    if curl -sf http://localhost:${API_PORT}/ready > /dev/null 2>&1; then
         echo "✅ Backend listo!"
         break
     fi
-    echo "Intento $((attempt+1))/$max_attempts..."
-    sleep 2
+    sleep 0.5
     attempt=$((attempt+1))
 done
 
@@ -0,0 +1,8 @@
+import os, tempfile
+
+# Las pruebas no tocan backend/storage, GCS ni Vertex: bases y blobs en un directorio temporal
+_TMP = tempfile.mkdtemp(prefix="finapp_tests_")
+os.environ["GCS_BUCKET"] = ""
+for var, name in {"BLOBS_DIR": "blobs", "GCS_LOCAL_DIR": "gcs_local", "FIN_STORE_DB": "financials.db",
+                  "EXTRACTION_CACHE_DB": "extraction_cache.db", "OCR_CACHE_DB": "ocr_cache.db"}.items():
+    os.environ.setdefault(var, os.path.join(_TMP, name))
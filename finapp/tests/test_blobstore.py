@@ -0,0 +1,8 @@
+from finapp.backend.services import blobstore
+
+def test_get_returns_independent_copies():
+    ref = blobstore.put([{"columns": ["a"], "rows": [[1]]}])
+    first = blobstore.get(ref)
+    first[0]["rows"].append([2])
+    assert blobstore.get(ref) == [{"columns": ["a"], "rows": [[1]]}]
+    assert blobstore.get(ref) is not blobstore.get(ref)
@@ -0,0 +1,64 @@
+import pytest
+from finapp.backend.models import Financials
+from finapp.backend.services import fin_store
+
+@pytest.mark.parametrize("period, expected", [
+    ("2024", (202412, "A")),
+    ("FY2023", (202312, "A")),
+    ("2023Q1", (202303, "Q")),
+    ("2023Q4", (202312, "Q")),
+    ("2024T1", (202403, "Q")),
+    ("3T2024", (202409, "Q")),
+    ("Q2 2024", (202406, "Q")),
+    ("2024-09", (202409, "M")),
+    ("09/2024", (202409, "M")),
+    ("dic-2024", (202412, "M")),
+    ("Sep 2024", (202409, "M")),
+])
+def test_parse_period(period, expected):
+    assert fin_store.parse_period(period) == expected
+    assert fin_store.period_ord(period) == expected[0]
+
+def test_parse_period_unknown():
+    assert fin_store.parse_period("sin fecha") is None
+    assert fin_store.period_ord("") is None
+
+def test_quarters_are_ordered():
+    quarters = [f"{y}Q{q}" for y in (2023, 2024) for q in (1, 2, 3, 4)]
+    ords = [fin_store.period_ord(p) for p in quarters]
+    assert ords == sorted(ords) and len(set(ords)) == len(quarters)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(fin_store, "FIN_STORE_ENABLED", True)
+    monkeypatch.setattr(fin_store, "FIN_STORE_DB", str(tmp_path / "financials.db"))
+    monkeypatch.setattr(fin_store, "_conn", None)
+    yield fin_store
+    if fin_store._conn is not None:
+        fin_store._conn.close()
+
+def _fin(period: str, revenue: float) -> Financials:
+    fin = Financials(period=period)
+    fin.income.revenue = revenue
+    return fin
+
+def test_series_order_and_filters(store):
+    for i, p in enumerate(["2024Q2", "2023Q4", "2024Q1", "2023Q3"]):
+        store.upsert("acme", _fin(p, i), None)
+    s = store.series("acme", ["income.revenue"])
+    assert s["period"] == ["2023Q3", "2023Q4", "2024Q1", "2024Q2"]
+    s = store.series("acme", ["income.revenue"], start="2023Q4", end="2024Q1")
+    assert s["period"] == ["2023Q4", "2024Q1"]
+
+def test_cross_section_does_not_mix_period_kinds(store):
+    store.upsert("a", _fin("2024", 1), None)
+    store.upsert("b", _fin("2024Q4", 2), None)
+    store.upsert("c", _fin("4T2024", 3), None)
+    store.upsert("d", _fin("dic-2024", 4), None)
+    assert store.cross_section("2024", ["income.revenue"])["entity"] == ["a"]
+    assert store.cross_section("2024Q4", ["income.revenue"])["entity"] == ["b", "c"]
+    assert store.cross_section("2024-12", ["income.revenue"])["entity"] == ["d"]
+
+def test_unknown_period_raises(store):
+    with pytest.raises(ValueError):
+        store.series("acme", start="pronto")
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from finapp.backend.models import ExtractionField, Financials
+from finapp.backend.services import columnar, identities
+from finapp.backend.settings import IDENTITY_CONF_DECAY, IDENTITY_CONFLICT_MAX_CONF
+
+def _fin(conf=None, **values):
+    fin = Financials(period="2024")
+    for key, v in values.items():
+        sec, attr = key.split("__")
+        setattr(getattr(fin, sec), attr, v)
+        if conf is not None:
+            path = f"{sec}.{attr}"
+            fin.fields_raw[path] = ExtractionField(path=path, label=attr, value=v, confidence=conf)
+    return fin
+
+def test_solve_chains_identities_with_provenance():
+    fin = _fin(conf=0.9, balance__current_assets=50.0, balance__non_current_assets=50.0,
+               balance__total_liabilities=60.0)
+    # Circulante + no circulante -> activo total -> capital
+    assert identities.solve(fin) == ["balance.total_assets", "balance.shareholders_equity"]
+    assert (fin.balance.total_assets, fin.balance.shareholders_equity) == (100.0, 40.0)
+    total = fin.fields_raw["balance.total_assets"]
+    assert total.source_hint == {"derived": "assets_subtotals",
+                                 "inputs": ["balance.current_assets", "balance.non_current_assets"]}
+    assert total.confidence == pytest.approx(0.9 * IDENTITY_CONF_DECAY)
+    assert fin.fields_raw["balance.shareholders_equity"].confidence == pytest.approx(0.9 * IDENTITY_CONF_DECAY ** 2, abs=1e-4)
+
+def test_solve_never_overwrites_and_subtracts_capex_magnitude():
+    fin = _fin(income__revenue=100.0, income__cogs=60.0, income__gross_profit=45.0,
+               cashflow__operating_cf=80.0, cashflow__capex=-30.0)
+    assert identities.solve(fin) == ["cashflow.free_cf"]
+    assert fin.income.gross_profit == 45.0
+    assert fin.cashflow.free_cf == 50.0  # CAPEX negativo en el documento se lee en magnitud
+
+def test_conflicting_derived_field_drops_below_review_threshold():
+    # Activo total derivado de pasivo + capital = 110, pero circulante + no circulante = 100
+    fin = _fin(conf=0.9, balance__current_assets=50.0, balance__non_current_assets=50.0,
+               balance__total_liabilities=60.0, balance__shareholders_equity=50.0)
+    identities.solve(fin)
+    total = fin.fields_raw["balance.total_assets"]
+    assert fin.balance.total_assets == 110.0
+    assert identities.conflicts(fin) == ["assets_subtotals"]
+    assert total.source_hint["conflicts"] == ["assets_subtotals"]
+    assert total.confidence <= IDENTITY_CONFLICT_MAX_CONF
+    # Corregido el dato, el siguiente pase lo vuelve a despejar sin la marca
+    fin.balance.non_current_assets = 60.0
+    identities.solve(fin)
+    assert "conflicts" not in fin.fields_raw["balance.total_assets"].source_hint
+
+def test_invalidate_clears_dependents():
+    fin = _fin(conf=0.9, income__revenue=100.0, income__cogs=60.0)
+    identities.solve(fin)
+    assert identities.invalidate(fin, ["income.revenue"]) == {"income.gross_profit"}
+    assert fin.income.gross_profit is None and "income.gross_profit" not in fin.fields_raw
+
+def test_solve_columns_matches_solve():
+    rng = np.random.default_rng(3)
+    fins = []
+    for _ in range(200):
+        fin = Financials(period="2024")
+        for path in identities.PATHS:
+            if rng.random() < 0.6:
+                sec, attr = path.split(".")
+                setattr(getattr(fin, sec), attr, float(rng.integers(1, 500)))
+        fins.append(fin)
+    cols = columnar.to_columns(fins)
+    identities.solve_columns(cols)
+    for i, fin in enumerate(fins):
+        identities.solve(fin)
+        for path in identities.PATHS:
+            sec, attr = path.split(".")
+            v = getattr(getattr(fin, sec), attr)
+            assert (v is None and np.isnan(cols[path][i])) or cols[path][i] == pytest.approx(v), path
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from finapp.backend.models import Financials
+from finapp.backend.services import columnar, ratio_tools
+
+def _random_financials(n: int, seed: int = 11):
+    # Valores ausentes, ceros (denominadores y ebitda "falsy") y negativos
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        fin = Financials(period="2024")
+        for path in columnar.FIELD_PATHS:
+            r = rng.random()
+            if r < 0.2:
+                continue
+            sec, attr = path.split(".")
+            setattr(getattr(fin, sec), attr, 0.0 if r < 0.3 else float(rng.integers(-50, 500)))
+        out.append(fin)
+    return out
+
+def test_batch_matches_single_statement():
+    fins = _random_financials(300)
+    for fin, batch in zip(fins, ratio_tools.compute_many(fins)):
+        single = ratio_tools.compute(fin)
+        for name in ratio_tools.RATIO_FUNCS:
+            a, b = getattr(single, name), getattr(batch, name)
+            assert (a is None and b is None) or a == pytest.approx(b), name
+
+def test_recompute_only_touches_named_ratios():
+    fin = Financials(period="2024")
+    fin.income.revenue, fin.income.net_income, fin.income.gross_profit = 100.0, 10.0, 40.0
+    prev = ratio_tools.compute(fin)
+    fin.income.net_income = 20.0
+    out = ratio_tools.recompute(fin, prev, {"net_margin"})
+    assert out.net_margin == pytest.approx(0.2) and out.gross_margin == prev.gross_margin
@@ -0,0 +1,42 @@
+import os, sqlite3, time
+from datetime import datetime, timedelta, timezone
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+from finapp.backend.graph import retention
+from finapp.backend.graph.serde import CompressedSerializer
+from finapp.backend.services import blobstore
+
+def _save(db, thread_id, hours_ago, **values):
+    cp = empty_checkpoint()
+    cp["ts"] = (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat()
+    cp["channel_values"] = values
+    with sqlite3.connect(db, check_same_thread=False) as conn:
+        SqliteSaver(conn, serde=CompressedSerializer()).put(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, cp, {}, {})
+
+def _age(ref, hours):
+    t = time.time() - hours * 3600
+    os.utime(blobstore._path(ref[len(blobstore.PREFIX):]), (t, t))
+
+def test_gc_keeps_blobs_still_referenced(tmp_path):
+    db = str(tmp_path / "checkpoints.db")
+    old, live, shared = blobstore.put("viejo"), blobstore.put("vivo"), blobstore.put("compartido")
+    _save(db, "old", hours_ago=100, text_ref=old, tables_ref=shared)
+    _save(db, "live", hours_ago=1, text_ref=live, tables_ref=shared)
+    for ref in (old, live, shared):
+        _age(ref, 100)  # mtime viejo: sólo la referencia los protege
+    out = retention.prune(db, ttl_hours=72, max_mb=0)
+    assert out["expired"] == 1 and out["blobs"] == 1
+    assert blobstore.get(live) == "vivo" and blobstore.get(shared) == "compartido"
+    assert not os.path.exists(blobstore._path(old[len(blobstore.PREFIX):]))
+
+def test_budget_counts_blob_bytes(tmp_path):
+    db = str(tmp_path / "checkpoints.db")
+    big = blobstore.put(os.urandom(1_200_000).hex())  # hex aleatorio: ~1.2 MB comprimido
+    _save(db, "first", hours_ago=2, text_ref=big)
+    _save(db, "second", hours_ago=1, text_ref=blobstore.put("chico"))
+    _age(big, 1)
+    # Los checkpoints ocupan unos KB; sólo con el blob se pasa de 1 MB
+    out = retention.prune(db, ttl_hours=0, max_mb=1)
+    assert out["over_budget"] == 1 and out["blobs"] >= 1
+    assert not os.path.exists(blobstore._path(big[len(blobstore.PREFIX):]))
@@ -0,0 +1,65 @@
+import pytest
+from pydantic import ValidationError
+from finapp.backend.models import Financials, SweepAxis, SweepRequest
+from finapp.backend.services import scenarios
+from finapp.backend.settings import SWEEP_MAX_SCENARIOS
+
+def _fin():
+    fin = Financials(period="2024")
+    fin.income.revenue, fin.income.cogs = 100.0, 60.0
+    return fin
+
+def test_sweep_requires_an_axis():
+    with pytest.raises(ValidationError):
+        SweepRequest(financials=_fin(), axes=[])
+    with pytest.raises(ValueError):
+        scenarios.sweep(_fin(), [])
+
+def test_base_uses_solved_identities():
+    # Sin utilidad bruta en el documento: el base la despeja igual que cada escenario
+    base = scenarios.base_ratios(_fin())
+    assert base.gross_margin == pytest.approx(0.4)
+    _, cols = scenarios.sweep(_fin(), [SweepAxis(path="income.revenue", low=1, high=1, steps=1)])
+    assert cols["gross_margin"][0] == pytest.approx(base.gross_margin)
+
+# --- Endpoint /ratios/whatif/sweep (con financials explícitos no toca el grafo) ---
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from finapp.backend.app import app
+    return TestClient(app)
+
+def _sweep(client, **body):
+    body.setdefault("financials", _fin().model_dump())
+    return client.post("/api/v1/ratios/whatif/sweep", json=body)
+
+@pytest.mark.parametrize("body", [
+    {"axes": []},
+    {"axes": [{"path": "income.nope", "low": 0.9, "high": 1.1}]},
+    {"axes": [{"path": "income.revenue", "low": 0.9, "high": 1.1}], "method": "latin"},
+    {"axes": [{"path": "income.revenue", "low": 0.9, "high": 1.1, "dist": "beta"}], "method": "montecarlo"},
+    {"axes": [{"path": "income.revenue", "low": 0.9, "high": 1.1, "mode": "log"}]},
+    {"axes": [{"path": "income.revenue", "low": 0.9, "high": 1.1, "steps": SWEEP_MAX_SCENARIOS + 1}]},
+    {"axes": [{"path": "income.revenue", "low": 0.9, "high": 1.1}], "financials": None},
+])
+def test_sweep_rejects_bad_requests(client, body):
+    assert _sweep(client, **body).status_code == 422
+
+def test_sweep_grid_base_and_ratio_filter(client):
+    r = _sweep(client, axes=[{"path": "income.revenue", "low": 1.0, "high": 2.0, "steps": 3},
+                             {"path": "income.cogs", "mode": "pct", "low": 0, "high": 10, "steps": 2}],
+               ratios=["gross_margin"])
+    assert r.status_code == 200
+    out = r.json()
+    assert out["n"] == 6 and out["base"]["gross_margin"] == pytest.approx(0.4)
+    assert set(out["ratios"]) == {"gross_margin"} and set(out["summary"]) == {"gross_margin"}
+    # revenue x1, cogs +0% -> el mismo margen que el base; revenue x2, cogs +10% -> 1 - 66/200
+    assert out["ratios"]["gross_margin"][0] == pytest.approx(0.4)
+    assert out["ratios"]["gross_margin"][-1] == pytest.approx(1 - 66 / 200)
+
+def test_sweep_montecarlo_is_reproducible_with_seed(client):
+    body = {"axes": [{"path": "income.revenue", "low": 0.8, "high": 1.2}], "method": "montecarlo",
+            "draws": 50, "seed": 7}
+    a, b = _sweep(client, **body).json(), _sweep(client, **body).json()
+    assert a["n"] == 50 and a["inputs"] == b["inputs"]
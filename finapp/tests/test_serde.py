@@ -0,0 +1,14 @@
+import logging
+from finapp.backend.graph.serde import CompressedSerializer
+from finapp.backend.models import Financials, Issue, Ratios
+
+def test_state_models_round_trip_without_warnings(caplog):
+    fin = Financials(period="2024")
+    fin.income.revenue = 100.0
+    state = {"financials": fin, "ratios": Ratios(gross_margin=0.4),
+             "issues": [Issue(code="X", message="m", severity="warning", fields=[])]}
+    serde = CompressedSerializer(min_bytes=0)
+    with caplog.at_level(logging.WARNING):
+        out = serde.loads_typed(serde.dumps_typed(state))
+    assert out["financials"] == fin and isinstance(out["ratios"], Ratios)
+    assert not [r for r in caplog.records if "unregistered" in r.getMessage()]
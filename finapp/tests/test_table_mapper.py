@@ -0,0 +1,57 @@
+from finapp.backend.services import table_mapper
+from finapp.backend.settings import CONF_MED, TABLE_MAP_FUZZY_MAX_CONF
+
+def _fields(rows, columns=("Concepto", "2024")):
+    out = table_mapper.map_tables([{"columns": list(columns), "rows": [list(r) for r in rows]}])
+    return {f["path"]: f for f in out["fields"]}, out
+
+def test_loss_label_is_negative_net_income():
+    fields, _ = _fields([("Ingresos", 100), ("Pérdida neta", 50)])
+    assert fields["income.net_income"]["value"] == -50
+    # Ya presentada con signo o entre paréntesis no se invierte otra vez
+    assert _fields([("Pérdida neta", "(50)")])[0]["income.net_income"]["value"] == -50
+    assert _fields([("Net loss", -50)])[0]["income.net_income"]["value"] == -50
+    # "Utilidad (pérdida) neta" no dice el signo: se respeta el del documento
+    assert _fields([("Utilidad (pérdida) neta", 50)])[0]["income.net_income"]["value"] == 50
+
+def test_operating_cash_flow_is_not_ebitda():
+    assert table_mapper.match_label("Flujo operativo")[0] != "income.ebitda"
+    assert table_mapper.match_label("EBITDA") == ("income.ebitda", 1.0)
+
+def test_match_label_exact_and_normalized():
+    assert table_mapper.match_label("  VENTAS NETAS ") == ("income.revenue", 1.0)
+    # Acentos y paréntesis no cuentan
+    assert table_mapper.match_label("Utilidad de operación (EBIT)") == ("income.operating_income", 1.0)
+    assert table_mapper.match_label("") == (None, 0.0)
+    assert table_mapper.match_label("123") == (None, 0.0)
+
+def test_match_label_fuzzy_keeps_polarity_and_totals():
+    path, score = table_mapper.match_label("Costo de venta")
+    assert path == "income.cogs" and 0 < score < 1
+    # A un paso de "gastos por intereses", pero es un ingreso
+    assert table_mapper.match_label("Ingresos por intereses")[0] is None
+    assert table_mapper.match_label("Total pasivo y capital")[0] is None
+
+def test_map_tables_latest_year_scale_and_signs():
+    table = {"columns": ["Concepto", "2023", "2024"],
+             "rows": [["Cifras en miles de pesos", None, None],
+                      ["Ventas netas", "1,000", "1,200"],
+                      ["Costo de ventas", "(600)", "(700)"],
+                      ["Total activo", 5000, 5500],
+                      ["Total pasivo", 3000, 3200],
+                      ["Ventas", 1, 2],
+                      ["Capitl contable", None, 2300]]}
+    out = table_mapper.map_tables([table])
+    fields = {f["path"]: f for f in out["fields"]}
+    assert (out["period"], out["scale_hint"], out["currency"]) == ("2024", "MILES", "MXN")
+    assert fields["income.revenue"]["value"] == 1200  # el primero a igual puntaje gana
+    assert fields["income.cogs"]["value"] == 700  # costos en positivo
+    # Sólo coincidencia difusa: por debajo de CONF_MED para forzar revisión
+    assert fields["balance.shareholders_equity"]["confidence"] <= TABLE_MAP_FUZZY_MAX_CONF < CONF_MED
+
+def test_map_tables_coverage_counts_derivable_fields():
+    rows = [("Ingresos", 100), ("Utilidad neta", 10), ("Total activo", 500), ("Total pasivo", 300)]
+    _, out = _fields(rows)
+    # Capital contable no viene pero se despeja de A = P + C
+    assert out["coverage"] == 1.0
+    assert "balance.shareholders_equity" not in {f["path"] for f in out["fields"]}
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from finapp.backend.models import Financials
+from finapp.backend.services import columnar, rules, validators
+
+def _random_financials(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    paths = ["balance.total_assets", "balance.total_liabilities", "balance.shareholders_equity",
+             "balance.current_assets", "balance.current_liabilities", "income.revenue", "income.cogs",
+             "income.gross_profit", "income.interest_expense", "income.net_income"]
+    out = []
+    for _ in range(n):
+        fin = Financials(period="2024")
+        for p in paths:
+            if rng.random() < 0.85:
+                sec, attr = p.split(".")
+                setattr(getattr(fin, sec), attr, float(rng.integers(-20, 200)))
+        # La mitad con el balance cuadrado (con error de redondeo dentro de tolerancia)
+        b = fin.balance
+        if rng.random() < 0.5 and b.total_liabilities is not None and b.shareholders_equity is not None:
+            b.total_assets = b.total_liabilities + b.shareholders_equity + 1e-9
+        out.append(fin)
+    return out
+
+def _key(issues):
+    return sorted((i.code, i.severity, tuple(i.fields)) for i in issues)
+
+def test_batch_matches_single_statement_checks():
+    fins = _random_financials(200)
+    batch = rules.validate_batch(columnar.to_columns(fins))
+    rule_checks = {name for name, spec in validators.CHECKS.items() if "rule" in spec}
+    for fin, issues in zip(fins, batch):
+        assert _key(validators.check_accounting_constraints(fin, only=rule_checks)) == _key(issues)
+
+def test_equation_uses_relative_tolerance():
+    fin = Financials(period="2024")
+    fin.balance.total_assets, fin.balance.total_liabilities, fin.balance.shareholders_equity = 1e6, 6e5, 4e5 + 1
+    assert "EQ_IMBALANCE" not in {i.code for i in validators.check_accounting_constraints(fin)}
+    fin.balance.shareholders_equity = 4e5 + 1e3
+    assert "EQ_IMBALANCE" in {i.code for i in validators.check_accounting_constraints(fin)}
+
+def test_recheck_reruns_rules_sharing_a_code():
+    fin = Financials(period="2024")
+    fin.income.revenue, fin.income.interest_expense = -5, -1
+    issues = validators.check_accounting_constraints(fin)
+    assert [i.code for i in issues].count("NEGATIVE_NOT_ALLOWED") == 2
+    fin.income.interest_expense = 2
+    issues = validators.recheck(fin, issues, {"interest_sign"})
+    assert [i.fields for i in issues if i.code == "NEGATIVE_NOT_ALLOWED"] == [["income.revenue"]]
+
+@pytest.mark.parametrize("rule", [
+    {"id": "x", "type": "identity", "lhs": "balance.total_assets", "rhs": []},
+    {"id": "x", "type": "sign", "path": ["income.revenue"], "sign": "positive"},
+    {"id": "x", "type": "compare", "lhs": "balance.cash", "op": "<=", "rhs": "balance.total_assets", "rel_tol": "1"},
+    {"id": "x", "type": "compare", "lhs": "balance.cash", "op": "~", "rhs": "balance.total_assets"},
+    {"id": "x", "type": "required", "paths": ["balance.nope"]},
+    "no es un dict",
+])
+def test_malformed_rules_raise_value_error(rule):
+    with pytest.raises(ValueError):
+        rules.compile_rules([rule])
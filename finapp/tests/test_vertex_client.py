@@ -0,0 +1,30 @@
+import time
+from types import SimpleNamespace
+import pytest
+from finapp.backend.services import vertex_client
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(vertex_client, "vertex_initialized", True)
+    monkeypatch.setattr(vertex_client, "_build_parts", lambda *a: [])
+    monkeypatch.setattr(vertex_client, "_request_kwargs", lambda: {})
+    monkeypatch.setattr(vertex_client, "_backoff", lambda attempt: 0)
+    # Sin SDK: el contenido y las opciones del request no importan al modelo falso
+    monkeypatch.setattr(vertex_client, "_gm", lambda: SimpleNamespace(Content=lambda **kw: kw))
+    def install(**kw):
+        monkeypatch.setattr(vertex_client, "model", vertex_client.FakeModel({"fields": [], "period": "2024"}, **kw))
+    return install
+
+def test_sync_call_times_out_like_async(fake_model, monkeypatch):
+    monkeypatch.setattr(vertex_client, "VERTEX_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(vertex_client, "VERTEX_MAX_RETRIES", 1)
+    fake_model(delay_s=1.0)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        vertex_client.extract_with_vertex(None, "texto", [])
+    # Dos intentos de 50 ms: no espera a que el modelo responda
+    assert time.perf_counter() - start < 0.5
+
+def test_sync_call_returns_within_timeout(fake_model):
+    fake_model()
+    assert vertex_client.extract_with_vertex(None, "texto", [])["period"] == "2024"